@@ -1,23 +1,22 @@
 import matplotlib.pyplot as plt
-from itertools import islice
 import numpy as np
 import matplotlib as mpl
+import os
+import sys
+sys.path.insert(0, os.path.join(os.pardir, 'source'))
+from tools import loader
 #mpl.rcParams['text.usetex'] = True
 #mpl.rcParams['text.latex.preamble'] = [r'\usepackage{amsmath}']
 
 plt.rcParams['text.latex.preamble'] = r"\usepackage{bm} \usepackage{amsmath}"
 
 
-alpha = []
-n_s = []
-r = []
-
-with open('para_space.txt', 'r') as f:
-    for line in islice(f, 8, None):
-        column = line.split()
-        alpha.append(float(column[0]))
-        n_s.append(float(column[3]))
-        r.append(float(column[4]))
+# Load the successful points of the alpha sweep of main.py
+data = loader.load('alpha_para_space.txt')
+ok = np.isfinite(data['n_s'])
+alpha = data['alpha'][ok]
+n_s = data['n_s'][ok]
+r = data['r'][ok]
 
 
 
@@ -0,0 +1,129 @@
+# Setting up the analytic slow-roll engine
+# Author: Arun Mathew
+#
+# In the slow-roll regime the Hubble rate of the model follows the tanh solution
+#   H(t) = H_S tanh((t_e - t)/(36 alpha H_S)),  H_S = 1/sqrt(12 beta),
+#   H_0 = H_S sqrt(1 - exp(-2 beta N_e/(3 alpha))),  t_e = 18 alpha H_0 ln((H_S + H_0)/(H_S - H_0))
+# for N_e e-foldings. From it the Ricci scalar, F = df/dR, the slow-roll parameters, the
+# Scalar Spectral Index and the Tensor-to-Scalar ratio follow as in fix_beta.py, with the
+# time derivatives taken in closed form instead of by finite differences.
+#
+# Every function takes alpha, beta and mu as NumPy arrays of any broadcastable shapes (in
+# the units of fieldeqs, i.e. alpha and beta in s^2 and mu in 1/s) and evaluates a whole
+# grid of parameter points in one pass, the time along a trailing axis. spectral_index()
+# only evaluates the start of inflation, so that millions of parameter points can be
+# screened in seconds before solving the field equations of the promising ones.
+import numpy
+
+# Ricci scalar used where the analytic solution gives R < 0 (towards t_e)
+R_FLOOR = 1e-50
+
+
+#####################################################################################
+def scales(alpha, beta, Ne=60.0):
+    '''
+    Hubble rates and end of inflation of the analytic solution
+
+    :param alpha: parameter alpha
+    :param beta: parameter beta
+    :param Ne: number of e-foldings
+    :return: (H_S, H_0, t_e) broadcast over the parameters
+    '''
+    alpha, beta = numpy.asarray(alpha, dtype=float), numpy.asarray(beta, dtype=float)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        HS = 1 / numpy.sqrt(12 * beta)
+        H0 = HS * numpy.sqrt(1 - numpy.exp(-2 * beta * Ne / (3 * alpha)))
+        te = 18 * alpha * H0 * numpy.log((HS + H0) / (HS - H0))
+    return HS, H0, te
+
+
+def hubble(alpha, beta, t, Ne=60.0):
+    '''
+    Hubble rate of the analytic solution
+
+    :param t: time, broadcast with alpha and beta
+    :return: H(t)
+    '''
+    HS, H0, te = scales(alpha, beta, Ne)
+    return HS * numpy.tanh((te - t) / (36 * numpy.asarray(alpha) * HS))
+
+
+#####################################################################################
+def _evaluate(alpha, beta, mu, t, Ne):
+    # Solution at the times t (trailing axis) of every parameter point. The derivatives
+    # of H are those of the tanh solution, with sech^2 = 1/cosh^2 taken directly: in
+    # slow roll H only changes in its last digits between the points of the time vector,
+    # where finite differences would be dominated by round off.
+    alpha, beta, mu = (p[..., None] for p in numpy.broadcast_arrays(
+        *(numpy.asarray(p, dtype=float) for p in (alpha, beta, mu))))
+    HS, H0, te = scales(alpha, beta, Ne)
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        k = 1 / (36 * alpha * HS)
+        u = k * (te - t)
+        T = numpy.tanh(u)
+        S2 = 1 / numpy.cosh(u)**2
+        H = HS * T
+        dHdt = -HS * k * S2
+        dH2dt2 = -2 * HS * k**2 * T * S2
+        dH3dt3 = -2 * HS * k**3 * S2 * (2 * T**2 - S2)
+
+        R = 6 * (dHdt + 2 * H**2)
+        dRdt = 6 * (dH2dt2 + 4 * H * dHdt)
+        dR2dt2 = 6 * (dH3dt3 + 4 * dHdt**2 + 4 * H * dH2dt2)
+        floor = R < 0.0
+        R = numpy.where(floor, R_FLOOR, R)
+        dRdt = numpy.where(floor, 0.0, dRdt)
+        dR2dt2 = numpy.where(floor, 0.0, dR2dt2)
+
+        log_R = numpy.log(R / mu**2)
+        F = 1 + (2 * alpha + beta) * R + 2 * beta * R * log_R
+        dFdR = 2 * alpha + 3 * beta + 2 * beta * log_R
+        dFdt = dFdR * dRdt
+        dF2dt2 = dFdR * dR2dt2 + 2 * beta * dRdt**2 / R
+
+        # First (-HDOT/H^2), third (FDOT/2HF) and fourth (FDDOT/HFDOT) slow roll parameters
+        Epsilon_1 = -dHdt / H**2
+        Epsilon_3 = dFdt / (2 * H * F)
+        Epsilon_4 = dF2dt2 / (H * dFdt)
+
+        # Scalar Spectral Index and Tensor-to-Scalar ratio at the start of inflation
+        e1, e3, e4 = Epsilon_1[..., 0], Epsilon_3[..., 0], Epsilon_4[..., 0]
+        n_s = 4 - 2 * numpy.sqrt(0.25 + (1 + e1 - e3 + e4) * (2 - e3 + e4) / (1 - e3)**2)
+        r = 48 * e3**2 / (1 + e3)**2
+
+    return {'t': t, 'H': H, 'dHdt': dHdt, 'R': R, 'dRdt': dRdt, 'dR2dt2': dR2dt2,
+            'F': F, 'dFdt': dFdt, 'dF2dt2': dF2dt2,
+            'epsilon_1': Epsilon_1, 'epsilon_3': Epsilon_3, 'epsilon_4': Epsilon_4,
+            'n_s': n_s, 'r': r}
+
+
+def solve(alpha, beta, mu, Ne=60.0, n_points=100):
+    '''
+    Analytic slow-roll solution over a grid of parameter points
+
+    :param alpha, beta, mu: model parameters, arrays of broadcastable shapes
+    :param Ne: number of e-foldings
+    :param n_points: number of points of the time vector from 0 to t_e
+    :return: dictionary of arrays of the grid shape followed by the time axis: t, H, dHdt,
+             R, dRdt, dR2dt2, F, dFdt, dF2dt2, epsilon_1, epsilon_3, epsilon_4; and of the
+             grid shape: n_s, r
+    '''
+    te = scales(alpha, beta, Ne)[2]
+    t = te[..., None] * numpy.linspace(0.0, 1.0, n_points)
+    return _evaluate(alpha, beta, mu, t, Ne)
+
+
+def spectral_index(alpha, beta, mu, Ne=60.0):
+    '''
+    Scalar Spectral Index and Tensor-to-Scalar ratio over a grid of parameter points
+
+    Only the start of inflation is evaluated, so that a grid of millions of points takes
+    seconds.
+
+    :param alpha, beta, mu: model parameters, arrays of broadcastable shapes
+    :param Ne: number of e-foldings
+    :return: (n_s, r) of the grid shape
+    '''
+    sol = _evaluate(alpha, beta, mu, numpy.zeros(1), Ne)
+    return sol['n_s'], sol['r']
@@ -0,0 +1,239 @@
+# Setting up the batched integrator for the region of Inflation
+# Author: Arun Mathew
+#
+# The field equations of many models are integrated in lockstep: the states of N models
+# form an (N, 3) array and every Runge-Kutta stage is a single NumPy expression over the
+# whole batch. The scheme is the DOP853 stepper of compiled.py, with its own step size,
+# error control, output grid and end-of-inflation event for every member of the batch.
+# Members which finish, stop at epsilon_1 = 1 or fail drop out of the batch, so the cost of
+# an iteration is set by the members still running.
+import numpy
+from tools import logger
+import compiled
+from compiled import N_STAGES, N_STAGES_EXTENDED, INTERPOLATOR_POWER, A, B, C, E3, E5, D
+from compiled import SAFETY, MIN_FACTOR, MAX_FACTOR, ERROR_EXPONENT
+
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Batch')
+
+
+#####################################################################################
+# Vectorized field equations, see fieldeqs.model.field_eqs; y and c hold one row per model
+def field_eqs(t, y, c):
+    Xi = y[:, 0]
+    Psi = y[:, 1]
+    The = y[:, 2]
+    dydt = numpy.empty_like(y)
+    dydt[:, 0] = Psi
+    dydt[:, 1] = (c[:, 1] * The + c[:, 3] * Psi * Psi) / Xi + Xi * (c[:, 4] * Psi + c[:, 2] * Xi * Xi - c[:, 0])
+    dydt[:, 2] = c[:, 6] - c[:, 5] * Xi * The
+    return dydt
+
+
+# Event surface of the end of inflation: epsilon_1 - 1
+def end_of_inflation(y):
+    return - y[:, 1] / (y[:, 0] * y[:, 0]) - 1.0
+
+
+#####################################################################################
+def _combine(w, K):
+    # Weighted sum of stages, sum_j w[j] K[j], for K of shape (stages, n, 3)
+    return numpy.dot(w, K[:len(w)].reshape(len(w), -1)).reshape(K.shape[1:])
+
+
+def _rms(x):
+    return numpy.sqrt(numpy.mean(x * x, axis=1))
+
+
+def _initial_step(c, t0, y0, f0, t_bound, rtol, atol):
+    # compiled._initial_step for every member of the batch
+    interval_length = numpy.abs(t_bound - t0)
+    scale = atol + numpy.abs(y0) * rtol
+    d0 = _rms(y0 / scale)
+    d1 = _rms(f0 / scale)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        h0 = numpy.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / d1)
+        h0 = numpy.minimum(h0, interval_length)
+        f1 = field_eqs(t0 + h0, y0 + h0[:, None] * f0, c)
+        d2 = _rms((f1 - f0) / scale) / h0
+        h1 = numpy.where((d1 <= 1e-15) & (d2 <= 1e-15), numpy.maximum(1e-6, h0 * 1e-3),
+                         (0.01 / numpy.maximum(d1, d2)) ** (1.0 / 8.0))
+    return numpy.where(interval_length == 0, 0.0, numpy.minimum(numpy.minimum(100 * h0, h1), interval_length))
+
+
+def _dense_coefficients(c, t_old, h, y_old, y, f_old, f, K):
+    # compiled._dense_coefficients for every member of the batch, K of shape (stages, n, 3)
+    hc = h[:, None]
+    for s in range(N_STAGES + 1, N_STAGES_EXTENDED):
+        dy = _combine(A[s, :s], K)
+        K[s] = field_eqs(t_old + C[s] * h, y_old + hc * dy, c)
+    F = numpy.empty((INTERPOLATOR_POWER,) + y.shape)
+    delta_y = y - y_old
+    F[0] = delta_y
+    F[1] = hc * f_old - delta_y
+    F[2] = 2 * delta_y - hc * (f + f_old)
+    F[3:] = hc * numpy.dot(D, K.reshape(N_STAGES_EXTENDED, -1)).reshape((-1,) + y.shape)
+    return F
+
+
+def _dense_eval(F, y_old, x):
+    y = numpy.zeros_like(y_old)
+    xc = x[:, None]
+    for i in range(INTERPOLATOR_POWER):
+        y += F[INTERPOLATOR_POWER - 1 - i]
+        if i % 2 == 0:
+            y *= xc
+        else:
+            y *= 1 - xc
+    return y + y_old
+
+
+#####################################################################################
+def solve(models, tspans, ICs, t_evals, rtol=1e-13, atol=1e-15, stop=True):
+    '''
+    Solve the field equations of several models in lockstep with DOP853
+
+    :param models: list of objects of the class fieldeqs.model
+    :param tspans: integration interval [t0, t_bound] of every model
+    :param ICs: initial values of [Xi, Psi, Theta] of every model
+    :param t_evals: times at which the solution of every model is stored
+    :param rtol: relative tolerance
+    :param atol: absolute tolerance
+    :param stop: terminate the integration of a model at the end of inflation (epsilon_1 = 1)
+    :return: list of solutions with the fields of scipy.integrate.solve_ivp, one per model
+    '''
+    from scipy.optimize import OptimizeResult
+    n = len(models)
+    c = numpy.array([compiled.coefficients(model_object) for model_object in models]).reshape(n, 7)
+    tspans = numpy.asarray(tspans, dtype=float).reshape(n, 2)
+    t_bound = tspans[:, 1]
+    t = tspans[:, 0].copy()
+    y = numpy.asarray(ICs, dtype=float).reshape(n, 3).copy()
+
+    # Output grids, padded with +inf so that the next grid point of a member always exists
+    n_eval = numpy.array([len(t_eval) for t_eval in t_evals], dtype=int)
+    T = numpy.full((n, n_eval.max(initial=0) + 1), numpy.inf)
+    for i, t_eval in enumerate(t_evals):
+        T[i, :n_eval[i]] = t_eval
+    Y = numpy.full(T.shape + (3,), numpy.nan)
+    i_eval = numpy.zeros(n, dtype=int)
+
+    f = field_eqs(t, y, c)
+    h_abs = _initial_step(c, t, y, f, t_bound, rtol, atol)
+    nfev = numpy.full(n, 2)
+    nsteps = numpy.zeros(n, dtype=int)
+    nrejected = numpy.zeros(n, dtype=int)
+    status = numpy.zeros(n, dtype=int)
+    t_event = numpy.full(n, numpy.nan)
+    y_event = numpy.full((n, 3), numpy.nan)
+    g_old = end_of_inflation(y)
+    rejected = numpy.zeros(n, dtype=bool)  # the current step of a member was rejected before
+    running = t < t_bound
+
+    while running.any():
+        a = numpy.nonzero(running)[0]
+        ta = t[a]
+
+        # Step sizes; a member fails when a rejected step falls below the spacing of floats
+        min_step = 10 * numpy.abs(numpy.nextafter(ta, numpy.inf) - ta)
+        fail = rejected[a] & (h_abs[a] < min_step)
+        if fail.any():
+            status[a[fail]] = -1
+            running[a[fail]] = False
+            a, ta, min_step = a[~fail], ta[~fail], min_step[~fail]
+            if len(a) == 0:
+                break
+        h_abs[a] = numpy.where(rejected[a], h_abs[a], numpy.maximum(h_abs[a], min_step))
+        t_new = numpy.minimum(ta + h_abs[a], t_bound[a])
+        h = t_new - ta
+        h_abs[a] = numpy.abs(h)
+        hc = h[:, None]
+
+        # Stages of the step
+        ca, ya, fa = c[a], y[a], f[a]
+        K = numpy.empty((N_STAGES_EXTENDED, len(a), 3))
+        K[0] = fa
+        for s in range(1, N_STAGES):
+            dy = _combine(A[s, :s], K)
+            K[s] = field_eqs(ta + C[s] * h, ya + hc * dy, ca)
+        y_new = ya + hc * _combine(B, K)
+        f_new = field_eqs(t_new, y_new, ca)
+        K[N_STAGES] = f_new
+        nfev[a] += N_STAGES
+
+        # Error estimate and step-size control
+        scale = atol + numpy.maximum(numpy.abs(ya), numpy.abs(y_new)) * rtol
+        err5_norm_2 = numpy.sum((_combine(E5, K) / scale) ** 2, axis=1)
+        err3_norm_2 = numpy.sum((_combine(E3, K) / scale) ** 2, axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            error_norm = numpy.where((err5_norm_2 == 0) & (err3_norm_2 == 0), 0.0,
+                                     h_abs[a] * err5_norm_2 / numpy.sqrt((err5_norm_2 + 0.01 * err3_norm_2) * 3))
+            factor = SAFETY * error_norm ** ERROR_EXPONENT
+        accept = error_norm < 1
+        grow = numpy.where(error_norm == 0, MAX_FACTOR, numpy.minimum(MAX_FACTOR, factor))
+        grow = numpy.where(rejected[a], numpy.minimum(1.0, grow), grow)
+        h_abs[a] *= numpy.where(accept, grow, numpy.maximum(MIN_FACTOR, factor))
+        nrejected[a[~accept]] += 1
+        rejected[a] = ~accept
+        if not accept.any():
+            continue
+
+        # Accepted steps
+        m = numpy.nonzero(accept)[0]
+        a = a[m]
+        ta, ya, fa, ca, h = ta[m], ya[m], fa[m], ca[m], h[m]
+        t_new, y_new, f_new, K = t_new[m], y_new[m], f_new[m], K[:, m]
+        nsteps[a] += 1
+        t_stop = t_new.copy()
+
+        g_new = end_of_inflation(y_new)
+        event = (g_old[a] < 0) & (g_new >= 0) if stop else numpy.zeros(len(a), dtype=bool)
+        g_old[a] = g_new
+        # Dense output only for the members with an event or a grid point inside the step
+        dense = event | (T[a, i_eval[a]] < t_new)
+        F = None
+        if dense.any():
+            F = numpy.zeros((INTERPOLATOR_POWER, len(a), 3))
+            d = numpy.nonzero(dense)[0]
+            F[:, d] = _dense_coefficients(ca[d], ta[d], h[d], ya[d], y_new[d], fa[d], f_new[d], K[:, d])
+            nfev[a[d]] += N_STAGES_EXTENDED - N_STAGES - 1
+        for k in numpy.nonzero(event)[0]:
+            Fk = numpy.ascontiguousarray(F[:, k])
+            x = compiled._locate_event(Fk, ya[k], ta[k], h[k])
+            t_stop[k] = ta[k] + x * h[k]
+            y_event[a[k]] = compiled._dense_eval(Fk, ya[k], x)
+            t_event[a[k]] = t_stop[k]
+            status[a[k]] = 1
+
+        # Dense output at the grid points inside the step
+        pending = T[a, i_eval[a]] <= t_stop
+        while pending.any():
+            p = numpy.nonzero(pending)[0]
+            te = T[a[p], i_eval[a[p]]]
+            y_dense = _dense_eval(F[:, p], ya[p], (te - ta[p]) / h[p])
+            Y[a[p], i_eval[a[p]]] = numpy.where((te == t_new[p])[:, None], y_new[p], y_dense)
+            i_eval[a[p]] += 1
+            pending[p] = T[a[p], i_eval[a[p]]] <= t_stop[p]
+
+        t[a] = t_new
+        y[a] = y_new
+        f[a] = f_new
+        running[a] = (status[a] == 0) & (t_new < t_bound[a])
+
+    messages = {-1: 'Required step size is less than spacing between numbers.',
+                0: 'The solver successfully reached the end of the integration interval.',
+                1: 'A termination event occurred.'}
+    solutions = []
+    for i in range(n):
+        k = i_eval[i]
+        t_events = [t_event[i:i + 1] if status[i] == 1 else numpy.empty(0)] if stop else None
+        y_events = [y_event[i:i + 1] if status[i] == 1 else numpy.empty((0, 3))] if stop else None
+        solutions.append(OptimizeResult(t=T[i, :k].copy(), y=Y[i, :k].T.copy(), sol=None,
+                                        t_events=t_events, y_events=y_events,
+                                        nfev=int(nfev[i]), njev=0, nlu=0,
+                                        nsteps=int(nsteps[i]), nrejected=int(nrejected[i]),
+                                        status=int(status[i]), message=messages[status[i]],
+                                        success=status[i] >= 0))
+    return solutions
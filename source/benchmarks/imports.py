@@ -0,0 +1,52 @@
+# Benchmark: import time of the modules of source
+# Author: Arun Mathew
+#
+# Every module is imported in a fresh interpreter, as in a worker process of a sweep. The
+# import time is the cumulative time reported by python -X importtime (best of repeat
+# runs), and the heavy dependencies loaded by the import are listed.
+#
+# Run from the source directory:
+#   $ python benchmarks/imports.py
+import os
+import subprocess
+import sys
+
+SOURCE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# Modules of source, in the order of their dependencies
+MODULES = ('fieldeqs', 'events', 'tools.plotter', 'tools.datafile', 'tools.loader', 'cache', 'store',
+           'secular', 'analytic', 'inflation', 'reheating', 'pipeline', 'sweep', 'dop853', 'compiled', 'batch', 'main')
+
+# Dependencies that should only be loaded by the features that need them
+HEAVY = ('scipy', 'scipy.integrate', 'scipy.optimize', 'matplotlib', 'numba', 'sympy')
+
+PROBE = ("import sys, %s; "
+         "print(','.join(m for m in %r if m in sys.modules))")
+
+
+#####################################################################################
+def import_time(module, repeat=5):
+    '''
+    Import a module in fresh interpreters
+
+    :return: (best cumulative import time in seconds, heavy dependencies loaded)
+    '''
+    best = float('inf')
+    loaded = ''
+    for _ in range(repeat):
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE % (module, HEAVY)],
+                             cwd=SOURCE_DIR, capture_output=True, text=True, check=True)
+        for line in run.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                best = min(best, int(fields[1]) * 1e-6)
+        loaded = run.stdout.strip()
+    return best, loaded
+
+
+#####################################################################################
+if __name__ == '__main__':
+    print('%-16s %12s   %s' % ('module', 'import [s]', 'heavy dependencies loaded'))
+    for module in MODULES:
+        seconds, loaded = import_time(module)
+        print('%-16s %12.4f   %s' % (module, seconds, loaded or '-'))
@@ -0,0 +1,58 @@
+# Benchmark: LSODA with and without the analytic Jacobian of the field equations
+# Author: Arun Mathew
+#
+# Run from the source directory:
+#   $ python benchmarks/jacobian.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+
+from scipy.integrate import solve_ivp
+from fieldeqs import *
+
+
+#####################################################################################
+def run(f_R_gravity, tspan, IC, atol, rtol, use_jac, events=None, repeat=5):
+    '''
+    Solve the field equations repeat times and return the solution of the last run
+    together with the best wall time.
+    '''
+    jac = f_R_gravity.field_jac if use_jac else None
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sol = solve_ivp(f_R_gravity.field_eqs, tspan, IC, method='LSODA',
+                        atol=atol, rtol=rtol, jac=jac, events=events)
+        best = min(best, time.perf_counter() - start)
+    return sol, best
+
+
+def end_of_inflation(t, y):
+    return -y[1] / pow(y[0], 2) - 1
+
+end_of_inflation.terminal = True
+
+
+#####################################################################################
+if __name__ == '__main__':
+    # Default parameters of main.py
+    f_R_gravity = model(16.5*pow(t_P, 2), 0.3*pow(t_P, 2), pow(10, -4)*pow(t_P, -1), pow(10, 13), 1/3)
+    tau_1, tau_osc = f_R_gravity.timescales()[0:2]
+
+    cases = []
+    # Inflation: same tolerances and time span as inflation.inflation_solver
+    IC = [1, f_R_gravity.init_hubble_slope(), 0]
+    cases.append(('inflation', [0, tau_1*50], IC, 1e-15, 1e-13, [end_of_inflation]))
+    # Reheating: first 50 oscillations with the tolerances of reheating.reheating_solver
+    sol, _ = run(f_R_gravity, [0, tau_1*50], IC, 1e-15, 1e-13, True, [end_of_inflation], repeat=1)
+    t_e = sol.t_events[0][0]
+    cases.append(('reheating (50 osc.)', [t_e, t_e + 50*tau_osc], sol.y_events[0][0], 1e-16, 2.3e-14, None))
+
+    print('%-22s %-10s %10s %10s %10s %12s' % ('case', 'jac', 'nfev', 'njev', 'nlu', 'wall [s]'))
+    for name, tspan, y0, atol, rtol, events in cases:
+        for use_jac in (False, True):
+            sol, wall = run(f_R_gravity, tspan, y0, atol, rtol, use_jac, events)
+            print('%-22s %-10s %10d %10d %10d %12.4f' % (name, 'analytic' if use_jac else 'FD',
+                                                         sol.nfev, sol.njev, sol.nlu, wall))
@@ -0,0 +1,356 @@
+# Benchmark: suite of the inflation, reheating and sweep workloads
+# Author: Arun Mathew
+#
+# Every benchmark is a function registered with @benchmark that sets up its workload and
+# returns the callable to be timed, so that the set up is not part of the timing, or the
+# callable and its count of units if the count is only known after the set up. The
+# callable is run once to warm up (numba compilation, caches of the imports) and then
+# repeat times; the best and the median wall time are kept together with the throughput
+# in the unit of the benchmark (solves, points, oscillations, ...).
+#
+# The results of every run are appended to a JSON history together with the git revision
+# and the versions of Python, NumPy and SciPy. Each benchmark is compared with the last
+# run in the history on the same machine and flagged if its best time got slower than the
+# threshold. Figures are not drawn and the console only shows warnings, the log file and
+# the structured records are written as in a normal run.
+#
+# Run from the source directory:
+#   $ python benchmarks/suite.py                 # all benchmarks
+#   $ python benchmarks/suite.py --quick         # skip the long ones
+#   $ python benchmarks/suite.py reheating io    # benchmarks whose name starts with these
+import argparse
+import atexit
+import functools
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SOURCE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, SOURCE_DIR)
+
+import numpy
+from fieldeqs import *
+from tools import plotter
+from tools import datafile
+from tools import loader
+from inflation import inflation
+from reheating import reheating
+from sweep import parameter_grid, run_sweep
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+
+# Slow down of the best time against the last run that is reported as a regression
+THRESHOLD = 0.20
+
+# Registered benchmarks by name: (set up function, repeat, unit, count per run, long)
+BENCHMARKS = {}
+
+
+#####################################################################################
+def benchmark(name, repeat=5, unit='runs', count=1, long=False):
+    '''
+    Register a benchmark
+
+    :param name: name of the benchmark
+    :param repeat: number of timed runs
+    :param unit: unit of the throughput
+    :param count: number of units per run
+    :param long: skipped with --quick
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, repeat, unit, count, long)
+        return setup
+    return register
+
+
+def default_model():
+    # Model of the Default setting of main.py
+    return model(
+        16.5*pow(t_P, 2),         # value of the parameter alpha
+        0.3 * pow(t_P, 2),        # value of the parameter beta
+        pow(10, -4)*pow(t_P,-1),  # value of the parameter mu
+        pow(10, 13),              # Energy of the particles created
+        1/3                       # Equation of State P = omega rho
+    )
+
+
+def end_of_inflation():
+    # Initial conditions of reheating for the Default setting
+    INF = inflation(default_model(), "None")
+    INF.inflation_solver()
+    return [INF.t_end] + list(INF.y_end)
+
+
+#####################################################################################
+# > Inflation
+@benchmark('inflation', repeat=20, unit='solves')
+def bench_inflation():
+    f_R_gravity = default_model()
+    return lambda: inflation(f_R_gravity, "None").inflation_solver()
+
+
+@benchmark('diagnostics', repeat=20, unit='points')
+def bench_diagnostics():
+    f_R_gravity = default_model()
+    Time, Xi, Psi = inflation(f_R_gravity, "None").inflation_solver()[:3]
+
+    def run():
+        # The slow-roll parameters and the spectral index as used by the scripts
+        f_R_gravity.epsilon_3(Time, Xi, Psi)
+        f_R_gravity.epsilon_4(Time, Xi, Psi)
+        f_R_gravity.spectral_index(Time, Xi, Psi)
+    return run, len(Time)
+
+
+@benchmark('analytic-screen', repeat=5, unit='points', count=1000 * 1000)
+def bench_analytic_screen():
+    import analytic
+    # Grid of 1000 x 1000 points of alpha and beta around the parameters of fix_beta.py
+    alpha = numpy.logspace(7, 10, 1000)[:, None] * pow(t_P, 2)
+    beta = numpy.logspace(7, 10, 1000)[None, :] * pow(t_P, 2)
+    mu = pow(10, -1.0) / math.sqrt(12 * 9.0*pow(10, 8) * pow(t_P, 2))
+    return lambda: analytic.spectral_index(alpha, beta, mu)
+
+
+#####################################################################################
+# > Reheating over 10, 100 and 5000 oscillations, with the engine of main.py and with
+#   the full field equations
+def reheating_benchmark(n_periods, engine):
+    def setup():
+        REH_IC = end_of_inflation()
+        f_R_gravity = default_model()
+        return lambda: reheating(f_R_gravity, REH_IC, "None", engine=engine,
+                                 n_periods=n_periods).reheating_solver()
+    return setup
+
+
+for n_periods, repeat in ((10, 5), (100, 3), (5000, 3)):
+    benchmark('reheating-%d' % n_periods, repeat=repeat, unit='oscillations',
+              count=n_periods)(reheating_benchmark(n_periods, 'auto'))
+for n_periods, repeat, long in ((10, 5, False), (100, 3, False), (5000, 1, True)):
+    benchmark('reheating-full-%d' % n_periods, repeat=repeat, unit='oscillations',
+              count=n_periods, long=long)(reheating_benchmark(n_periods, 'full'))
+
+
+#####################################################################################
+# > Parameter sweeps of main.py, without the solution cache and the sweep store: with the
+#   settings of main.py (LSODA, warm started) and with the batched DOP853 backend
+def sweep_benchmark(grid, backend, warm_start):
+    def setup():
+        points = grid()
+        return lambda: run_sweep(points, workers=os.cpu_count(), backend=backend, warm_start=warm_start)
+    return setup
+
+
+def sweep_beta_grid():
+    alpha = 2.572*pow(10,8)*pow(t_P, 2)
+    mu    = pow(10,-4) * pow(t_P, -1)
+    return parameter_grid(alpha, [(1 + i/4)*pow(10,6)*pow(t_P, 2) for i in range(1, 100, 1)], mu, pow(10, 13), 1/3)
+
+
+def sweep_alpha_grid():
+    beta = 0.3*pow(t_P, 2)
+    mu   = pow(10,-4) * pow(t_P, -1)
+    return parameter_grid([(1 + i/4)*pow(t_P, 2) for i in range(1, 100, 1)], beta, mu, pow(10, 13), 1/3)
+
+
+for name, grid in (('beta', sweep_beta_grid), ('alpha', sweep_alpha_grid)):
+    benchmark('sweep-%s' % name, repeat=3, unit='points', count=99,
+              long=True)(sweep_benchmark(grid, 'scipy', True))
+    benchmark('sweep-%s-batch' % name, repeat=3, unit='points', count=99,
+              long=True)(sweep_benchmark(grid, 'batch', False))
+
+
+# > A line of neighbouring points solved in order, from scratch and warm started
+def sweep_line(warm_start):
+    grid = parameter_grid([(15 + i/6)*pow(t_P, 2) for i in range(20)], 0.3*pow(t_P, 2),
+                          pow(10,-4) * pow(t_P, -1), pow(10, 13), 1/3)
+    return lambda: run_sweep(grid, workers=1, warm_start=warm_start)
+
+
+@benchmark('sweep-line', repeat=3, unit='points', count=20)
+def bench_sweep_line():
+    return sweep_line(False)
+
+
+@benchmark('sweep-line-warm', repeat=3, unit='points', count=20)
+def bench_sweep_line_warm():
+    return sweep_line(True)
+
+
+#####################################################################################
+# > File I/O of a reheating trajectory of 100 oscillations (10000 points)
+@functools.lru_cache(maxsize=None)
+def trajectory():
+    REH = reheating(default_model(), end_of_inflation(), "None", n_periods=100)
+    Time, Xi, Psi, The = REH.reheating_solver()
+    return {'Time': Time, 'Xi': Xi, 'Psi': Psi, 'Theta': The}, {'title': 'Reheating Data'}
+
+
+def io_benchmark(run):
+    # The benchmark runs in a temporary directory which is removed at exit
+    def setup():
+        directory = tempfile.mkdtemp(prefix='scalaron_bench_')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        columns, metadata = trajectory()
+        path = os.path.join(directory, 'reh_data.npz')
+        datafile.write(path, columns, metadata)
+        datafile.to_text(path)
+        return (lambda: run(path, columns, metadata)), len(columns['Time'])
+    return setup
+
+
+def write_npz(path, columns, metadata):
+    datafile.write(path, columns, metadata)
+
+
+def read_npz(path, columns, metadata):
+    for values in datafile.read(path).values():
+        numpy.asarray(values).sum()
+
+
+def write_text(path, columns, metadata):
+    datafile.to_text(path)
+
+
+def load_text(path, columns, metadata):
+    # Text file without a binary copy: parsed and cached in the sidecar, then loaded from it
+    text_path = path[:-len('.npz')] + '.txt'
+    os.utime(path, ns=(0, 0))
+    if os.path.exists(text_path + '.npz'):
+        os.remove(text_path + '.npz')
+    loader.load(text_path)
+    loader.load(text_path)
+
+
+for name, run in (('io-write-npz', write_npz), ('io-read-npz', read_npz),
+                  ('io-write-text', write_text), ('io-load-text', load_text)):
+    benchmark(name, repeat=10, unit='points')(io_benchmark(run))
+
+
+#####################################################################################
+def measure(name):
+    '''
+    Set up and time a benchmark
+
+    :return: dictionary of the results
+    '''
+    setup, repeat, unit, count, long = BENCHMARKS[name]
+    run = setup()
+    if isinstance(run, tuple):
+        run, count = run
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {'best': best, 'median': statistics.median(times), 'repeat': repeat,
+            'unit': unit, 'count': count, 'throughput': count / best}
+
+
+def revision():
+    # Git revision of the tree, marked if there are local changes
+    try:
+        head = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SOURCE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=SOURCE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ('+' if dirty else '')
+
+
+def environment():
+    import scipy
+    return {'machine': platform.node(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': numpy.__version__, 'scipy': scipy.__version__}
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as history_file:
+        return json.load(history_file)
+
+
+def write_history(path, history):
+    # Written atomically, so an interrupted run does not lose the history
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as history_file:
+        json.dump(history, history_file, indent=1)
+    os.replace(tmp_path, path)
+
+
+def compare(results, history, machine):
+    '''
+    Compare the results with the last run of each benchmark on the same machine
+
+    :return: dictionary of name: (best time of the last run, revision of the last run)
+    '''
+    previous = {}
+    for run in reversed(history):
+        if run['environment']['machine'] != machine:
+            continue
+        for name, result in run['results'].items():
+            if name in results and name not in previous:
+                previous[name] = (result['best'], run['revision'])
+    return previous
+
+
+#####################################################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark suite of Scalaron-Reheating')
+    parser.add_argument('names', nargs='*', help='run the benchmarks whose name starts with one of these')
+    parser.add_argument('--quick', action='store_true', help='skip the long benchmarks')
+    parser.add_argument('--history', default=HISTORY_FILE, help='JSON history of the results')
+    parser.add_argument('--no-save', action='store_true', help='do not add the results to the history')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='relative slow down reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    args = parser.parse_args()
+
+    plotter.configure(draw=False)
+    logger.console_level(logging.WARNING)
+
+    names = [name for name, (setup, repeat, unit, count, long) in BENCHMARKS.items()
+             if (not args.names or name.startswith(tuple(args.names))) and not (args.quick and long)]
+    history = read_history(args.history)
+    env = environment()
+
+    results = {}
+    print('%-20s %12s %12s %16s' % ('benchmark', 'best [s]', 'median [s]', 'throughput'))
+    for name in names:
+        results[name] = measure(name)
+        result = results[name]
+        print('%-20s %12.4f %12.4f %10.1f %s/s' % (name, result['best'], result['median'],
+                                                   result['throughput'], result['unit']))
+
+    regressions = []
+    previous = compare(results, history, env['machine'])
+    if previous:
+        print('\n%-20s %12s %12s %8s   %s' % ('benchmark', 'last [s]', 'now [s]', 'change', 'last revision'))
+        for name, (best, last_revision) in previous.items():
+            change = results[name]['best'] / best - 1
+            flag = ''
+            if change > args.threshold:
+                regressions.append(name)
+                flag = '   REGRESSION'
+            print('%-20s %12.4f %12.4f %+7.1f%%   %s%s' % (name, best, results[name]['best'], 100 * change,
+                                                         last_revision, flag))
+
+    if not args.no_save:
+        history.append({'time': time.time(), 'revision': revision(), 'environment': env, 'results': results})
+        write_history(args.history, history)
+        print('\nResults added to %s.' % args.history)
+    if args.check and regressions:
+        sys.exit(1)
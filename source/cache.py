@@ -0,0 +1,146 @@
+# Setting up the solution cache for the region of Inflation
+# Author: Arun Mathew
+#
+# Solutions of the field equations are stored on disk as compressed NumPy archives named by
+# a SHA-256 hash of the model parameters, the initial conditions, the time grid, the solver
+# settings and the source code of the modules that produce the trajectory. Repeated solves
+# with the same inputs load the archive instead of integrating again. The least recently
+# used archives are removed once the cache grows beyond its size limit.
+import hashlib
+import os
+import tempfile
+import numpy
+from tools import logger
+
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Cache')
+
+
+#####################################################################################
+# Modules on the solve path of inflation whose source enters the cache key, so that a code
+# change invalidates the cache: the field equations, the terminal event at epsilon_1 = 1,
+# the instrumented solve_ivp and the compiled and batch backends with their tableau
+CODE_FILES = ('fieldeqs.py', 'events.py', 'inflation.py', 'instrument.py', 'compiled.py', 'dop853.py',
+              'batch.py')
+
+
+def code_version():
+    digest = hashlib.sha256()
+    source_Dir = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(source_Dir, name), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+#####################################################################################
+class solution_cache():
+
+    def __init__(self, directory=None, max_bytes=1024 * pow(2, 20)):
+        '''
+        :param directory: cache directory, by default op_data/cache at the root directory
+        :param max_bytes: size limit of the cache in bytes
+        '''
+        if directory is None:
+            root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+            directory = root_Dir + "/op_data/cache"
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = code_version()
+
+    #####################################################################################
+    def key(self, model_object, tspan, IC, t_eval, rtol, atol, method):
+        '''
+        Hash of everything that determines a solution of the field equations
+
+        :return: hexadecimal key of the solution
+        '''
+        digest = hashlib.sha256(self.version.encode())
+        for parameter in model_object.parameters:
+            digest.update(float(getattr(model_object, parameter)).hex().encode())
+        for value in list(tspan) + list(IC) + [rtol, atol]:
+            digest.update(float(value).hex().encode())
+        if t_eval is not None:
+            digest.update(numpy.ascontiguousarray(t_eval, dtype=float).tobytes())
+        digest.update(str(method).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    #####################################################################################
+    def get(self, key):
+        '''
+        Load a cached solution
+
+        :param key: key of the solution, see key()
+        :return: solution with the fields of scipy.integrate.solve_ivp, or None
+        '''
+        from scipy.optimize import OptimizeResult
+        path = self.path(key)
+        try:
+            with numpy.load(path) as archive:
+                n_events = int(archive['n_events'])
+                sol = OptimizeResult(t=archive['t'], y=archive['y'], sol=None,
+                                     t_events=[archive['t_events_%d' % i] for i in range(n_events)] or None,
+                                     y_events=[archive['y_events_%d' % i] for i in range(n_events)] or None,
+                                     nfev=int(archive['nfev']), njev=int(archive['njev']),
+                                     nlu=int(archive['nlu']), status=int(archive['status']),
+                                     message=str(archive['message']))
+        except (OSError, KeyError, ValueError):
+            return None
+        sol.success = sol.status >= 0
+        # Mark the entry as recently used for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        SDlogger.info('Loaded cached solution %s.', key[:12])
+        return sol
+
+    def put(self, key, sol):
+        '''
+        Store a solution and evict the least recently used entries beyond the size limit
+
+        :param key: key of the solution, see key()
+        :param sol: solution returned by scipy.integrate.solve_ivp or compiled.solve
+        '''
+        events = {}
+        if sol.t_events is not None:
+            events['n_events'] = len(sol.t_events)
+            for i, (t_event, y_event) in enumerate(zip(sol.t_events, sol.y_events)):
+                events['t_events_%d' % i] = t_event
+                events['y_events_%d' % i] = y_event
+        else:
+            events['n_events'] = 0
+        # Write to a temporary file first so that concurrent readers never see a partial file
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as tmp_file:
+            numpy.savez_compressed(tmp_file, t=sol.t, y=sol.y, nfev=sol.nfev, njev=sol.njev,
+                                   nlu=sol.nlu, status=sol.status, message=sol.message, **events)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                SDlogger.info('Evicted cached solution %s.', name[:12])
+            except FileNotFoundError:
+                pass
+            total -= size
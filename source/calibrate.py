@@ -0,0 +1,236 @@
+# Setting up the calibration of the model parameters to a target n_s and r
+# Author: Arun Mathew
+#
+# The inverse problem is solved on top of inflation.inflation_solver: alpha() finds the
+# alpha that gives a target n_s for fixed beta and mu by bracketed root finding (Brent),
+# fit() finds alpha and optionally beta and mu that reproduce a target (n_s, r) by least
+# squares in the logarithms of the parameters. Both start from an estimate of the
+# emulator table (emulator.py) if one is given, or of the analytic slow-roll solution
+# (analytic.py) otherwise, so that a calibration takes a handful of integrations. Every
+# solve is kept by its parameters and reused by later iterations and calibrations.
+#
+# The parameters are given in the units of the data files: alpha and beta in t_P^2 and mu
+# in t_P^-1.
+import math
+import numpy
+from fieldeqs import *
+from inflation import inflation
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Calibrate')
+
+# Parameters that can be fitted, in the order of the model, and their default bounds
+PARAMETERS = ('alpha', 'beta', 'mu')
+BOUNDS = {'alpha': (1e-1, 1e4), 'beta': (1e-3, 1e2), 'mu': (1e-8, 1.0)}
+
+
+#####################################################################################
+class calibration():
+
+    def __init__(self, beta=0.3, mu=pow(10, -4), E=pow(10, 13), omega=1/3, backend='scipy',
+                 cache=None, emulator=None):
+        '''
+        :param beta, mu: values of beta and mu that are not fitted
+        :param E, omega: fixed model parameters
+        :param backend: integration backend of the class inflation
+        :param cache: optional cache.solution_cache of the solutions
+        :param emulator: optional emulator.emulator for the starting values
+        '''
+        self.beta, self.mu, self.E, self.omega = beta, mu, E, omega
+        self.backend = backend
+        self.cache = cache
+        self.emulator = emulator
+        self.solutions = {}  # (n_s, r, t_e) by (alpha, beta, mu)
+        self.solves = 0
+
+    #####################################################################################
+    def solve(self, alpha, beta=None, mu=None):
+        '''
+        Solve inflation, or reuse an earlier solve of the same parameters
+
+        :return: (n_s, r, t_e), NaN if inflation fails
+        '''
+        point = (float(alpha), float(self.beta if beta is None else beta), float(self.mu if mu is None else mu))
+        if point not in self.solutions:
+            self.solves += 1
+            try:
+                INF = inflation(model(point[0] * pow(t_P, 2), point[1] * pow(t_P, 2), point[2] * pow(t_P, -1),
+                                      self.E, self.omega), "None", backend=self.backend, cache=self.cache)
+                n_s, r, Status = INF.inflation_solver()[8:]
+                self.solutions[point] = (n_s, r, INF.t_end) if Status == 'OK' else (numpy.nan,) * 3
+            except Exception as error:
+                SDlogger.error('Inflation failed for (alpha, beta, mu) = %s: %s', point, error)
+                self.solutions[point] = (numpy.nan,) * 3
+            SDlogger.info('Solve %d: (alpha, beta, mu) = %s gives n_s = %f, r = %f.',
+                          self.solves, point, *self.solutions[point][:2])
+        return self.solutions[point]
+
+    def estimate(self, n_s, beta=None, mu=None, alpha_range=(1.0, 1000.0)):
+        '''
+        Starting value of alpha for a target n_s from the emulator or the analytic solution
+
+        :return: alpha, or None if the estimate of n_s does not cross the target
+        '''
+        beta = self.beta if beta is None else beta
+        mu = self.mu if mu is None else mu
+        alphas = numpy.logspace(math.log10(alpha_range[0]), math.log10(alpha_range[1]), 401)
+        values = None
+        if self.emulator is not None:
+            values = self.emulator.predict(alphas, beta, mu)['n_s']
+        if values is None or not numpy.any(numpy.isfinite(values)):
+            import analytic
+            values = analytic.spectral_index(alphas * pow(t_P, 2), beta * pow(t_P, 2), mu * pow(t_P, -1))[0]
+        # First crossing of the target, interpolated in log alpha
+        difference = values - n_s
+        crossing = numpy.flatnonzero(numpy.isfinite(difference[:-1]) & numpy.isfinite(difference[1:])
+                                     & (numpy.sign(difference[:-1]) != numpy.sign(difference[1:])))
+        if len(crossing) == 0:
+            return None
+        i = crossing[0]
+        w = difference[i] / (difference[i] - difference[i + 1])
+        return float(pow(10.0, math.log10(alphas[i]) + w * (math.log10(alphas[i + 1]) - math.log10(alphas[i]))))
+
+    #####################################################################################
+    def alpha(self, n_s, beta=None, mu=None, alpha0=None, factor=1.5, max_expand=20, rtol=1e-6):
+        '''
+        alpha that gives the target n_s for fixed beta and mu, by Brent's method
+
+        :param n_s: target Scalar Spectral Index
+        :param alpha0: starting value, estimated by estimate() if None
+        :param factor: ratio of the initial bracket around alpha0, widened by itself until
+                       n_s - target changes sign
+        :param max_expand: largest number of widenings of the bracket
+        :param rtol: relative tolerance of alpha
+        :return: OptimizeResult with alpha, beta, mu, n_s, r, t_e, solves, success, message
+        '''
+        from scipy.optimize import OptimizeResult, brentq
+        beta = self.beta if beta is None else beta
+        mu = self.mu if mu is None else mu
+        solves = self.solves
+        if alpha0 is None:
+            alpha0 = self.estimate(n_s, beta, mu) or 10.0
+        f = lambda alpha: self.solve(alpha, beta, mu)[0] - n_s
+
+        def failure(message):
+            SDlogger.error('%s', message)
+            return OptimizeResult(alpha=numpy.nan, beta=beta, mu=mu, n_s=numpy.nan, r=numpy.nan,
+                                  t_e=numpy.nan, solves=self.solves - solves, success=False,
+                                  message=message)
+
+        # Bracket, widened geometrically around the starting value. An end at which
+        # inflation fails (NaN) is moved back towards the other end instead.
+        low, high = alpha0 / factor, alpha0 * factor
+        f_low, f_high = f(low), f(high)
+        expand = 0
+        while not (f_low * f_high <= 0) and expand < max_expand:
+            expand += 1
+            if not numpy.isfinite(f_low) and not numpy.isfinite(f_high):
+                break
+            if not numpy.isfinite(f_low):
+                low = math.sqrt(low * high)
+                f_low = f(low)
+            elif not numpy.isfinite(f_high):
+                high = math.sqrt(low * high)
+                f_high = f(high)
+            # Move towards the side with the root for an increasing or decreasing n_s
+            elif abs(f_low) < abs(f_high):
+                low, high, f_high = low / factor, low, f_low
+                f_low = f(low)
+            else:
+                low, high, f_low = high, high * factor, f_high
+                f_high = f(high)
+        if not numpy.isfinite(f_low) or not numpy.isfinite(f_high):
+            return failure('Inflation fails at the bracket [%g, %g] of the target n_s.' % (low, high))
+        if not (f_low * f_high <= 0):
+            return failure('No bracket of the target n_s found.')
+
+        # Brent's method is not defined for NaN: stop at the first failed solve
+        failed = []
+        def g(alpha):
+            value = f(alpha)
+            if not numpy.isfinite(value):
+                failed.append(alpha)
+                raise FloatingPointError('Inflation fails at alpha = %g.' % alpha)
+            return value
+        try:
+            alpha = brentq(g, low, high, rtol=rtol)
+        except FloatingPointError:
+            if not failed:
+                raise
+            return failure('Inflation fails at alpha = %g inside the bracket [%g, %g] of the target n_s.'
+                           % (failed[0], low, high))
+        result = self.solve(alpha, beta, mu)
+        SDlogger.info('alpha = %f gives n_s = %f after %d solves.', alpha, result[0], self.solves - solves)
+        return OptimizeResult(alpha=alpha, beta=beta, mu=mu, n_s=result[0], r=result[1], t_e=result[2],
+                              solves=self.solves - solves, success=True, message='Target n_s reached.')
+
+    #####################################################################################
+    def fit(self, n_s, r, vary=('alpha', 'beta'), x0=None, bounds=None, sigma_n_s=1e-3, sigma_r=1e-4, **options):
+        '''
+        Parameters that reproduce a target (n_s, r), by least squares
+
+        :param n_s: target Scalar Spectral Index
+        :param r: target Tensor-to-Scalar ratio
+        :param vary: names of the fitted parameters, a subset of PARAMETERS
+        :param x0: dictionary of starting values; by default the closest node of the
+                   emulator table, or the fixed beta and mu with the alpha of alpha()
+        :param bounds: dictionary of (low, high) of the fitted parameters, see BOUNDS
+        :param sigma_n_s, sigma_r: scales of the residuals of n_s and r
+        :param options: options of scipy.optimize.least_squares
+        :return: OptimizeResult with alpha, beta, mu, n_s, r, t_e, cost, solves, success, message
+        '''
+        from scipy.optimize import OptimizeResult, least_squares
+        solves = self.solves
+        values = {'alpha': None, 'beta': self.beta, 'mu': self.mu}
+        values.update(x0 or {})
+        if self.emulator is not None and x0 is None and 'beta' in vary:
+            values.update(self.warm_start(n_s, r, values['mu'], sigma_n_s, sigma_r))
+        if values['alpha'] is None:
+            # The alpha that gives the target n_s, so that the fit starts on its contour
+            start = self.alpha(n_s, values['beta'], values['mu'])
+            values['alpha'] = start.alpha if start.success else 10.0
+        limits = dict(BOUNDS)
+        limits.update(bounds or {})
+
+        def parameters(x):
+            point = dict(values)
+            point.update({name: pow(10.0, value) for name, value in zip(vary, x)})
+            return point
+
+        def residuals(x):
+            point = parameters(x)
+            result = self.solve(point['alpha'], point['beta'], point['mu'])
+            if not numpy.isfinite(result[0]):
+                # No inflation: a large residual moves the fit back
+                return numpy.array([1e3, 1e3])
+            return numpy.array([(result[0] - n_s) / sigma_n_s, (result[1] - r) / sigma_r])
+
+        options.setdefault('diff_step', 1e-6)
+        options.setdefault('bounds', ([math.log10(limits[name][0]) for name in vary],
+                                      [math.log10(limits[name][1]) for name in vary]))
+        x0 = [min(max(math.log10(values[name]), math.log10(limits[name][0])), math.log10(limits[name][1]))
+              for name in vary]
+        fit = least_squares(residuals, x0, **options)
+        point = parameters(fit.x)
+        result = self.solve(point['alpha'], point['beta'], point['mu'])
+        SDlogger.info('Fit %s gives n_s = %f, r = %f after %d solves.', point, result[0], result[1],
+                      self.solves - solves)
+        return OptimizeResult(alpha=point['alpha'], beta=point['beta'], mu=point['mu'],
+                              n_s=result[0], r=result[1], t_e=result[2], cost=fit.cost,
+                              solves=self.solves - solves, success=fit.success, message=fit.message)
+
+    def warm_start(self, n_s, r, mu, sigma_n_s, sigma_r):
+        '''
+        Node of the emulator table that is closest to the target (n_s, r)
+
+        :return: dictionary of alpha and beta
+        '''
+        alphas = pow(10.0, self.emulator.nodes[0])
+        betas = pow(10.0, self.emulator.nodes[1])
+        table = self.emulator.predict(alphas[:, None], betas[None, :], mu)
+        misfit = ((table['n_s'] - n_s) / sigma_n_s)**2 + ((table['r'] - r) / sigma_r)**2
+        if not numpy.any(numpy.isfinite(misfit)):
+            return {}
+        i, j = numpy.unravel_index(numpy.nanargmin(misfit), misfit.shape)
+        return {'alpha': float(alphas[i]), 'beta': float(betas[j])}
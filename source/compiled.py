@@ -0,0 +1,394 @@
+# Setting up the compiled backend for the field equations
+# Author: Arun Mathew
+#
+# The right-hand side of model.field_eqs is JIT-compiled with numba, together with the
+# explicit Runge-Kutta 8(5,3) stepper of Dormand & Prince (the DOP853 scheme of
+# scipy.integrate.solve_ivp, tableau in dop853.py), which needs no Jacobian. The whole integration, including the dense output
+# at t_eval and the localization of the end of inflation, runs in compiled code without a
+# Python callback per step.
+#
+# When numba is not installed, solve() falls back to solve_ivp(method='DOP853') with the
+# NumPy field equations of the model, which uses the same scheme and step-size control.
+# numba and scipy are imported by the first call of solve(), so that the batch backend,
+# which shares the tableau and the event localization of this file, does not load numba.
+import importlib.util
+import math
+import numpy
+from tools import logger
+import dop853
+import events
+
+HAVE_NUMBA = importlib.util.find_spec('numba') is not None
+
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Compiled')
+
+
+#####################################################################################
+# Names of the functions to be compiled and whether they are, see jit_compile
+JIT_FUNCTIONS = []
+JIT_COMPILED = False
+
+
+def jit(func):
+    # Mark the function for compilation with numba in nopython mode, see jit_compile
+    JIT_FUNCTIONS.append(func.__name__)
+    return func
+
+
+def jit_compile():
+    # Replace the marked functions by their numba dispatchers. Each one is compiled (or
+    # loaded from the numba cache) at its first call; the dispatchers call each other.
+    global JIT_COMPILED
+    if not HAVE_NUMBA or JIT_COMPILED:
+        return
+    import numba
+    for name in JIT_FUNCTIONS:
+        globals()[name] = numba.njit(cache=True)(globals()[name])
+    JIT_COMPILED = True
+
+
+#####################################################################################
+# Butcher tableau of DOP853 (the one of scipy, so that both backends share one scheme)
+N_STAGES = dop853.N_STAGES
+N_STAGES_EXTENDED = dop853.N_STAGES_EXTENDED
+INTERPOLATOR_POWER = dop853.INTERPOLATOR_POWER
+A = numpy.ascontiguousarray(dop853.A)
+B = numpy.ascontiguousarray(dop853.B)
+C = numpy.ascontiguousarray(dop853.C)
+E3 = numpy.ascontiguousarray(dop853.E3)
+E5 = numpy.ascontiguousarray(dop853.E5)
+D = numpy.ascontiguousarray(dop853.D)
+
+# Step-size control of scipy's RungeKutta solvers
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+ERROR_EXPONENT = -1.0 / 8.0
+
+
+#####################################################################################
+def coefficients(model_object):
+    '''
+    Pack the precomputed field equation coefficients of a model into an array
+
+    :param model_object: object of the class fieldeqs.model
+    :return: array [c_osc, c_rho, c_k, c_psi, c_psixi, c_w, c_src]
+    '''
+    return numpy.array([model_object.c_osc, model_object.c_rho, model_object.c_k,
+                        model_object.c_psi, model_object.c_psixi, model_object.c_w,
+                        model_object.c_src])
+
+
+#####################################################################################
+# Compiled field equations, see fieldeqs.model.field_eqs
+@jit
+def field_eqs(t, y, c):
+    Xi = y[0]
+    Psi = y[1]
+    The = y[2]
+    dydt = numpy.empty(3)
+    dydt[0] = Psi
+    dydt[1] = (c[1] * The + c[3] * Psi * Psi) / Xi + Xi * (c[4] * Psi + c[2] * Xi * Xi - c[0])
+    dydt[2] = c[6] - c[5] * Xi * The
+    return dydt
+
+
+# Event surface of the end of inflation: epsilon_1 - 1
+@jit
+def end_of_inflation(y):
+    return - y[1] / (y[0] * y[0]) - 1.0
+
+
+#####################################################################################
+@jit
+def _rms(x):
+    total = 0.0
+    for i in range(x.shape[0]):
+        total += x[i] * x[i]
+    return math.sqrt(total / x.shape[0])
+
+
+@jit
+def _initial_step(c, t0, y0, f0, t_bound, rtol, atol):
+    # Same heuristic as scipy.integrate._ivp.common.select_initial_step (order 7)
+    interval_length = abs(t_bound - t0)
+    if interval_length == 0.0:
+        return 0.0
+    scale = atol + numpy.abs(y0) * rtol
+    d0 = _rms(y0 / scale)
+    d1 = _rms(f0 / scale)
+    if d0 < 1e-5 or d1 < 1e-5:
+        h0 = 1e-6
+    else:
+        h0 = 0.01 * d0 / d1
+    h0 = min(h0, interval_length)
+    f1 = field_eqs(t0 + h0, y0 + h0 * f0, c)
+    d2 = _rms((f1 - f0) / scale) / h0
+    if d1 <= 1e-15 and d2 <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1.0 / 8.0)
+    return min(100 * h0, h1, interval_length)
+
+
+@jit
+def _dense_coefficients(c, t_old, h, y_old, y, f_old, f, K):
+    # Extra stages and interpolating polynomial of the step [t_old, t_old + h]
+    for s in range(N_STAGES + 1, N_STAGES_EXTENDED):
+        dy = numpy.zeros(3)
+        for j in range(s):
+            dy += A[s, j] * K[j]
+        K[s] = field_eqs(t_old + C[s] * h, y_old + h * dy, c)
+    F = numpy.empty((INTERPOLATOR_POWER, 3))
+    delta_y = y - y_old
+    F[0] = delta_y
+    F[1] = h * f_old - delta_y
+    F[2] = 2 * delta_y - h * (f + f_old)
+    for i in range(INTERPOLATOR_POWER - 3):
+        F[3 + i] = numpy.zeros(3)
+        for j in range(N_STAGES_EXTENDED):
+            F[3 + i] += h * D[i, j] * K[j]
+    return F
+
+
+@jit
+def _dense_eval(F, y_old, x):
+    y = numpy.zeros(3)
+    for i in range(INTERPOLATOR_POWER):
+        y += F[INTERPOLATOR_POWER - 1 - i]
+        if i % 2 == 0:
+            y *= x
+        else:
+            y *= 1 - x
+    return y + y_old
+
+
+@jit
+def _locate_event(F, y_old, t_old, h):
+    # Illinois regula falsi for epsilon_1 = 1 on the dense output of the step
+    a = 0.0
+    b = 1.0
+    ga = end_of_inflation(y_old)
+    gb = end_of_inflation(_dense_eval(F, y_old, 1.0))
+    side = 0
+    xtol = 4 * 2.220446049250313e-16 * max(abs(t_old + h), 1.0) / abs(h)
+    x = b
+    for _ in range(200):
+        if gb == ga:
+            break
+        x = (a * gb - b * ga) / (gb - ga)
+        gx = end_of_inflation(_dense_eval(F, y_old, x))
+        if gx == 0.0:
+            break
+        if (gx > 0) == (gb > 0):
+            b = x
+            gb = gx
+            if side == -1:
+                ga /= 2
+            side = -1
+        else:
+            a = x
+            ga = gx
+            if side == 1:
+                gb /= 2
+            side = 1
+        if b - a < xtol:
+            x = b
+            break
+    return x
+
+
+@jit
+def _dop853(c, t0, t_bound, y0, t_eval, rtol, atol, first_step, stop):
+    '''
+    Integrate the field equations from t0 to t_bound with DOP853
+
+    If t_eval is empty the accepted steps are returned instead. If stop is True the
+    integration terminates when epsilon_1 crosses 1 from below.
+    '''
+    record_steps = t_eval.shape[0] == 0
+    capacity = 1024 if record_steps else t_eval.shape[0]
+    t_out = numpy.empty(capacity)
+    y_out = numpy.empty((capacity, 3))
+    n_out = 0
+    i_eval = 0
+
+    K = numpy.empty((N_STAGES_EXTENDED, 3))
+    t = t0
+    y = y0.copy()
+    f = field_eqs(t, y, c)
+    nfev = 1
+    nsteps = 0
+    nrejected = 0
+    status = 0
+    t_event = numpy.nan
+    y_event = numpy.full(3, numpy.nan)
+    g_old = end_of_inflation(y)
+
+    if record_steps:
+        t_out[0] = t
+        y_out[0] = y
+        n_out = 1
+
+    if first_step > 0:
+        h_abs = first_step
+    else:
+        h_abs = _initial_step(c, t, y, f, t_bound, rtol, atol)
+        nfev += 1
+
+    while t < t_bound:
+        # Adaptive step
+        min_step = 10 * abs(numpy.nextafter(t, numpy.inf) - t)
+        if h_abs < min_step:
+            h_abs = min_step
+        step_rejected = False
+        while True:
+            if h_abs < min_step:
+                status = -1
+                break
+            h = h_abs
+            t_new = t + h
+            if t_new > t_bound:
+                t_new = t_bound
+            h = t_new - t
+            h_abs = abs(h)
+
+            K[0] = f
+            for s in range(1, N_STAGES):
+                dy = numpy.zeros(3)
+                for j in range(s):
+                    dy += A[s, j] * K[j]
+                K[s] = field_eqs(t + C[s] * h, y + h * dy, c)
+            dy = numpy.zeros(3)
+            for j in range(N_STAGES):
+                dy += B[j] * K[j]
+            y_new = y + h * dy
+            f_new = field_eqs(t + h, y_new, c)
+            K[N_STAGES] = f_new
+            nfev += N_STAGES
+
+            scale = atol + numpy.maximum(numpy.abs(y), numpy.abs(y_new)) * rtol
+            err5 = numpy.zeros(3)
+            err3 = numpy.zeros(3)
+            for j in range(N_STAGES + 1):
+                err5 += E5[j] * K[j]
+                err3 += E3[j] * K[j]
+            err5_norm_2 = 0.0
+            err3_norm_2 = 0.0
+            for i in range(3):
+                err5_norm_2 += (err5[i] / scale[i]) ** 2
+                err3_norm_2 += (err3[i] / scale[i]) ** 2
+            if err5_norm_2 == 0.0 and err3_norm_2 == 0.0:
+                error_norm = 0.0
+            else:
+                denom = err5_norm_2 + 0.01 * err3_norm_2
+                error_norm = h_abs * err5_norm_2 / math.sqrt(denom * 3)
+
+            if error_norm < 1:
+                if error_norm == 0:
+                    factor = MAX_FACTOR
+                else:
+                    factor = min(MAX_FACTOR, SAFETY * error_norm ** ERROR_EXPONENT)
+                if step_rejected:
+                    factor = min(1.0, factor)
+                h_abs *= factor
+                break
+            else:
+                h_abs *= max(MIN_FACTOR, SAFETY * error_norm ** ERROR_EXPONENT)
+                step_rejected = True
+                nrejected += 1
+
+        if status == -1:
+            break
+        nsteps += 1
+
+        # Dense output of the step, built only when it is needed
+        F = numpy.empty((0, 3))
+        t_stop = t_new
+        if stop:
+            g_new = end_of_inflation(y_new)
+            if g_old < 0 and g_new >= 0:
+                F = _dense_coefficients(c, t, h, y, y_new, f, f_new, K)
+                nfev += N_STAGES_EXTENDED - N_STAGES - 1
+                x = _locate_event(F, y, t, h)
+                t_event = t + x * h
+                y_event = _dense_eval(F, y, x)
+                t_stop = t_event
+                status = 1
+            g_old = g_new
+
+        if record_steps:
+            if n_out == capacity:
+                capacity *= 2
+                t_grow = numpy.empty(capacity)
+                y_grow = numpy.empty((capacity, 3))
+                t_grow[:n_out] = t_out[:n_out]
+                y_grow[:n_out] = y_out[:n_out]
+                t_out = t_grow
+                y_out = y_grow
+            t_out[n_out] = t_stop
+            y_out[n_out] = y_event if status == 1 else y_new
+            n_out += 1
+        else:
+            while i_eval < t_eval.shape[0] and t_eval[i_eval] <= t_stop:
+                if t_eval[i_eval] == t_new:
+                    y_out[n_out] = y_new
+                else:
+                    if F.shape[0] == 0:
+                        F = _dense_coefficients(c, t, h, y, y_new, f, f_new, K)
+                        nfev += N_STAGES_EXTENDED - N_STAGES - 1
+                    y_out[n_out] = _dense_eval(F, y, (t_eval[i_eval] - t) / h)
+                t_out[n_out] = t_eval[i_eval]
+                n_out += 1
+                i_eval += 1
+
+        if status == 1:
+            break
+        t = t_new
+        y = y_new
+        f = f_new
+
+    return t_out[:n_out], y_out[:n_out], status, t_event, y_event, nfev, nsteps, nrejected
+
+
+#####################################################################################
+def solve(model_object, tspan, IC, t_eval=None, rtol=1e-13, atol=1e-15, first_step=None, stop=False):
+    '''
+    Solve the field equations of a model with the compiled DOP853 backend
+
+    :param model_object: object of the class fieldeqs.model
+    :param tspan: integration interval [t0, t_bound]
+    :param IC: initial values of [Xi, Psi, Theta]
+    :param t_eval: times at which the solution is stored, None for the accepted steps
+    :param rtol: relative tolerance
+    :param atol: absolute tolerance
+    :param first_step: initial step size, None to select it automatically
+    :param stop: terminate the integration at the end of inflation (epsilon_1 = 1)
+    :return: solution with the same fields as the one of scipy.integrate.solve_ivp
+    '''
+    if not HAVE_NUMBA:
+        SDlogger.warning('numba is not available, using solve_ivp with the NumPy field equations.')
+        from scipy.integrate import solve_ivp
+        stop_events = [events.end_of_inflation(model_object)] if stop else None
+        return solve_ivp(model_object.field_eqs, tspan, IC, t_eval=t_eval, method='DOP853',
+                         rtol=rtol, atol=atol, first_step=first_step, events=stop_events)
+
+    from scipy.optimize import OptimizeResult
+    jit_compile()
+    c = coefficients(model_object)
+    t_eval = numpy.empty(0) if t_eval is None else numpy.asarray(t_eval, dtype=float)
+    t, y, status, t_event, y_event, nfev, nsteps, nrejected = _dop853(
+        c, float(tspan[0]), float(tspan[1]), numpy.asarray(IC, dtype=float), t_eval,
+        rtol, atol, 0.0 if first_step is None else first_step, stop)
+
+    messages = {-1: 'Required step size is less than spacing between numbers.',
+                0: 'The solver successfully reached the end of the integration interval.',
+                1: 'A termination event occurred.'}
+    t_events = [numpy.array([t_event]) if status == 1 else numpy.empty(0)] if stop else None
+    y_events = [y_event.reshape(1, 3) if status == 1 else numpy.empty((0, 3))] if stop else None
+    return OptimizeResult(t=t, y=y.T, sol=None, t_events=t_events, y_events=y_events,
+                          nfev=nfev, njev=0, nlu=0, nsteps=nsteps, nrejected=nrejected,
+                          status=status, message=messages[status], success=status >= 0)
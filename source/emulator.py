@@ -0,0 +1,310 @@
+# Setting up the emulator of the Scalar Spectral Index and the Tensor-to-Scalar ratio
+# Author: Arun Mathew
+#
+# build() tabulates n_s, r and t_e of inflation.inflation_solver on a grid of
+# (log alpha, log beta, log mu) and saves it as a NumPy archive, see tools/datafile. The
+# grid is refined axis by axis: the midpoints of the intervals of an axis are solved over
+# all the nodes of the other axes, and an interval is split where the solved values differ
+# from the linear interpolation by more than the tolerance. The largest difference of every
+# interval is kept as its error estimate (a quarter of it for the halves of a split
+# interval, as the error of linear interpolation scales with the square of the spacing).
+#
+# The class emulator loads the table and interpolates it multilinearly in the logarithms of
+# the parameters. predict() is a pure table lookup; query() falls back to a real solve
+# outside the domain of the table, where the table has no solution, or where the error
+# estimate is above a limit.
+#
+# The parameters are given in the units of the data files: alpha and beta in t_P^2 and mu
+# in t_P^-1.
+#
+# Run from the source directory to build the default table op_data/emulator.npz:
+#   $ python emulator.py
+import bisect
+import itertools
+import math
+import os
+import warnings
+import numpy
+from fieldeqs import *
+from tools import datafile
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Emulator')
+
+# Axes of the table and the tabulated quantities
+AXES = ('alpha', 'beta', 'mu')
+QUANTITIES = ('n_s', 'r', 't_e')
+
+# Domain of the default table: the region of the sweeps of main.py
+DEFAULT_DOMAIN = {'alpha': (1.0, 100.0), 'beta': (0.01, 1.0), 'mu': (1e-5, 1e-3)}
+
+
+def default_path():
+    root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+    return root_Dir + "/op_data/emulator.npz"
+
+
+#####################################################################################
+def solve_points(points, E, omega, workers=None, backend='scipy', cache=None):
+    '''
+    Solve inflation for parameter points in the units of the data files
+
+    :param points: array of shape (N, 3) of (alpha, beta, mu)
+    :return: array of shape (N, 3) of (n_s, r, t_e), NaN where the solve failed
+    '''
+    from sweep import run_sweep
+    grid = [(alpha * pow(t_P, 2), beta * pow(t_P, 2), mu * pow(t_P, -1), E, omega)
+            for alpha, beta, mu in points]
+    if not grid:
+        return numpy.empty((0, 3))
+    results = run_sweep(grid, workers=workers, backend=backend, cache=cache)
+    return numpy.array([[n_s, r, t_e] if status == 'OK' else [numpy.nan] * 3
+                        for n_s, r, status, t_e in results], dtype=float)
+
+
+def _solve_grid(nodes, E, omega, workers, backend, cache):
+    # Solve every point of the tensor grid of log10 nodes, values of shape grid + (3,)
+    points = numpy.array(list(itertools.product(*(pow(10.0, x) for x in nodes))))
+    values = solve_points(points, E, omega, workers, backend, cache)
+    return values.reshape(tuple(len(x) for x in nodes) + (len(QUANTITIES),))
+
+
+def build(path=None, alpha=DEFAULT_DOMAIN['alpha'], beta=DEFAULT_DOMAIN['beta'], mu=DEFAULT_DOMAIN['mu'],
+          E=pow(10, 13), omega=1/3, nodes=(9, 9, 3), tol_n_s=1e-3, tol_r=1e-4, max_levels=3,
+          workers=None, backend='scipy', cache=None):
+    '''
+    Tabulate n_s, r and t_e on an adaptive grid and save the table
+
+    :param path: path of the table, op_data/emulator.npz by default
+    :param alpha, beta, mu: range (low, high) of a parameter, or a single value to keep
+                            it fixed
+    :param E, omega: fixed model parameters
+    :param nodes: number of nodes of the initial grid on the axes alpha, beta and mu,
+                  uniform in log10; a single number for all axes
+    :param tol_n_s, tol_r: tolerances of the linear interpolation of n_s and r
+    :param max_levels: number of refinement levels
+    :param workers, backend, cache: see sweep.run_sweep
+    :return: emulator of the table
+    '''
+    if path is None:
+        path = default_path()
+    ranges = [numpy.atleast_1d(numpy.asarray(domain, dtype=float)) for domain in (alpha, beta, mu)]
+    nodes = numpy.broadcast_to(nodes, len(AXES))
+    grid = [numpy.log10(r[:1]) if len(numpy.unique(r)) == 1 else
+            numpy.linspace(numpy.log10(r[0]), numpy.log10(r[-1]), n) for r, n in zip(ranges, nodes)]
+    values = _solve_grid(grid, E, omega, workers, backend, cache)
+    # Error estimate of every interval of every axis, unknown (inf) until measured
+    errors = [numpy.full((len(x) - 1, len(QUANTITIES)), numpy.inf) for x in grid]
+    tolerance = numpy.array([tol_n_s, tol_r, numpy.inf])
+    solves = values[..., 0].size
+
+    for level in range(max_levels):
+        refined = False
+        for axis, x in enumerate(grid):
+            candidates = numpy.flatnonzero(numpy.any(errors[axis] > tolerance, axis=1))
+            if len(x) < 2 or len(candidates) == 0:
+                continue
+            # Midpoints of the candidate intervals over all nodes of the other axes
+            slab = list(grid)
+            slab[axis] = 0.5 * (x[candidates] + x[candidates + 1])
+            solved = _solve_grid(slab, E, omega, workers, backend, cache)
+            solves += solved[..., 0].size
+            left = numpy.take(values, candidates, axis=axis)
+            right = numpy.take(values, candidates + 1, axis=axis)
+            deviation = numpy.abs(solved - 0.5 * (left + right))
+            # Largest deviation of an interval over the other axes, per quantity; NaN for
+            # intervals without any solution, which are not split
+            measured = numpy.moveaxis(deviation, axis, 0).reshape(len(candidates), -1, len(QUANTITIES))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                measured = numpy.nanmax(measured, axis=1)
+            errors[axis][candidates] = measured
+            split = numpy.any(measured > tolerance, axis=1)
+            SDlogger.info('Level %d, axis %s: %d of %d intervals split.', level, AXES[axis],
+                          numpy.count_nonzero(split), len(candidates))
+            if not numpy.any(split):
+                continue
+            refined = True
+            # Insert the solved midpoints of the split intervals; the halves inherit a
+            # quarter of the error of the interval
+            order = numpy.argsort(numpy.concatenate([x, slab[axis][split]]), kind='stable')
+            grid[axis] = numpy.concatenate([x, slab[axis][split]])[order]
+            values = numpy.concatenate([values, numpy.compress(split, solved, axis=axis)], axis=axis)
+            values = numpy.take(values, order, axis=axis)
+            counts = numpy.ones(len(x) - 1, dtype=int)
+            counts[candidates[split]] = 2
+            scale = numpy.ones(len(x) - 1)
+            scale[candidates[split]] = 0.25
+            errors[axis] = numpy.repeat(errors[axis] * scale[:, None], counts, axis=0)
+        if not refined:
+            break
+
+    columns = {'log_' + name: x for name, x in zip(AXES, grid)}
+    for q, quantity in enumerate(QUANTITIES):
+        columns[quantity] = values[..., q]
+        for name, error in zip(AXES, errors):
+            columns['error_%s_%s' % (quantity, name)] = error[:, q]
+    metadata = {'title': 'Emulator of n_s, r and t_e', 'E': E, 'omega': omega, 'backend': backend,
+                'tolerance': {'n_s': tol_n_s, 'r': tol_r}, 'solves': solves,
+                'units': {'alpha': '[t_P^2]', 'beta': '[t_P^2]', 'mu': '[t_P^-1]'}}
+    datafile.write(path, columns, metadata)
+    SDlogger.info('Emulator table of %s nodes from %d solves written to %s.',
+                  ' x '.join(str(len(x)) for x in grid), solves, path)
+    return emulator(path)
+
+
+def _mix(a, b, w):
+    # Linear interpolation between nested lists of equal shape
+    if isinstance(a, list):
+        return [_mix(x, y, w) for x, y in zip(a, b)]
+    return a + w * (b - a)
+
+
+#####################################################################################
+class emulator():
+    '''
+    Interpolating emulator of n_s, r and t_e over the table of build()
+    '''
+    def __init__(self, path=None, cache=None):
+        '''
+        :param path: path of the table, op_data/emulator.npz by default
+        :param cache: optional cache.solution_cache of the fallback solves
+        '''
+        if path is None:
+            path = default_path()
+        data = datafile.read(path, mmap=False)
+        self.path = path
+        self.metadata = data.metadata
+        self.nodes = [numpy.asarray(data['log_' + name]) for name in AXES]
+        self.values = numpy.stack([numpy.asarray(data[q]) for q in QUANTITIES], axis=-1)
+        self.errors = [numpy.stack([numpy.asarray(data['error_%s_%s' % (q, name)]) for q in QUANTITIES], axis=-1)
+                       for name in AXES]
+        self.domain = {name: (float(pow(10.0, x[0])), float(pow(10.0, x[-1]))) for name, x in zip(AXES, self.nodes)}
+        # Nodes and error estimates as lists for the lookup of single points
+        self.node_lists = [x.tolist() for x in self.nodes]
+        self.error_lists = [e.tolist() for e in self.errors]
+        self.cache = cache
+        self.solved = {}  # results of the fallback solves by parameter point
+        self.solves = 0   # number of fallback solves
+
+    #####################################################################################
+    def predict(self, alpha, beta, mu=None):
+        '''
+        Interpolate the table
+
+        :param alpha, beta, mu: parameters, arrays of broadcastable shapes; mu defaults to
+                                the value of a table with a fixed mu
+        :return: dictionary of arrays n_s, r, t_e and their error estimates error_n_s,
+                 error_r, error_t_e; NaN outside the domain of the table
+        '''
+        if mu is None:
+            mu = pow(10.0, self.nodes[2][0])
+        x = numpy.broadcast_arrays(*(numpy.log10(numpy.asarray(p, dtype=float)) for p in (alpha, beta, mu)))
+        shape = x[0].shape
+        x = [xi.ravel() for xi in x]
+        inside = numpy.ones(len(x[0]), dtype=bool)
+        index, weight = [], []
+        for xi, nodes in zip(x, self.nodes):
+            if len(nodes) == 1:
+                inside &= numpy.isclose(xi, nodes[0], rtol=0, atol=1e-12)
+                index.append(numpy.zeros(len(xi), dtype=int))
+                weight.append(numpy.zeros(len(xi)))
+                continue
+            inside &= (xi >= nodes[0]) & (xi <= nodes[-1])
+            i = numpy.clip(numpy.searchsorted(nodes, xi, side='right') - 1, 0, len(nodes) - 2)
+            index.append(i)
+            weight.append((xi - nodes[i]) / (nodes[i + 1] - nodes[i]))
+
+        # Multilinear interpolation over the corners of the cell
+        value = numpy.zeros((len(x[0]), len(QUANTITIES)))
+        for corner in itertools.product((0, 1), repeat=len(AXES)):
+            w = numpy.ones(len(x[0]))
+            idx = []
+            for c, i, wi, nodes in zip(corner, index, weight, self.nodes):
+                # A fixed axis has the weight 0 for its missing upper node
+                w = w * (wi if c else 1 - wi)
+                idx.append(i + c if len(nodes) > 1 else i)
+            value += w[:, None] * self.values[tuple(idx)]
+        # Error estimate: sum of the estimates of the intervals of the cell on every axis
+        error = numpy.zeros_like(value)
+        for i, nodes, errors in zip(index, self.nodes, self.errors):
+            if len(nodes) > 1:
+                error += errors[i]
+        value[~inside] = numpy.nan
+        error[~inside] = numpy.nan
+
+        result = {}
+        for q, quantity in enumerate(QUANTITIES):
+            result[quantity] = value[:, q].reshape(shape)
+            result['error_' + quantity] = error[:, q].reshape(shape)
+        return result
+
+    def lookup(self, alpha, beta, mu=None):
+        '''
+        Interpolate the table at a single point, without NumPy overhead
+
+        :return: list of n_s, r, t_e, error_n_s, error_r, error_t_e, or None outside the
+                 domain of the table
+        '''
+        if mu is None:
+            mu = pow(10.0, self.node_lists[2][0])
+        lower, weights = [], []
+        for p, nodes in zip((alpha, beta, mu), self.node_lists):
+            x = math.log10(p)
+            if len(nodes) == 1:
+                if abs(x - nodes[0]) > 1e-12:
+                    return None
+                lower.append(0)
+                weights.append(None)
+                continue
+            if not nodes[0] <= x <= nodes[-1]:
+                return None
+            i = min(max(bisect.bisect_right(nodes, x) - 1, 0), len(nodes) - 2)
+            lower.append(i)
+            weights.append((x - nodes[i]) / (nodes[i + 1] - nodes[i]))
+
+        # Corners of the cell, interpolated axis by axis
+        i, j, k = lower
+        cell = self.values[i:i + 2, j:j + 2, k:k + 2].tolist()
+        for w in weights:
+            cell = cell[0] if w is None else _mix(cell[0], cell[1], w)
+        errors = [0.0] * len(QUANTITIES)
+        for i, w, error in zip(lower, weights, self.error_lists):
+            if w is not None:
+                errors = [e + d for e, d in zip(errors, error[i])]
+        return cell + errors
+
+    def query(self, alpha, beta, mu=None, max_error=None):
+        '''
+        n_s, r and t_e of a single parameter point from the table, or from a real solve
+        outside the domain, where the table has no solution or where the error estimate of
+        n_s is above max_error
+
+        :param alpha, beta, mu: parameters; mu defaults to the value of a table with a
+                                fixed mu, and must be given outside it
+        :param max_error: largest accepted error estimate of n_s, None for any
+        :return: dictionary of n_s, r, t_e, their error estimates and 'solved', True if
+                 the values come from a solve
+        '''
+        values = self.lookup(alpha, beta, mu)
+        if values is not None and math.isfinite(values[0]) and (max_error is None or values[3] <= max_error):
+            result = dict(zip(QUANTITIES + tuple('error_' + q for q in QUANTITIES), values))
+            result['solved'] = False
+            return result
+        if mu is None:
+            mu = pow(10.0, self.nodes[2][0])
+        point = (float(alpha), float(beta), float(mu))
+        if point not in self.solved:
+            SDlogger.info('Solving inflation for (alpha, beta, mu) = %s outside the emulator table.', point)
+            self.solved[point] = solve_points([point], self.metadata['E'], self.metadata['omega'],
+                                              workers=1, cache=self.cache)[0]
+            self.solves += 1
+        n_s, r, t_e = self.solved[point]
+        return {'n_s': n_s, 'r': r, 't_e': t_e,
+                'error_n_s': 0.0, 'error_r': 0.0, 'error_t_e': 0.0, 'solved': True}
+
+
+#####################################################################################
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,59 @@
+# Setting up the event functions of the field equations
+# Author: Arun Mathew
+#
+# An event is a function g(t, y) whose zero solve_ivp locates on the dense output of the
+# solver to machine precision, so it has to change sign continuously across the event.
+# The attributes follow solve_ivp: terminal is True to stop at the first occurrence or an
+# integer n to stop at the n-th one, direction is +1 (g rising), -1 (g falling) or 0.
+from fieldeqs import *
+
+
+#####################################################################################
+def end_of_inflation(model_object, terminal=True):
+    '''
+    First slow-roll parameter reaching one, epsilon_1 - 1 rising through zero
+    '''
+    def event(t, y):
+        return model_object.epsilon_1(y[0], y[1]) - 1
+    event.__name__ = 'end_of_inflation'
+    event.terminal = terminal
+    event.direction = 1
+    return event
+
+
+def xi_zero(terminal=True):
+    '''
+    Hubble rate Xi falling through zero
+    '''
+    def event(t, y):
+        return y[0]
+    event.__name__ = 'xi_zero'
+    event.terminal = terminal
+    event.direction = -1
+    return event
+
+
+def ricci_sign(model_object, terminal=False):
+    '''
+    Sign change of the Ricci scalar R in either direction
+    '''
+    def event(t, y):
+        return model_object.R(y[0], y[1])
+    event.__name__ = 'ricci_sign'
+    event.terminal = terminal
+    event.direction = 0
+    return event
+
+
+def peak(n=None):
+    '''
+    Maxima of the Hubble rate, Psi falling through zero
+
+    :param n: stop the integration at the n-th maximum, None to record all of them
+    '''
+    def event(t, y):
+        return y[1]
+    event.__name__ = 'peak' if n is None else 'peak_%d' % n
+    event.terminal = False if n is None else n
+    event.direction = -1
+    return event
@@ -1,6 +1,5 @@
 # Setting up the Field Equation file
 # Author: Arun Mathew
-from scipy import constants as const
 import math
 import numpy
 from tools import logger
@@ -12,10 +11,12 @@ SDlogger = logger.setup_logger('FieldEqs')
 
 #####################################################################################
 # Common Physical Constants
-c = const.c  # Speed of Light
-G = const.G  #
-pi = const.pi
-hbar  = const.hbar
+# Values of scipy.constants (CODATA 2018), written out so that importing the field
+# equations does not load scipy
+c = 299792458.0  # Speed of Light
+G = 6.6743e-11   # Gravitational constant
+pi = math.pi
+hbar  = 6.62607015e-34 / (2 * pi)
 l_P  = math.sqrt(hbar*G/pow(c,3.0))
 t_P  = l_P/c
 
@@ -24,6 +25,9 @@ t_P  = l_P/c
 # Model: f(R) = R + alpha R^2 + beta R^2 ln R/mu^2
 class model():
 
+    # Parameters on which the precomputed field equation coefficients depend
+    parameters = ('alpha', 'beta', 'mu', 'E', 'omega')
+
     def __init__(self,
                  alpha,  # parameter alpha
                  beta,   # parameter beta
@@ -37,12 +41,29 @@ class model():
         self.E = E
         self.omega = omega
 
-        # Initializing Derived Parameters
-        self.HS = 1 / math.sqrt(12 * beta)
+    # Re-derive the dependent quantities whenever a model parameter is changed
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in model.parameters and all(hasattr(self, p) for p in model.parameters):
+            self.update()
+
+    # Initializing Derived Parameters and the field equation coefficients
+    def update(self):
+        self.HS = 1 / math.sqrt(12 * self.beta)
         self.Ne = 60.0  # NUmber of e-foldings
-        self.H0 = self.HS * math.sqrt(1 - math.exp(-2 * beta * self.Ne / (3 * alpha)))
+        self.H0 = self.HS * math.sqrt(1 - math.exp(-2 * self.beta * self.Ne / (3 * self.alpha)))
         self.kappa = 8 * pi * G / pow(c, 2)
-        self.Gamma = E * 1.60218 * pow(10, -10) / hbar
+        self.Gamma = self.E * 1.60218 * pow(10, -10) / hbar
+
+        # Dimensionless coefficients of the field equations, see field_eqs
+        tau_1, tau_osc, tau_3, tau_4 = self.timescales()
+        self.c_osc = 2 * pow(pi, 2) * pow(tau_1 / tau_osc, 2)  # 2 pi^2 (tau_1/tau_osc)^2
+        self.c_rho = self.c_osc * pow(tau_1 / tau_3, 2) / 3    # coupling to the density Theta
+        self.c_k = self.beta / self.alpha                      # beta/alpha
+        self.c_psi = 0.5 * (1 + self.c_k)                      # coefficient of Psi^2/Xi
+        self.c_psixi = 1.5 * self.c_k - 3                      # coefficient of Psi Xi
+        self.c_w = 3 * (1 + self.omega)                        # dilution of Theta
+        self.c_src = tau_1 / tau_4                             # particle production rate
 
     # Initial Hubble rate slope
     def init_hubble_slope(self):
@@ -57,29 +78,39 @@ class model():
         tau_4 = 1 / (self.Gamma * t_P)
         return [tau_1, tau_osc, tau_3, tau_4]
 
+    # Model parameters in the units of the data files (t_P, GeV)
+    def metadata(self):
+        return {'alpha': self.alpha / pow(t_P, 2), 'beta': self.beta / pow(t_P, 2),
+                'mu': self.mu * t_P, 'E': self.E, 'omega': self.omega}
+
     # Field Equations
+    # dPsi/dt = 2 pi^2 (tau_1/tau_osc)^2 (tau_1/tau_3)^2 Theta/(3 Xi) - 2 pi^2 (tau_1/tau_osc)^2 Xi
+    #           - 3 Psi Xi + Psi^2/(2 Xi) + (beta/alpha) (Xi^3 + 3 Psi Xi/2 + Psi^2/(2 Xi))
+    # The coefficients are precomputed in update(), so no timescale is rebuilt here.
     def field_eqs(self, t, Vector):
+        Xi, Psi, The = Vector
 
-        tau_1 = self.timescales()[0]
-        tau_osc = self.timescales()[1]
-        tau_3 = self.timescales()[2]
-        tau_4 = self.timescales()[3]
-
-        # Assign Variables to the vector elements
-        Xi = Vector[0]
-        Psi = Vector[1]
-        The = Vector[2]
-
-        # Equations
         dXidt = Psi
+        dPsidt = (self.c_rho * The + self.c_psi * Psi * Psi) / Xi \
+                 + Xi * (self.c_psixi * Psi + self.c_k * Xi * Xi - self.c_osc)
+        dThedt = self.c_src - self.c_w * Xi * The
 
-        dPsidt = 2 * pow(pi, 2) * pow(tau_1 / tau_osc, 2) * pow(tau_1 / tau_3, 2) * The / (3 * Xi) \
-                 - 2 * pow(pi, 2) * pow(tau_1 / tau_osc, 2) * Xi - 3 * Psi * Xi + 0.5 * pow(Psi, 2) / Xi \
-                 + (self.beta/self.alpha) * (pow(Xi, 3.0) + 1.5 * Psi * Xi + 0.5 * pow(Psi, 2) / Xi)
+        return [dXidt, dPsidt, dThedt]
 
-        dThedt = - 3 * Xi * (1 + self.omega) * The + tau_1 / tau_4
+    # Jacobian of the field equations with respect to (Xi, Psi, Theta)
+    # Passed as jac to the stiff solvers so that LSODA does not build it from finite differences.
+    def field_jac(self, t, Vector):
+        Xi, Psi, The = Vector
+        inv_Xi = 1 / Xi
 
-        return [dXidt, dPsidt, dThedt]
+        dfdXi = - (self.c_rho * The + self.c_psi * Psi * Psi) * inv_Xi * inv_Xi \
+                + self.c_psixi * Psi + 3 * self.c_k * Xi * Xi - self.c_osc
+        dfdPsi = 2 * self.c_psi * Psi * inv_Xi + self.c_psixi * Xi
+        dfdThe = self.c_rho * inv_Xi
+
+        return numpy.array([[0.0, 1.0, 0.0],
+                            [dfdXi, dfdPsi, dfdThe],
+                            [- self.c_w * The, 0.0, - self.c_w * Xi]])
 
     # Defining Ricci scalar and its derivatives from vector Xi, Psi and time span
     # Returns Ricci scalar in the units of H0^2
@@ -102,28 +133,53 @@ class model():
     def epsilon_1(self, Xi, Psi):
         return -Psi / pow(Xi, 2)
 
+    # Ricci scalar, F = df/dR, their derivatives, the slow-roll parameters, the Scalar
+    # Spectral Index and the Tensor-to-Scalar ratio in a single vectorized pass.
+    # The derivatives of Psi are taken once and shared by all the quantities.
+    def diagnostics(self, t, Xi, Psi):
+        H0_2 = pow(self.H0, 2)
+        dPsidt = numpy.gradient(Psi, t)
+        dPsi2dt2 = numpy.gradient(dPsidt, t)
+
+        R = self.R(Xi, Psi)
+        dRdt = 6 * (dPsidt + 4 * Xi * Psi)
+        dR2dt2 = 6 * (dPsi2dt2 + 4 * pow(Psi, 2) + 4 * Xi * dPsidt)
+
+        # The logarithm ln(R/mu^2) is taken at the last point of the trajectory
+        log_R = math.log(H0_2 * R[-1] / pow(self.mu, 2))
+        F = 1 + H0_2*(2*self.alpha + self.beta)*R + 2*self.beta*H0_2*R*log_R
+        dFdR = H0_2*(2*self.alpha + 3*self.beta) + 2*self.beta*H0_2*log_R
+        dFdt = dFdR * dRdt
+        dF2dt2 = dFdR * dR2dt2 + 2*self.beta*H0_2*pow(dRdt, 2)/R
+
+        # First, third (FDOT/2HF) and fourth (FDDOT/HFDOT) slow roll parameters
+        Epsilon_1 = -Psi / pow(Xi, 2)
+        Epsilon_3 = dFdt / (2 * Xi * F)
+        Epsilon_4 = dF2dt2 / (Xi * dFdt)
+
+        # Scalar Spectral Index and Tensor-to-Scalar ratio at the start of inflation
+        e1 = Epsilon_1[0]
+        e3 = Epsilon_3[0]
+        e4 = Epsilon_4[0]
+        ns = 4 - 2 * math.sqrt(0.25 + (1 + e1 - e3 + e4) * (2 - e3 + e4) / pow(1 - e3, 2))
+        r = 48 * pow(e3, 2) / pow(1 + e3, 2)
+
+        return {'R': R, 'dRdt': dRdt, 'dR2dt2': dR2dt2,
+                'F': F, 'dFdt': dFdt, 'dF2dt2': dF2dt2,
+                'epsilon_1': Epsilon_1, 'epsilon_3': Epsilon_3, 'epsilon_4': Epsilon_4,
+                'n_s': ns, 'r': r}
+
     # Third slow roll parameter epsilon_3 = FDOT/2HF
     def epsilon_3(self, t, Xi, Psi):
-        for element in self.R(Xi, Psi): log_R = math.log(pow(self.H0, 2) * element / pow(self.mu, 2))
-        F = 1 + pow(self.H0, 2)*(2*self.alpha + self.beta)*self.R(Xi, Psi) + 2*self.beta*pow(self.H0,2)*self.R(Xi, Psi)*log_R
-        dFdt = pow(self.H0, 2)*(2*self.alpha+3*self.beta)*self.dRdt(t, Xi, Psi) + 2*self.beta*pow(self.H0, 2)*self.dRdt(t, Xi, Psi)*log_R
-        return dFdt / (2 * Xi * F)
+        return self.diagnostics(t, Xi, Psi)['epsilon_3']
 
-    # Fourth slow roll parameter epsilon_3 = FDDOT/HFDOT
+    # Fourth slow roll parameter epsilon_4 = FDDOT/HFDOT
     def epsilon_4(self, t, Xi, Psi):
-        for element in self.R(Xi, Psi): log_R = math.log(pow(self.H0, 2)*element/pow(self.mu, 2))
-        dFdt = pow(self.H0, 2)*(2*self.alpha+3*self.beta)* self.dRdt(t, Xi, Psi) + 2*self.beta * pow(self.H0, 2)*self.dRdt(t, Xi, Psi) * log_R
-        dF2dt2 = pow(self.H0,2)*(2*self.alpha+3*self.beta)*self.dR2dt2(t,Xi,Psi) + 2*self.beta*pow(self.H0,2)*self.dR2dt2(t,Xi,Psi)*log_R + 2*self.beta*pow(self.H0,2)*pow(self.dRdt(t,Xi,Psi), 2)/self.R(Xi, Psi)
-        return dF2dt2 / (Xi * dFdt)
+        return self.diagnostics(t, Xi, Psi)['epsilon_4']
 
     def spectral_index(self, t, Xi, Psi):
-        e1 = self.epsilon_1(Xi, Psi)[0]
-        e3 = self.epsilon_3(t, Xi, Psi)[0]
-        e4 = self.epsilon_4(t, Xi, Psi)[0]
-
-        ns = 4 - 2 * math.sqrt(0.25 + (1 + e1 - e3 + e4) * (2 - e3 + e4) / pow(1 - e3, 2))
-        r = 48 * pow(e3, 2) / pow(1 + e3, 2)
-        return ns, r
+        diagnostics = self.diagnostics(t, Xi, Psi)
+        return diagnostics['n_s'], diagnostics['r']
 
 
 
@@ -1,11 +1,14 @@
 # Setting up class file for the region of Inflation
 # Author: Arun Mathew
-from scipy.integrate import solve_ivp
 from fieldeqs import *
 from tools import logger
 from tools import plotter
+from tools import datafile
+from events import end_of_inflation
+import instrument
 import numpy
 import os
+import time
 
 
 # > set the logger tree-level
@@ -13,11 +16,45 @@ SDlogger = logger.setup_logger('Inflation')
 
 class inflation():
 
+    # Solver tolerances for the region of inflation
+    atol = 1e-15
+    rtol = 1e-13
+
+    # Output files: compression of the binary file and the legacy text file next to it
+    compress = False
+    legacy_text = True
+
+    # Write the solver statistics of every solve to the log, see instrument.py
+    log_stats = False
+
+    # End of the integration of a warm started solve, as a multiple of the end of inflation
+    # of the hints, see __init__
+    warm_margin = 1.25
+
     #####################################################################################
-    def __init__(self, model_object, output_file):
+    def __init__(self, model_object, output_file, backend='scipy', cache=None, events=(), hints=None):
+        '''
+        :param hints: solver hints of a neighbouring parameter point, see hints(): the
+                      integration stops at warm_margin times its end of inflation and
+                      starts with its initial step; ignored by the 'batch' backend
+        '''
         SDlogger.info('Setting up initial attributes for Inflation.')
         self.model_object = model_object # create a object for the class model
         self.output_file = output_file
+        self.backend = backend # 'scipy' for LSODA, 'compiled' for the compiled DOP853 stepper
+                               # or 'batch' for the NumPy DOP853 stepper of batch.py
+        self.cache = cache     # optional cache.solution_cache of the solutions
+        self.wall_time = None  # wall time of integrate(), for the structured records
+        self.cached = False    # solution loaded from the cache
+        self.stats = None      # solver statistics of the solve, see instrument.py
+        self.warm_hints = hints
+        self.warm_started = False  # solved over the span of the hints
+        # Event: integration stops when epsilon_1 rises through 1
+        self.stop_condition = end_of_inflation(model_object)
+        # Additional events located along the integration, see events.py
+        self.events = list(events)
+        if self.events and backend != 'scipy':
+            raise ValueError('Additional events require the scipy backend.')
         # Initial Conditions for Inflation
         init_cond = [
             1,  # Initial value of Hubble rate in the units of H0
@@ -37,19 +74,116 @@ class inflation():
 
 
     #####################################################################################
-    def stop_condition(self, t, y):
-        # Event: integration stops for when epsilon_1 > 1
-        return 0 if self.model_object.epsilon_1(y[0], y[1]) > 1 else 1
+    def event_names(self):
+        return [self.stop_condition.__name__] + [event.__name__ for event in self.events]
+
+    def cache_key(self):
+        # The additional events change the solution if they are terminal
+        method = ':'.join([self.backend] + self.event_names()[1:])
+        return self.cache.key(self.model_object, self.tspan, self.IC, self.tvector, self.rtol, self.atol, method)
+
+    def integrate(self):
+        '''
+        Integrate the field equations over the region of inflation
+
+        The solution is loaded from the solution cache if it holds one for the same
+        parameters, initial conditions, time vector and solver settings. With hints the
+        field equations are integrated over the span of the hints first, and over the
+        whole time span if inflation does not end within it; only the solves over the
+        whole time span are put in the cache.
+
+        :return: solution with the fields of scipy.integrate.solve_ivp
+        '''
+        t_points = self.tvector
+        tspan = self.tspan
+
+        start = time.perf_counter()
+        cpu = time.process_time()
+        if self.cache is not None:
+            key = self.cache_key()
+            sol = self.cache.get(key)
+            if sol is not None:
+                self.cached = True
+                self.wall_time = time.perf_counter() - start
+                return sol
+
+        sol = None
+        hints = self.warm_hints
+        if hints and self.backend != 'batch' and numpy.isfinite(hints['t_end']):
+            end = min(tspan[1], hints['t_end'] * self.warm_margin)
+            sol = self.solve(tspan[:1] + [end], t_points[t_points <= end], hints.get('first_step'))
+            self.warm_started = sol.status == 1
+            if not self.warm_started:
+                # Inflation did not end within the span of the hints: solve from scratch
+                SDlogger.info('Warm start up to t = %f failed, solving over the whole time span.', end)
+                attempt, sol = sol, self.solve(tspan, t_points)
+                if self.backend == 'scipy':
+                    sol.stats.add(attempt.stats)
+        if sol is None:
+            sol = self.solve(tspan, t_points)
+
+        self.wall_time = time.perf_counter() - start
+        if self.backend != 'scipy':
+            self.stats = instrument.from_solution(sol, 'inflation', self.backend, self.wall_time,
+                                                  time.process_time() - cpu)
+        else:
+            self.stats = sol.stats
+        if self.log_stats:
+            self.stats.log()
+        if self.cache is not None and not self.warm_started:
+            # A warm started solve depends on the hints, i.e. on the order in which the
+            # points are solved, and is not kept under the key of the cold solve
+            self.cache.put(key, sol)
+        return sol
+
+    def solve(self, tspan, t_points, first_step=None):
+        # One integration of the field equations with the backend of the object
+        IC = self.IC
+        if self.backend == 'compiled':
+            # Compiled field equations and stepper, stops at epsilon_1 = 1
+            import compiled
+            return compiled.solve(self.model_object, tspan, IC, t_eval=t_points, atol=self.atol,
+                                  rtol=self.rtol, first_step=first_step, stop=True)
+        elif self.backend == 'batch':
+            # Batch of a single model, see sweep.solve_batch for many models in lockstep
+            import batch
+            return batch.solve([self.model_object], [tspan], [IC], [t_points],
+                               atol=self.atol, rtol=self.rtol)[0]
+        options = {} if first_step is None else {'first_step': first_step}
+        return instrument.solve_ivp(self.model_object.field_eqs, tspan, IC, t_eval=t_points,
+                        method='LSODA',atol=self.atol,rtol=self.rtol,
+                        jac=self.model_object.field_jac, # Analytic Jacobian of the field equations
+                        events= [self.stop_condition] + self.events, # Stopping Condition for integration
+                        phase='inflation', log=False, **options
+                        )
+
+    def hints(self):
+        '''
+        Solver hints for the solve of a neighbouring parameter point, see __init__
 
-    stop_condition.terminal = True
+        The field equations change little between neighbouring points of a parameter
+        line, so inflation ends at a similar time and the solver starts with a similar
+        step. The Jacobian is analytic (fieldeqs.model.field_jac) and is not carried over.
 
+        :return: dictionary of t_end and first_step (None if unknown), None if inflation
+                 did not end at the end-of-inflation event
+        '''
+        if self.terminal_event is None or not numpy.isfinite(self.t_end):
+            return None
+        # First accepted step of the solve, None for the compiled backends
+        first_step = None if self.stats is None or self.stats.first_step is None else float(self.stats.first_step)
+        return {'t_end': float(self.t_end), 'first_step': first_step}
 
 
     #####################################################################################
-    def inflation_solver(self):
+    def inflation_solver(self, sol=None):
         """
         Solve inflation field equations for the region of inflation
 
+        Args:
+          sol: solution of this model from a batched solve of several models, see
+               batch.solve; the field equations are integrated here if None
+
         Returns:
           inf_tspan (1D array): time span of inflation in the unit of t_Planck
 
@@ -64,23 +198,36 @@ class inflation():
           r,
           Status_flag
 
+        The terminal state is kept in t_end and y_end = [Xi, Psi, Theta], and the located
+        events in the dictionaries t_events and y_events keyed by event name.
+
         See Also:
           Some references to other functions
 
         """
 
-        t_points  = self.tvector
-        print(t_points)
-        IC = self.IC
-        tspan = self.tspan
-
-        sol = solve_ivp(self.model_object.field_eqs, tspan, IC, t_eval=t_points,
-                        method='LSODA',atol=1e-15,rtol=1e-13,
-                        events= [self.stop_condition,] # Stopping Condition for integration
-                        )
+        if sol is None:
+            sol = self.integrate()
 
         inf_tspan = sol.t
 
+        # Located events by name and the terminal state, i.e. the last event for a
+        # termination and the last point of the time vector otherwise
+        self.t_events, self.y_events = {}, {}
+        if sol.t_events is not None:
+            for name, t_event, y_event in zip(self.event_names(), sol.t_events, sol.y_events):
+                self.t_events[name] = t_event
+                self.y_events[name] = y_event
+        self.terminal_event = None
+        if sol.status == 1:
+            located = [(t_event[-1], name) for name, t_event in self.t_events.items() if len(t_event)]
+            t_end, self.terminal_event = max(located)
+            self.t_end, self.y_end = t_end, self.y_events[self.terminal_event][-1]
+        elif len(inf_tspan):
+            self.t_end, self.y_end = inf_tspan[-1], sol.y[:, -1]
+        else:
+            self.t_end, self.y_end = numpy.nan, numpy.full(3, numpy.nan)
+
         if sol.status == -1:
             Status_flag = 'Failed'
             SDlogger.error('%s', sol.message)
@@ -89,20 +236,28 @@ class inflation():
             SDlogger.info('%s', sol.message)
         elif sol.status == 1:
             Status_flag = 'OK'
-            SDlogger.info('%s epsilon_1 = 1.', sol.message)
-            SDlogger.info('Inflation ends at t_e = %f t_Planck.', inf_tspan[-1])
+            SDlogger.info('%s %s.', sol.message, self.terminal_event)
+            SDlogger.info('Inflation ends at t_e = %f t_Planck.', self.t_end)
 
         Xi       = sol.y[0]
         Psi      = sol.y[1]
         The      = sol.y[2]
 
-        Ricci = self.model_object.R(Xi, Psi)
-        Epsilon_1 = self.model_object.epsilon_1(Xi, Psi)
-        Epsilon_3 = self.model_object.epsilon_3(inf_tspan, Xi, Psi)
-        Epsilon_4 = self.model_object.epsilon_4(inf_tspan, Xi, Psi)
+        # Slow-roll diagnostics in a single pass
+        diagnostics = self.model_object.diagnostics(inf_tspan, Xi, Psi)
+        Ricci = diagnostics['R']
+        Epsilon_1 = diagnostics['epsilon_1']
+        Epsilon_3 = diagnostics['epsilon_3']
+        Epsilon_4 = diagnostics['epsilon_4']
+
+        n_s = diagnostics['n_s']
+        r   = diagnostics['r']
 
-        n_s = self.model_object.spectral_index(inf_tspan, Xi, Psi)[0]
-        r   = self.model_object.spectral_index(inf_tspan, Xi, Psi)[1]
+        # Structured record of the solve, see tools/logger
+        logger.record('inflation', parameters=self.model_object.metadata(), backend=self.backend,
+                      status=Status_flag, n_s=n_s, r=r, t_end=self.t_end, nfev=sol.nfev,
+                      njev=sol.njev, wall=self.wall_time, cached=self.cached,
+                      stats=None if self.stats is None else self.stats.as_dict())
 
         # Path of data directory
         root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
@@ -112,32 +267,22 @@ class inflation():
         filetype = "txt"
 
         if(filename != 'None'):
-            # Write data to text file if a filename is given
+            # Write data to a binary file at full precision and to the legacy text file
             SDlogger.info('Writting inflation data to file %s.', filename)
-            with open(data_Dir + "/" + filename + "." + filetype, "w") as inf_file:
-                inf_file.write("Project Title: Reheating by Scalaron Decay\n")
-                inf_file.write("File Type: Data \n")
-                inf_file.write("Author: Arun Mathew\n")
-                inf_file.write("Affiliation: Dept. of Physics, IIT Guwahati, India\n\n")
-                inf_file.write("Data: Inflation Background Data\n")
-                inf_file.write("Model Parameters :\n")
-                print("alpha = ", "{0:.2e}".format(self.model_object.alpha / pow(t_P, 2)), "[t_P^2]", file=inf_file)
-                print("beta  = ", "{0:.2e}".format(self.model_object.beta / pow(t_P, 2)), "[t_P^2]", file=inf_file)
-                print("mu    = ", "{0:.2e}".format(self.model_object.mu * t_P), "[t_P^-1]", file=inf_file)
-                print("E     = ", "{0:.2e}".format(self.model_object.E), "[GeV]", file=inf_file)
-                print("omega = ", "{0:.2e}".format(self.model_object.omega), file=inf_file)
-                print("\n", file=inf_file)
-                print("Time, Xi, Psi, Theta, Ricci, epsilon_1, epsilon_3, epsilon_4\n", file=inf_file)
-                numpy.savetxt(inf_file, numpy.c_[inf_tspan, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4],
-                              fmt="%f")
-                print("\n", file=inf_file)
-                print("Scalar Spectral Index and Tensor-to-Scalar ratio:", file=inf_file)
-                print("n_s = ", "{0:.4f}".format(n_s), file=inf_file)
-                print("r   = ", "{0:.4f}".format(r), file=inf_file)
-
-                plotter.plot_single(inf_tspan, Xi, [0, 100], [0, 1], '$t/t_P$', '$H(t)/H_0$', 'inf_H', 'png')
-                plotter.plot_single(inf_tspan, Psi, [0, 100], [0, -0.02], '$t/t_P$', '$\dot{H}(t)$', 'inf_Hdot', 'png')
-                plotter.plot_single(inf_tspan, The, [0, 100], [0, 0.000006], '$t/t_P$', '$\\rho/\epsilon^4$', 'inf_rho', 'png')
+            metadata = {'title': 'Inflation Background Data',
+                        'parameters': self.model_object.metadata(),
+                        'backend': self.backend, 'rtol': self.rtol, 'atol': self.atol,
+                        'status': Status_flag, 't_end': float(self.t_end),
+                        'n_s': float(n_s), 'r': float(r)}
+            columns = {'Time': inf_tspan, 'Xi': Xi, 'Psi': Psi, 'Theta': The, 'Ricci': Ricci,
+                       'epsilon_1': Epsilon_1, 'epsilon_3': Epsilon_3, 'epsilon_4': Epsilon_4}
+            datafile.write(data_Dir + "/" + filename + ".npz", columns, metadata, compress=self.compress)
+            if self.legacy_text:
+                datafile.to_text(data_Dir + "/" + filename + ".npz", data_Dir + "/" + filename + "." + filetype)
+
+            plotter.plot_single(inf_tspan, Xi, [0, 100], [0, 1], '$t/t_P$', '$H(t)/H_0$', 'inf_H', 'png')
+            plotter.plot_single(inf_tspan, Psi, [0, 100], [0, -0.02], '$t/t_P$', '$\dot{H}(t)$', 'inf_Hdot', 'png')
+            plotter.plot_single(inf_tspan, The, [0, 100], [0, 0.000006], '$t/t_P$', '$\\rho/\epsilon^4$', 'inf_rho', 'png')
 
         return inf_tspan, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4, n_s, r, Status_flag
 
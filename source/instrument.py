@@ -0,0 +1,244 @@
+# Setting up the instrumentation of the solvers
+# Author: Arun Mathew
+#
+# A monitor follows an OdeSolver of scipy.integrate step by step and collects the
+# statistics of one phase of the integration in a solve_stats object: the evaluations of
+# the field equations and of their Jacobian, the LU decompositions, the accepted and
+# rejected steps, the smallest and largest step size, the switches of LSODA between its
+# nonstiff (Adams) and stiff (BDF) methods, and the wall and CPU time.
+#
+# solve_ivp() is scipy.integrate.solve_ivp with the method wrapped by a monitor; the
+# statistics are returned in sol.stats. The statistics of the compiled and batch backends,
+# which do not step an OdeSolver, are taken from their solution with from_solution().
+import time
+from tools import logger
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Instrument')
+
+# Method of LSODA in use, iwork[18] (MUSED): 1 nonstiff (Adams), 2 stiff (BDF)
+LSODA_METHODS = {1: 'Adams', 2: 'BDF'}
+
+
+#####################################################################################
+def lsoda_method(solver):
+    '''
+    Method in use by the LSODA solver of scipy.integrate
+
+    The method is read from the integer work array of the Fortran solver, which scipy
+    keeps in a private attribute.
+
+    :param solver: scipy.integrate.LSODA after at least one step
+    :return: key of LSODA_METHODS, None if the work array is not found or does not hold
+             a method at the expected position
+    '''
+    try:
+        method = int(solver._lsoda_solver._integrator.call_args[5][18])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+    return method if method in LSODA_METHODS else None
+
+
+#####################################################################################
+class solve_stats():
+    '''
+    Statistics of one phase of an integration
+
+    Attributes that a solver does not report are None: the rejected steps of LSODA,
+    Radau and BDF, and the step sizes and method switches of the compiled backends.
+    first_step is the first accepted step, min_step and max_step the extremes of all steps.
+    '''
+    fields = ('phase', 'method', 'nfev', 'njev', 'nlu', 'nsteps', 'nrejected',
+              'first_step', 'min_step', 'max_step', 'method_switches', 'stiff_steps', 'wall', 'cpu')
+
+    def __init__(self, phase, method):
+        self.phase = phase
+        self.method = method
+        self.nfev = 0
+        self.njev = 0
+        self.nlu = 0
+        self.nsteps = 0
+        self.nrejected = None
+        self.first_step = None
+        self.min_step = None
+        self.max_step = None
+        self.method_switches = None
+        self.stiff_steps = None
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def add(self, other):
+        '''
+        Accumulate the statistics of a later part of the same phase
+        '''
+        for name in ('nfev', 'njev', 'nlu', 'nsteps', 'nrejected', 'method_switches', 'stiff_steps', 'wall', 'cpu'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, None if mine is None or theirs is None else mine + theirs)
+        if self.first_step is None:
+            self.first_step = other.first_step
+        steps = [h for h in (self.min_step, other.min_step) if h is not None]
+        self.min_step = min(steps) if steps else None
+        steps = [h for h in (self.max_step, other.max_step) if h is not None]
+        self.max_step = max(steps) if steps else None
+        return self
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+    def __repr__(self):
+        return 'solve_stats(%s)' % ', '.join('%s=%r' % item for item in self.as_dict().items())
+
+    def log(self):
+        SDlogger.info('%s [%s]: nfev = %d, njev = %d, nlu = %d, steps = %d, rejected = %s, '
+                      'step = [%s, %s], method switches = %s, wall = %.3f s, cpu = %.3f s.',
+                      self.phase, self.method, self.nfev, self.njev, self.nlu, self.nsteps,
+                      self.nrejected, self.min_step, self.max_step, self.method_switches,
+                      self.wall, self.cpu)
+
+
+#####################################################################################
+class monitor():
+    '''
+    Collects the statistics of an OdeSolver over the steps taken through step()
+    '''
+    def __init__(self, phase, solver):
+        '''
+        :param phase: name of the phase, e.g. 'inflation'
+        :param solver: OdeSolver, the counters are taken relative to its current state
+        '''
+        self.stats = solve_stats(phase, type(solver).__name__)
+        self.solver = solver
+        self.start = (solver.nfev, solver.njev, solver.nlu)
+        self.lsoda = hasattr(solver, '_lsoda_solver')
+        # Function evaluations of one step attempt of the explicit Runge-Kutta methods
+        self.n_stages = getattr(solver, 'n_stages', None)
+        if self.n_stages is not None:
+            self.stats.nrejected = 0
+        if self.lsoda:
+            self.stats.method_switches = 0
+            self.stats.stiff_steps = 0
+            self.method = None
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def step(self, step=None):
+        '''
+        Take one step of the solver and record it
+
+        :param step: step method to call, solver.step by default
+        :return: message of the step
+        '''
+        solver = self.solver
+        t, nfev = solver.t, solver.nfev
+        wall, cpu = time.perf_counter(), time.process_time()
+        message = (step or solver.step)()
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.process_time() - cpu
+        if solver.status == 'failed':
+            return message
+
+        stats = self.stats
+        h = abs(solver.t - t)
+        stats.nsteps += 1
+        if stats.first_step is None:
+            stats.first_step = h
+        stats.min_step = h if stats.min_step is None else min(stats.min_step, h)
+        stats.max_step = h if stats.max_step is None else max(stats.max_step, h)
+        if self.n_stages is not None:
+            # Every attempt costs n_stages evaluations, all but the last are rejected
+            stats.nrejected += max(0, (solver.nfev - nfev) // self.n_stages - 1)
+        if self.lsoda:
+            method = lsoda_method(solver)
+            if method is None:
+                # Unknown layout of the work array, e.g. after a change of scipy: the
+                # switches between Adams and BDF are not reported
+                self.lsoda = False
+                self.method = None
+                stats.method_switches = stats.stiff_steps = None
+                return message
+            if self.method is not None and method != self.method:
+                stats.method_switches += 1
+            if method == 2:
+                stats.stiff_steps += 1
+            self.method = method
+        return message
+
+    def finish(self, log=False):
+        '''
+        :param log: write the statistics to the log
+        :return: solve_stats of the steps taken so far
+        '''
+        stats = self.stats
+        solver = self.solver
+        stats.nfev = int(solver.nfev - self.start[0])
+        stats.njev = int(solver.njev - self.start[1])
+        stats.nlu = int(solver.nlu - self.start[2])
+        stats.wall = self.wall
+        stats.cpu = self.cpu
+        if self.lsoda and self.method is not None:
+            stats.method = 'LSODA (%s last)' % LSODA_METHODS.get(self.method, self.method)
+        if log:
+            stats.log()
+        return stats
+
+
+#####################################################################################
+def solve_ivp(fun, t_span, y0, method='RK45', phase='solve', log=False, **options):
+    '''
+    scipy.integrate.solve_ivp with the statistics of the solve in sol.stats
+
+    :param fun, t_span, y0, method, options: see scipy.integrate.solve_ivp
+    :param phase: name of the phase in the statistics
+    :param log: write the statistics to the log
+    :return: solution of scipy.integrate.solve_ivp with the field stats (solve_stats)
+    '''
+    from scipy.integrate import solve_ivp as scipy_solve_ivp
+    from scipy.integrate._ivp.ivp import METHODS
+
+    base = METHODS.get(method, method) if isinstance(method, str) else method
+    monitors = []
+
+    class instrumented(base):
+        # The solver class of solve_ivp, stepped through a monitor
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            monitors.append(monitor(phase, self))
+
+        def step(self):
+            return monitors[0].step(super().step)
+
+    instrumented.__name__ = base.__name__
+    wall, cpu = time.perf_counter(), time.process_time()
+    sol = scipy_solve_ivp(fun, t_span, y0, method=instrumented, **options)
+    stats = monitors[0].finish()
+    # The counts and the time of the whole call, including the initial evaluations, the
+    # output and the events
+    stats.nfev, stats.njev, stats.nlu = int(sol.nfev), int(sol.njev), int(sol.nlu)
+    stats.wall = time.perf_counter() - wall
+    stats.cpu = time.process_time() - cpu
+    if log:
+        stats.log()
+    sol.stats = stats
+    return sol
+
+
+def from_solution(sol, phase, method, wall, cpu):
+    '''
+    Statistics of a solution of compiled.solve or batch.solve
+
+    :param sol: solution with the fields nfev, njev, nlu and, if available, nsteps and
+                nrejected
+    :param wall: wall time of the solve
+    :param cpu: CPU time of the solve
+    :return: solve_stats
+    '''
+    stats = solve_stats(phase, method)
+    stats.nfev = int(sol.nfev)
+    stats.njev = int(sol.njev)
+    stats.nlu = int(sol.nlu)
+    stats.nsteps = int(sol.nsteps) if 'nsteps' in sol else None
+    stats.nrejected = int(sol.nrejected) if 'nrejected' in sol else None
+    stats.wall = wall
+    stats.cpu = cpu
+    return stats
@@ -2,12 +2,15 @@
 # Author: Arun Mathew
 
 from fieldeqs import *
-from inflation import inflation
-from reheating import reheating
+from pipeline import pipeline
+from sweep import parameter_grid, run_sweep
+from refine import quadtree
+from store import sweep_store
+from cache import solution_cache
+from tools import datafile
+from tools import plotter
 import os
-
-import matplotlib as mpl
-mpl.rcParams.update(mpl.rcParamsDefault)
+import time
 
 
 # > Set the logger tree-level
@@ -21,161 +24,214 @@ Setting = 'Parameter space Sketch with varying beta'
 # Under this setting, we follow the reference https://doi.org/10.1103/PhysRevD.32.2511.
 # Plausible values of alpha is determined subjected to the constraint coming from
 # the observation of Scalar Spectral Index and Tensor-to-Scalar ratio.
-SDlogger.info('Operating mode : %s', Setting)
-
-
-#################################################################################
-if(Setting == 'Default'):
-    # Region: Inflation
-    # In this section, the code perform under the Default Setting
-    # Default setting implies normal operation with single initial condition
-    # and
-    # Initializing model parameter
-    SDlogger.info('Initializing model parameters')
-    f_R_gravity = model(
-        16.5*pow(t_P, 2),         # value of the parameter alpha
-        0.3 * pow(t_P, 2),        # value of the parameter beta
-        pow(10, -4)*pow(t_P,-1),  # value of the parameter mu
-        pow(10, 13),              # Energy of the particles created
-        1/3                       # Equation of State P = omega rho
-    )
-
-    # Initialize the class inflation
-    INF = inflation(f_R_gravity,  # Inherit the class model using object f_R_gravity
-                    "inf_data"  # Output file name
-                    )
-    # Solve inflation field equations and return
-    INF_Register = INF.inflation_solver()
-
-    INF_EndTime = INF_Register[0][-1]
-    INF_EndXi = INF_Register[1][-1]
-    INF_EndPsi = INF_Register[2][-1]
-    INF_EndThe = INF_Register[3][-1]
+#Setting = 'Adaptive parameter space'
+# Under this setting, the (alpha, beta) plane is sampled by a quadtree that is refined
+# around the observed Scalar Spectral Index, see refine.py.
+
+# > Set the parallel sweep
+Workers   = os.cpu_count()  # Number of worker processes for the parameter sweeps
+Chunksize = 1               # Number of parameter points handed to a worker at a time
+Backend   = 'scipy'         # 'scipy' (LSODA), 'compiled' or 'batch' (grid points in lockstep)
+# The 'compiled' and 'batch' backends integrate with the explicit DOP853 scheme instead of
+# LSODA; they are faster on large grids and give n_s within ~1e-8 of the LSODA solves.
+Warm_start = True           # Solve neighbouring grid points in order, each one started from
+                            # the end of inflation and first step of the point before
+
+# > Set the solution cache
+# Inflation solutions are kept in op_data/cache and reused by later runs with the same
+# parameters. Set Use_cache = False to always integrate.
+Use_cache = True
+
+# > Set the reheating engine
+# 'auto' integrates the full field equations until the oscillation period is much shorter
+# than the Hubble time and the oscillation-averaged equations afterwards; 'full' resolves
+# every oscillation up to the end of reheating.
+Reheating_engine = 'auto'
+
+# > Set the plotting
+# Figures are rendered in background processes while the solver runs. Without a display
+# they are only saved to op_data.
+Plot_workers = 1
 
 
 #####################################################################################
-if(Setting == 'Parameter space Sketch with varying alpha'):
-    # Region: Inflation
-    # Several Scalar Spectral Index and Tensor-to-Scalar ratio are obtained by varying
-    # the parameter alpha for fixed value of beta and mu.
-    # Taking beta value 0.3 tp^2 and mu value corresponding to the GUT energy scale,
-    # see reference https://doi.org/10.1103/PhysRevD.32.2511.
-
-
-    # Make parameter output data file in data directory
-    root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
-    data_Dir = root_Dir + "/op_data"
-    filename = 'alpha_para_space'
-    filetype = "txt"
-
-    # Write data to text file
-    SDlogger.info('Writting inflation data to filename : %s.', filename)
-    with open(data_Dir + "/" + filename + "." + filetype, "w") as para_file:
-        para_file.write("Project Title: Reheating by Scalaron Decay\n")
-        para_file.write("File Type: Data \n")
-        para_file.write("Author: Arun Mathew\n")
-        para_file.write("Affiliation: Dept. of Physics, IIT Guwahati, India\n\n")
-        para_file.write("Data: Parameter Space\n\n")
-        para_file.write("alpha, beta, mu, n_s, r\n")
+# The operation is guarded so that the worker processes of the parameter sweeps,
+# which import this file, do not run it again.
+if __name__ == '__main__':
+    SDlogger.info('Operating mode : %s', Setting)
+    # The cache is opened here and handed to the sweeps, not by every importing worker
+    Cache = solution_cache() if Use_cache else None
+
+    #################################################################################
+    if(Setting == 'Default'):
+        # Region: Inflation
+        # In this section, the code perform under the Default Setting
+        # Default setting implies normal operation with single initial condition
+        # and
+        # Initializing model parameter
+        SDlogger.info('Initializing model parameters')
+        f_R_gravity = model(
+            16.5*pow(t_P, 2),         # value of the parameter alpha
+            0.3 * pow(t_P, 2),        # value of the parameter beta
+            pow(10, -4)*pow(t_P,-1),  # value of the parameter mu
+            pow(10, 13),              # Energy of the particles created
+            1/3                       # Equation of State P = omega rho
+        )
+
+        # Region: Inflation and Reheating
+        # Both regions are solved in one LSODA session which moves on into reheating at
+        # the end of inflation (epsilon_1 = 1) with the tolerances of reheating, see
+        # pipeline.py for the restart when the solver does not allow this.
+        PIPE = pipeline(f_R_gravity,  # Inherit the class model using object f_R_gravity
+                        "inf_data",   # Output file name of inflation
+                        "reh_data",   # Output file name of reheating
+                        engine=Reheating_engine
+                        )
+        # Solve the field equations of inflation and reheating and return
+        plotter.start_queue(Plot_workers)
+        INF_Register, REH_Register = PIPE.run()
+        plotter.finish()
+
+
+    #####################################################################################
+    if(Setting == 'Parameter space Sketch with varying alpha'):
+        # Region: Inflation
+        # Several Scalar Spectral Index and Tensor-to-Scalar ratio are obtained by varying
+        # the parameter alpha for fixed value of beta and mu.
+        # Taking beta value 0.3 tp^2 and mu value corresponding to the GUT energy scale,
+        # see reference https://doi.org/10.1103/PhysRevD.32.2511.
+
+
+        # Make parameter output data file in data directory
+        root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+        data_Dir = root_Dir + "/op_data"
+        filename = 'alpha_para_space'
+        filetype = "txt"
 
         # Parameter values
         SDlogger.info('Initializing model parameters')
         # Values of model parameters are given below with the value of the
-        # parameter alpha generating by the for loop
+        # parameter alpha generating by the list of the grid
         beta  = 0.3*pow(t_P, 2)             # value of the parameter beta
         mu    = pow(10,-4) * pow(t_P, -1)   # value of the parameter mu
         E     = pow(10, 13)                 # Energy of the particles created
         omega = 1/3                         # Equation of State P = omega rho
 
-        count = 0
-        for i in range(1, 100, 1):
-            count += 1
-            # for loop will generate the value of the parameter alpha
-            alpha = (1 + i/4)*pow(t_P, 2)
-            f_R_gravity = model(alpha, beta, mu, E, omega)
-
-            # Initialize the class inflation
-            INF = inflation(f_R_gravity,  # Inherit the class model using object f_R_gravity
-                            "None"        # No output file
-                            )
-            # Solve inflation field equations and return end values
-            Time, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4, n_s, r, Status = INF.inflation_solver()
-            SDlogger.info('Iteration index: %d -- Status : [%s]', count, Status)
-            # Save data to file
-            # We choose appropriate alpha value that gives the observed Scalar Spectral
-            # Index and Tensor-to-Scalar ratio.
-            numpy.savetxt(para_file, numpy.c_[alpha/pow(t_P, 2), beta/pow(t_P, 2), mu/pow(t_P, -1), n_s, r], fmt="%f")
-
-
-#####################################################################################
-if(Setting == 'Parameter space Sketch with varying beta'):
-    # Region: Inflation
-    # Several Scalar Spectral Index and Tensor-to-Scalar ratio are obtained by varying
-    # the parameter alpha for fixed value of beta and mu.
-    # Taking beta value 0.3 tp^2 and mu value corresponding to the GUT energy scale,
-    # see reference https://doi.org/10.1103/PhysRevD.32.2511.
-
-
-    # Make parameter output data file in data directory
-    root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
-    data_Dir = root_Dir + "/op_data"
-    filename = 'beta_para_space'
-    filetype = "txt"
-
-    # Write data to text file
-    SDlogger.info('Writting inflation data to filename : %s.', filename)
-    with open(data_Dir + "/" + filename + "." + filetype, "w") as para_file:
-        para_file.write("Project Title: Reheating by Scalaron Decay\n")
-        para_file.write("File Type: Data \n")
-        para_file.write("Author: Arun Mathew\n")
-        para_file.write("Affiliation: Dept. of Physics, IIT Guwahati, India\n\n")
-        para_file.write("Data: Parameter Space with varying beta\n\n")
-        para_file.write("alpha, beta, mu, n_s, r\n")
+        # The values of the parameter alpha are generated by the list below
+        grid = parameter_grid([(1 + i/4)*pow(t_P, 2) for i in range(1, 100, 1)], beta, mu, E, omega)
+        # Solve inflation field equations for every grid point in parallel.
+        # Results are kept in the sweep store, so an interrupted sweep resumes
+        # from the points already computed.
+        sweep_start = time.time()
+        with sweep_store(data_Dir + "/" + filename + ".sqlite") as store:
+            results = run_sweep(grid, workers=Workers, chunksize=Chunksize, backend=Backend,
+                                store=store, cache=Cache, warm_start=Warm_start)
+        logger.flush()
+        SDlogger.info('Sweep summary : %s', logger.summarize(logger.read_records(kind='inflation', since=sweep_start)))
+
+        # Write data to a binary file and to the legacy text file
+        # We choose appropriate alpha value that gives the observed Scalar Spectral
+        # Index and Tensor-to-Scalar ratio.
+        SDlogger.info('Writting inflation data to filename : %s.', filename)
+        points = numpy.array(grid)
+        columns = {'alpha': points[:, 0]/pow(t_P, 2), 'beta': points[:, 1]/pow(t_P, 2),
+                   'mu': points[:, 2]/pow(t_P, -1),
+                   'n_s': numpy.array([result[0] for result in results]),
+                   'r': numpy.array([result[1] for result in results])}
+        datafile.write(data_Dir + "/" + filename + ".npz", columns, {'title': 'Parameter Space'})
+        datafile.to_text(data_Dir + "/" + filename + ".npz", data_Dir + "/" + filename + "." + filetype)
+
+
+    #####################################################################################
+    if(Setting == 'Parameter space Sketch with varying beta'):
+        # Region: Inflation
+        # Several Scalar Spectral Index and Tensor-to-Scalar ratio are obtained by varying
+        # the parameter alpha for fixed value of beta and mu.
+        # Taking beta value 0.3 tp^2 and mu value corresponding to the GUT energy scale,
+        # see reference https://doi.org/10.1103/PhysRevD.32.2511.
+
+
+        # Make parameter output data file in data directory
+        root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+        data_Dir = root_Dir + "/op_data"
+        filename = 'beta_para_space'
+        filetype = "txt"
 
         # Parameter values
         SDlogger.info('Initializing model parameters')
         # Values of model parameters are given below with the value of the
-        # parameter alpha generating by the for loop
+        # parameter beta generating by the list of the grid
         alpha = 2.572*pow(10,8)*pow(t_P, 2) # value of the parameter beta
         mu    = pow(10,-4) * pow(t_P, -1)   # value of the parameter mu
         E     = pow(10, 13)                 # Energy of the particles created
         omega = 1/3                         # Equation of State P = omega rho
 
-        count = 0
-        for i in range(1, 100, 1):
-            count += 1
-            # for loop will generate the value of the parameter alpha
-            beta = (1 + i/4)*pow(10,6)*pow(t_P, 2)
-            f_R_gravity = model(alpha, beta, mu, E, omega)
-
-            # Initialize the class inflation
-            INF = inflation(f_R_gravity,  # Inherit the class model using object f_R_gravity
-                            "None"        # No output file
-                            )
-            # Solve inflation field equations and return end values
-            Time, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4, n_s, r, Status = INF.inflation_solver()
-            SDlogger.info('Iteration index: %d -- Status : [%s]', count, Status)
-            # Save data to file
-            # We choose appropriate alpha value that gives the observed Scalar Spectral
-            # Index and Tensor-to-Scalar ratio.
-            numpy.savetxt(para_file, numpy.c_[alpha/pow(t_P, 2), beta/pow(t_P, 2), mu/pow(t_P, -1), n_s, r], fmt="%f")
-
-
-#####################################################################################
-if(Setting == 'Default'):
-    # Region :Reheating
-
-    REH_IC = [INF_EndTime,
-              INF_EndXi,
-              INF_EndPsi,
-              INF_EndThe
-              ]
-    REH = reheating(f_R_gravity,
-                    REH_IC,
-                    "reh_data"
-                    )
-
-    # Solve reheating field equations and return
-    REH_Register = REH.reheating_solver()
-
+        # The values of the parameter beta are generated by the list below
+        grid = parameter_grid(alpha, [(1 + i/4)*pow(10,6)*pow(t_P, 2) for i in range(1, 100, 1)], mu, E, omega)
+        # Solve inflation field equations for every grid point in parallel.
+        # Results are kept in the sweep store, so an interrupted sweep resumes
+        # from the points already computed.
+        sweep_start = time.time()
+        with sweep_store(data_Dir + "/" + filename + ".sqlite") as store:
+            results = run_sweep(grid, workers=Workers, chunksize=Chunksize, backend=Backend,
+                                store=store, cache=Cache, warm_start=Warm_start)
+        logger.flush()
+        SDlogger.info('Sweep summary : %s', logger.summarize(logger.read_records(kind='inflation', since=sweep_start)))
+
+        # Write data to a binary file and to the legacy text file
+        # We choose appropriate alpha value that gives the observed Scalar Spectral
+        # Index and Tensor-to-Scalar ratio.
+        SDlogger.info('Writting inflation data to filename : %s.', filename)
+        points = numpy.array(grid)
+        columns = {'alpha': points[:, 0]/pow(t_P, 2), 'beta': points[:, 1]/pow(t_P, 2),
+                   'mu': points[:, 2]/pow(t_P, -1),
+                   'n_s': numpy.array([result[0] for result in results]),
+                   'r': numpy.array([result[1] for result in results])}
+        datafile.write(data_Dir + "/" + filename + ".npz", columns, {'title': 'Parameter Space with varying beta'})
+        datafile.to_text(data_Dir + "/" + filename + ".npz", data_Dir + "/" + filename + "." + filetype)
+
+
+    #####################################################################################
+    if(Setting == 'Adaptive parameter space'):
+        # Region: Inflation
+        # Scalar Spectral Index and Tensor-to-Scalar ratio over the (alpha, beta) plane,
+        # solved on a grid that is only refined where n_s crosses its observed value
+        # 0.9649 or where inflation stops working, instead of the uniform grids above.
+
+        # Make parameter output data file in data directory
+        root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+        data_Dir = root_Dir + "/op_data"
+        filename = 'adaptive_para_space'
+        filetype = "txt"
 
+        # Parameter values
+        SDlogger.info('Initializing model parameters')
+        alpha = [pow(t_P, 2), 100*pow(t_P, 2)]     # range of the parameter alpha
+        beta  = [0.01*pow(t_P, 2), pow(t_P, 2)]    # range of the parameter beta
+        mu    = pow(10,-4) * pow(t_P, -1)          # value of the parameter mu
+        E     = pow(10, 13)                        # Energy of the particles created
+        omega = 1/3                                # Equation of State P = omega rho
+
+        sweep_start = time.time()
+        with sweep_store(data_Dir + "/" + filename + ".sqlite") as store:
+            QT = quadtree(alpha, beta, mu, E, omega, cells=(4, 4), max_depth=4, log=(True, True),
+                          tol_n_s=None, workers=Workers, backend=Backend, store=store, cache=Cache,
+                          warm_start=Warm_start)
+            samples = QT.run()
+        logger.flush()
+        SDlogger.info('Sweep summary : %s', logger.summarize(logger.read_records(kind='inflation', since=sweep_start)))
+
+        # Write the sampled points and the contour n_s = 0.9649 to binary files and to
+        # the legacy text files
+        SDlogger.info('Writting inflation data to filename : %s.', filename)
+        columns = {'alpha': samples['alpha']/pow(t_P, 2), 'beta': samples['beta']/pow(t_P, 2),
+                   'mu': numpy.full(len(samples['alpha']), mu/pow(t_P, -1)),
+                   'n_s': samples['n_s'], 'r': samples['r']}
+        datafile.write(data_Dir + "/" + filename + ".npz", columns,
+                       {'title': 'Adaptive Parameter Space', 'solves': QT.solves})
+        datafile.to_text(data_Dir + "/" + filename + ".npz", data_Dir + "/" + filename + "." + filetype)
+        contour = QT.contour()
+        datafile.write(data_Dir + "/" + filename + "_contour.npz",
+                       {'alpha': contour[:, 0]/pow(t_P, 2), 'beta': contour[:, 1]/pow(t_P, 2)},
+                       {'title': 'Contour n_s = 0.9649'})
+        datafile.to_text(data_Dir + "/" + filename + "_contour.npz", data_Dir + "/" + filename + "_contour." + filetype)
@@ -1,23 +1,18 @@
 import matplotlib.pyplot as plt
-from itertools import islice
 import numpy as np
 import matplotlib as mpl
+from tools import loader
 #mpl.rcParams['text.usetex'] = True
 #mpl.rcParams['text.latex.preamble'] = [r'\usepackage{amsmath}']
 
 plt.rcParams['text.latex.preamble'] = r"\usepackage{bm} \usepackage{amsmath}"
 
 
-beta = []
-n_s = []
-r = []
-
-with open('beta_para_space.txt', 'r') as f:
-    for line in islice(f, 8, None):
-        column = line.split()
-        beta.append(float(column[1]))
-        n_s.append(float(column[2]))
-        r.append(float(column[3]))
+# Columns of the beta sweep of main.py by name
+data = loader.load('beta_para_space.txt')
+beta = data['beta']
+n_s = data['n_s']
+r = data['r']
 
 
 print(beta)
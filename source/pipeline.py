@@ -0,0 +1,244 @@
+# Setting up the pipeline from the region of Inflation into the region of Reheating
+# Author: Arun Mathew
+#
+# Inflation and reheating are integrated in one LSODA session. The end of inflation is
+# located on the dense output of the step in which epsilon_1 crosses 1, after which the
+# solver switches to the tolerances of reheating and carries on with its step size and
+# history instead of starting again from the end state. The output of each phase is taken
+# on the time vector of its class and handed to inflation_solver and reheating_solver for
+# the diagnostics, data files and plots.
+#
+# The tolerances are changed in the work arrays of scipy's LSODA wrapper, which are
+# private, see set_tolerances. If they do not have the expected layout, reheating starts a
+# new LSODA solver at the end of inflation with the last accepted step of inflation as its
+# first step.
+#
+# The end of inflation is located here to within the round off of the separate solve
+# (~1e-12 in t_e), and n_s agrees with it to 1e-12. Reheating at the default atol = 1e-16
+# does not control the error at the minima of Xi (~1e-26), so that a change of 1e-12 in
+# its initial state moves Theta by a few percent after 50 periods; the pipeline and the
+# separate solves differ by as much, as do two separate solves from states that differ
+# in their last digits. With reheating.atol = 1e-20 they agree to 1e-5, as does the 'auto'
+# engine, whose full field equations are integrated with atol = 1e-20, see secular.py.
+from fieldeqs import *
+from inflation import inflation
+from reheating import reheating
+import secular
+import instrument
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Pipeline')
+
+# Tolerance of the event localization, as in scipy.integrate.solve_ivp
+EPS = numpy.finfo(float).eps
+
+
+#####################################################################################
+class pipeline():
+
+    def __init__(self, model_object, inf_output_file, reh_output_file, output='full', stride=1,
+                 engine='full', n_periods=5000):
+        '''
+        :param model_object: object of the class fieldeqs.model
+        :param inf_output_file: output file of inflation, see the class inflation
+        :param reh_output_file: output file of reheating, see the class reheating
+        :param output: output mode of reheating, 'full' or 'stride'
+        :param stride: keep every stride-th point in the 'stride' mode
+        :param engine: reheating engine, 'full' or 'auto'
+        :param n_periods: end of reheating in units of t_osc
+        '''
+        if output not in ('full', 'stride'):
+            raise ValueError('The pipeline requires the full or stride output mode.')
+        SDlogger.info('Setting up the pipeline from inflation into reheating.')
+        self.model_object = model_object
+        self.INF = inflation(model_object, inf_output_file)
+        self.REH = None  # class reheating, set up at the end of inflation
+        self.reh_output_file = reh_output_file
+        self.reh_options = {'output': output, 'stride': stride, 'engine': engine, 'n_periods': n_periods}
+        # Solver statistics by phase ('inflation', 'reheating', 'averaged'), see instrument.py
+        self.stats = {}
+
+    #####################################################################################
+    def set_tolerances(self, solver, rtol, atol):
+        '''
+        Change the tolerances of a running LSODA solver, which keeps its step size, order
+        and Nordsieck history (istate = 3 of LSODA)
+
+        The tolerances are held in the private call arguments of scipy's LSODA wrapper,
+        [rtol, atol, itask, istate, rwork, iwork, jt]; they are only changed if these hold
+        the current tolerances of the solver.
+
+        :return: True if the tolerances were changed, False if the call arguments do not
+                 have the expected layout
+        '''
+        try:
+            integrator = solver._lsoda_solver._integrator
+            call_args = integrator.call_args
+            known = (len(call_args) == 7 and call_args[3] == 2 and
+                     numpy.all(call_args[0] == integrator.rtol) and
+                     numpy.all(call_args[1] == integrator.atol))
+        except (AttributeError, TypeError, ValueError):
+            return False
+        if not known:
+            return False
+        integrator.rtol, integrator.atol = rtol, atol
+        call_args[0], call_args[1], call_args[3] = rtol, atol, 3
+        return True
+
+    def inflation_phase(self, solver):
+        '''
+        Step the solver to the end of inflation
+
+        :return: solution of inflation with the fields of scipy.integrate.solve_ivp
+        '''
+        from scipy.optimize import OptimizeResult, brentq
+        INF = self.INF
+        stop = INF.stop_condition
+        t_points = INF.tvector
+        ts, ys = [], []
+        k = 0
+        t_last = min(INF.tspan[1], solver.t_bound)
+        status, message = 0, 'The solver successfully reached the end of the integration interval.'
+        t_event, y_event = numpy.empty(0), numpy.empty((0, 3))
+        g_old = stop(solver.t, solver.y)
+        monitor = instrument.monitor('inflation', solver)
+        while True:
+            step_message = monitor.step()
+            if solver.status == 'failed':
+                status, message = -1, step_message
+                break
+            dense = None
+            t_stop = solver.t
+            g_new = stop(solver.t, solver.y)
+            if g_old <= 0 <= g_new:
+                dense = solver.dense_output()
+                t_stop = brentq(lambda t: stop(t, dense(t)), solver.t_old, solver.t, xtol=4 * EPS, rtol=4 * EPS)
+                t_event, y_event = numpy.array([t_stop]), dense(t_stop).reshape(1, 3)
+                status, message = 1, 'A termination event occurred.'
+            n = numpy.searchsorted(t_points, t_stop, side='right')
+            if n > k:
+                if dense is None:
+                    dense = solver.dense_output()
+                ts.append(t_points[k:n])
+                ys.append(dense(t_points[k:n]))
+                k = n
+            if status == 1 or solver.status != 'running' or solver.t >= t_last:
+                break
+            g_old = g_new
+
+        sol = OptimizeResult(t=numpy.concatenate(ts) if ts else numpy.empty(0),
+                             y=numpy.concatenate(ys, axis=1) if ys else numpy.empty((3, 0)),
+                             sol=None, t_events=[t_event], y_events=[y_event],
+                             nfev=solver.nfev, njev=solver.njev, nlu=solver.nlu,
+                             status=status, message=message, success=status >= 0,
+                             stats=monitor.finish(INF.log_stats))
+        return sol
+
+    def reheating_phase(self, solver):
+        '''
+        Step the solver from the end of inflation to the end of reheating, switching to
+        the averaged equations with the 'auto' engine
+
+        :return: solution of reheating with the fields t and y
+        '''
+        from scipy.optimize import OptimizeResult, brentq
+        REH = self.REH
+        t_bound = solver.t_bound
+        t_points = REH.tvector if REH.output == 'full' else REH.tvector[::REH.stride]
+        k, ts, ys = 0, [], []
+        if solver.t_old is not None:
+            # The step in which inflation ended also holds the start of reheating
+            k = numpy.searchsorted(t_points, solver.t, side='right')
+            ts, ys = [t_points[:k]], [solver.dense_output()(t_points[:k])]
+
+        engine = None
+        if REH.engine == 'auto':
+            engine = secular.secular_reheating(self.model_object)
+            t_estimate = engine.switch_estimate(REH.REH_IC[0], REH.REH_IC[1:])
+        Psi_old = solver.y[1]
+        monitor = instrument.monitor('reheating', solver)
+        stats = {}
+        while solver.status == 'running':
+            step_message = monitor.step()
+            if solver.status == 'failed':
+                SDlogger.error('%s', step_message)
+                break
+            dense = None
+            t_stop = solver.t
+            switch = False
+            # Maximum of Xi inside the step
+            if engine is not None and Psi_old >= 0 >= solver.y[1]:
+                dense = solver.dense_output()
+                t_peak = brentq(lambda t: dense(t)[1], solver.t_old, solver.t, xtol=4 * EPS, rtol=4 * EPS)
+                y_peak = dense(t_peak)
+                switch = engine.switch(t_peak, y_peak, t_estimate)
+                if switch:
+                    t_stop = t_peak
+            n = numpy.searchsorted(t_points, t_stop, side='right')
+            if n > k:
+                if dense is None:
+                    dense = solver.dense_output()
+                ts.append(t_points[k:n])
+                ys.append(dense(t_points[k:n]))
+                k = n
+            if switch:
+                SDlogger.info('Switching to the oscillation-averaged equations at t = %f.', t_peak)
+                REH.switch_time = t_peak
+                t_secular, y_secular = engine.averaged(t_peak, y_peak, t_bound)
+                stats['averaged'] = engine.stats['averaged']
+                if REH.log_stats:
+                    stats['averaged'].log()
+                ts.append(t_secular)
+                ys.append(y_secular)
+                break
+            Psi_old = solver.y[1]
+
+        stats = dict(full=monitor.finish(REH.log_stats), **stats)
+        return OptimizeResult(t=numpy.concatenate(ts) if ts else numpy.empty(0),
+                              y=numpy.concatenate(ys, axis=1) if ys else numpy.empty((3, 0)),
+                              stats=stats)
+
+    #####################################################################################
+    def run(self):
+        '''
+        Solve inflation and reheating in one integration
+
+        :return: (INF_Register, REH_Register), the returns of inflation.inflation_solver
+                 and reheating.reheating_solver; REH_Register is None if inflation does
+                 not end
+        '''
+        from scipy.integrate import LSODA
+        INF = self.INF
+        t_bound = self.model_object.timescales()[1] * self.reh_options['n_periods']
+        solver = LSODA(self.model_object.field_eqs, INF.tspan[0], INF.IC, t_bound,
+                       rtol=INF.rtol, atol=INF.atol, jac=self.model_object.field_jac)
+
+        inf_sol = self.inflation_phase(solver)
+        INF.stats = self.stats['inflation'] = inf_sol.stats
+        INF_Register = INF.inflation_solver(inf_sol)
+        if inf_sol.status != 1:
+            SDlogger.error('Inflation does not end, no reheating.')
+            return INF_Register, None
+
+        self.REH = reheating(self.model_object, [INF.t_end] + list(INF.y_end), self.reh_output_file,
+                             **self.reh_options)
+        # Tolerances of the full field equations of the reheating engine
+        tolerances = secular.secular_reheating if self.REH.engine == 'auto' else self.REH
+        rtol, atol = tolerances.rtol, tolerances.atol
+        if not self.set_tolerances(solver, rtol, atol):
+            # Unknown layout of the call arguments: a new solver from the end of inflation,
+            # starting with the last accepted step of inflation
+            SDlogger.info('Starting a new solver for reheating at t = %f.', INF.t_end)
+            solver = LSODA(self.model_object.field_eqs, INF.t_end, INF.y_end, t_bound,
+                           rtol=rtol, atol=atol, jac=self.model_object.field_jac,
+                           first_step=min(solver.step_size, t_bound - INF.t_end))
+        reh_sol = self.reheating_phase(solver)
+        self.REH.stats = reh_sol.stats
+        self.stats['reheating'] = reh_sol.stats['full']
+        if 'averaged' in reh_sol.stats:
+            self.stats['averaged'] = reh_sol.stats['averaged']
+        SDlogger.info('Pipeline finished with %d function evaluations.',
+                      self.stats['inflation'].nfev + self.stats['reheating'].nfev)
+        REH_Register = self.REH.reheating_solver(reh_sol)
+        return INF_Register, REH_Register
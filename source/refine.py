@@ -0,0 +1,177 @@
+# Setting up the adaptive refinement of the parameter space of Inflation
+# Author: Arun Mathew
+#
+# The (alpha, beta) plane is covered by a coarse grid of cells whose corners are solved
+# with inflation.inflation_solver (through sweep.run_sweep, in parallel). A cell is split
+# into four (quadtree) where a target contour of n_s or r, e.g. the observed n_s = 0.9649,
+# passes between its corners, where n_s or r change across the cell by more than a
+# tolerance, or where some of its corners fail to give inflation. The new corners of all
+# the cells of a level are solved in one sweep. Far from the contours the grid stays
+# coarse, so the region of interest is resolved as finely as a uniform grid of the finest
+# level at a fraction of the solves.
+#
+# The corners are kept on an integer lattice of the finest level, so that the corners
+# shared by neighbouring cells are solved once.
+import numpy
+from fieldeqs import *
+from sweep import run_sweep
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Refine')
+
+# Observed Scalar Spectral Index, see para_plot.py
+N_S_OBSERVED = 0.9649
+
+
+#####################################################################################
+class quadtree():
+    '''
+    Adaptive sampling of the (alpha, beta) plane for fixed mu, E and omega
+    '''
+    def __init__(self, alpha, beta, mu, E, omega, cells=(8, 8), max_depth=4, log=(False, False),
+                 targets=None, tol_n_s=0.02, tol_r=None, workers=None, backend='scipy',
+                 store=None, cache=None, warm_start=False):
+        '''
+        :param alpha: range (low, high) of the parameter alpha
+        :param beta: range (low, high) of the parameter beta
+        :param mu, E, omega: fixed model parameters
+        :param cells: number of cells of the initial grid along alpha and beta
+        :param max_depth: number of times a cell of the initial grid can be split
+        :param log: spacing of the cells uniform in log10 of alpha and beta
+        :param targets: contours to resolve, dictionary of lists of values keyed by 'n_s'
+                        and 'r'; by default the observed n_s
+        :param tol_n_s: largest change of n_s across a cell, None for no limit
+        :param tol_r: largest change of r across a cell, None for no limit
+        :param workers, backend, store, cache, warm_start: see sweep.run_sweep
+        '''
+        self.range = [numpy.log10(alpha) if log[0] else numpy.asarray(alpha, dtype=float),
+                      numpy.log10(beta) if log[1] else numpy.asarray(beta, dtype=float)]
+        self.log = log
+        self.mu, self.E, self.omega = mu, E, omega
+        self.cells = cells
+        self.max_depth = max_depth
+        self.targets = {'n_s': [N_S_OBSERVED]} if targets is None else targets
+        self.tolerance = {'n_s': tol_n_s, 'r': tol_r}
+        self.sweep_options = {'workers': workers, 'backend': backend, 'store': store, 'cache': cache,
+                              'warm_start': warm_start}
+        # Lattice of the finest level: a cell of the initial grid spans scale points
+        self.scale = pow(2, max_depth)
+        self.points = {}  # (n_s, r, status, t_e) by lattice point (i, j)
+        self.leaves = []  # cells that are not split, (i, j, size) of the lower corner
+        self.solves = 0
+
+    #####################################################################################
+    def parameters(self, i, j):
+        # Model parameters of a lattice point
+        x = [self.range[0][0] + (self.range[0][1] - self.range[0][0]) * i / (self.cells[0] * self.scale),
+             self.range[1][0] + (self.range[1][1] - self.range[1][0]) * j / (self.cells[1] * self.scale)]
+        alpha, beta = (pow(10.0, value) if log else value for value, log in zip(x, self.log))
+        return alpha, beta, self.mu, self.E, self.omega
+
+    def solve(self, lattice_points):
+        # Solve the lattice points that are not solved yet, in one sweep
+        todo = sorted(set(point for point in lattice_points if point not in self.points))
+        if not todo:
+            return
+        results = run_sweep([self.parameters(i, j) for i, j in todo], **self.sweep_options)
+        for point, result in zip(todo, results):
+            self.points[point] = result
+        self.solves += len(todo)
+
+    @staticmethod
+    def corners(i, j, size):
+        return [(i, j), (i + size, j), (i, j + size), (i + size, j + size)]
+
+    def split(self, i, j, size):
+        '''
+        :return: True if the cell (i, j, size) has to be split
+        '''
+        results = [self.points[corner] for corner in self.corners(i, j, size)]
+        valid = [result for result in results if result[2] == 'OK' and numpy.isfinite(result[0])]
+        # Border of the region that gives inflation
+        if 0 < len(valid) < len(results):
+            return True
+        if not valid:
+            return False
+        for q, quantity in ((0, 'n_s'), (1, 'r')):
+            values = [result[q] for result in valid]
+            low, high = min(values), max(values)
+            if any(low <= target <= high for target in self.targets.get(quantity, ())):
+                return True
+            if self.tolerance[quantity] is not None and high - low > self.tolerance[quantity]:
+                return True
+        return False
+
+    #####################################################################################
+    def run(self):
+        '''
+        Refine the grid level by level
+
+        :return: the sampled points, see samples()
+        '''
+        size = self.scale
+        cells = [(i * size, j * size, size) for i in range(self.cells[0]) for j in range(self.cells[1])]
+        self.solve([corner for cell in cells for corner in self.corners(*cell)])
+        for depth in range(self.max_depth + 1):
+            refine = []
+            for cell in cells:
+                if depth < self.max_depth and self.split(*cell):
+                    refine.append(cell)
+                else:
+                    self.leaves.append(cell)
+            SDlogger.info('Depth %d: %d of %d cells split, %d points solved.',
+                          depth, len(refine), len(cells), self.solves)
+            if not refine:
+                break
+            cells = []
+            for i, j, size in refine:
+                half = size // 2
+                cells += [(i, j, half), (i + half, j, half), (i, j + half, half), (i + half, j + half, half)]
+            self.solve([corner for cell in cells for corner in self.corners(*cell)])
+
+        uniform = (self.cells[0] * self.scale + 1) * (self.cells[1] * self.scale + 1)
+        SDlogger.info('Refinement finished with %d solves, a uniform grid of the finest level has %d points.',
+                      self.solves, uniform)
+        return self.samples()
+
+    def samples(self):
+        '''
+        :return: dictionary of the arrays alpha, beta, n_s, r, t_e and status of the sampled
+                 points, in lattice order
+        '''
+        lattice = sorted(self.points)
+        parameters = numpy.array([self.parameters(i, j)[:2] for i, j in lattice]).reshape(-1, 2)
+        results = [self.points[point] for point in lattice]
+        return {'alpha': parameters[:, 0], 'beta': parameters[:, 1],
+                'n_s': numpy.array([result[0] for result in results], dtype=float),
+                'r': numpy.array([result[1] for result in results], dtype=float),
+                't_e': numpy.array([result[3] for result in results], dtype=float),
+                'status': [result[2] for result in results]}
+
+    #####################################################################################
+    def contour(self, target=N_S_OBSERVED, quantity='n_s'):
+        '''
+        Points of a contour on the edges of the leaf cells, by linear interpolation
+        between the corners
+
+        :return: array of shape (N, 2) of (alpha, beta)
+        '''
+        q = 0 if quantity == 'n_s' else 1
+        crossings = set()
+        for i, j, size in self.leaves:
+            a, b, c, d = self.corners(i, j, size)
+            for start, end in ((a, b), (a, c), (b, d), (c, d)):
+                v0, v1 = self.points[start][q], self.points[end][q]
+                if numpy.isfinite(v0) and numpy.isfinite(v1) and v0 != v1 and min(v0, v1) <= target <= max(v0, v1):
+                    crossings.add((start, end, (target - v0) / (v1 - v0)))
+        points = []
+        for start, end, w in sorted(crossings):
+            p0, p1 = self.parameters(*start)[:2], self.parameters(*end)[:2]
+            x = []
+            for k, log in enumerate(self.log):
+                x0, x1 = (numpy.log10(p0[k]), numpy.log10(p1[k])) if log else (p0[k], p1[k])
+                value = x0 + w * (x1 - x0)
+                x.append(pow(10.0, value) if log else value)
+            points.append(x)
+        return numpy.array(points).reshape(-1, 2)
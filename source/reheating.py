@@ -2,8 +2,15 @@
 # Author: Arun Mathew
 
 from fieldeqs import *
-from scipy.integrate import solve_ivp
 from tools import plotter
+from tools import datafile
+import secular
+import instrument
+import os
+import time
+
+# scipy.integrate and the compiled backend are imported by the methods that integrate,
+# so that importing this file stays cheap
 
 #####################################################################################
 # > Set the logger tree-level
@@ -11,12 +18,48 @@ SDlogger = logger.setup_logger('Reheating')
 
 class reheating():
     '''
-    sda
+    Region of Reheating, starting from the state at the end of inflation
+
+    The solution is kept in one of the following output modes:
+
+    * 'full': every point of the time vector (100 points per oscillation period)
+    * 'stride': every stride-th point of the time vector
+    * 'lazy': the state at the start of every oscillation period and the envelope
+      (maximum and minimum of Xi and Theta) over each period. Any other point is
+      computed on request by sample(), which integrates from the nearest stored state.
+
+    With the 'auto' engine the full field equations are only integrated until the
+    oscillation period is much shorter than the Hubble time, after which the
+    oscillation-averaged equations of secular.secular_reheating take over with one
+    point per period. Xi and Psi are then the averages over a period. In the 'lazy'
+    mode the stored states after the switch are averaged states as well, and the
+    envelope of Xi there is the envelope h = 2 <Xi> of the averaged equations.
     '''
 
-    def __init__(self, model_object, REH_IC, output_file):
+    # Solver tolerances for the region of reheating
+    atol = 1e-16
+    rtol = 2.3e-14
+
+    # Write the solver statistics of every solve to the log, see instrument.py
+    log_stats = False
+
+    def __init__(self, model_object, REH_IC, output_file, backend='scipy', output='full', stride=1,
+                 engine='full', n_periods=5000):
         SDlogger.info('Setting up initial attributes for Reheating.')
         self.model_object = model_object  # create a object for the class model
+        self.backend = backend  # 'scipy' for LSODA or 'compiled' for the compiled DOP853 stepper
+        if output not in ('full', 'stride', 'lazy'):
+            raise ValueError('Unknown output mode %s.' % output)
+        if output == 'lazy' and backend != 'scipy':
+            raise ValueError('The lazy output mode requires the scipy backend.')
+        if engine not in ('full', 'auto'):
+            raise ValueError('Unknown engine %s.' % engine)
+        if engine == 'auto' and backend != 'scipy':
+            raise ValueError('The auto engine requires the scipy backend.')
+        self.engine = engine    # 'full' field equations or 'auto' switch to the averaged equations
+        self.switch_time = None # time of the switch to the averaged equations
+        self.output = output    # output mode, see the class documentation
+        self.stride = stride    # keep every stride-th point in the 'stride' mode
         # Initial Conditions for Inflation
         self.REH_IC = REH_IC
         SDlogger.info('Reheating - Initial Conditions : [%f,%f,%f,%f].',
@@ -26,109 +69,394 @@ class reheating():
                       self.REH_IC[3]  # Initial Reheating Density in the units of E^4
                       )
 
-        # Reheating Time vector
+        # Reheating Time vector, evaluated on demand by grid() since it grows with n_periods
         start_time = self.REH_IC[0]
         self.t_scale = model_object.timescales()[1]
-        end_time = model_object.timescales()[1] * 5000
+        self.n_periods = n_periods  # end of reheating in units of t_scale
+        end_time = model_object.timescales()[1] * n_periods
         step_size = model_object.timescales()[1] / 100
-        num_steps = int((end_time - start_time) / step_size)
-        self.tvector = numpy.linspace(start=start_time, stop=end_time, num=num_steps)
+        self.num_steps = int((end_time - start_time) / step_size)
+        if self.num_steps < 2:
+            raise ValueError('The end of reheating at %g periods (t = %f) leaves less than two points '
+                             'of the time vector after t = %f.' % (n_periods, end_time, start_time))
+        self.step = (end_time - start_time) / (self.num_steps - 1)
         self.tspan = [start_time, end_time]
         # Name of output data file
         self.output_file = output_file
 
-
-    def reheating_solver(self):
+        # Stored states and envelope of the 'lazy' output mode
+        self.checkpoints = None
+        self.envelope = None
+        # Averaged equations of the 'auto' engine in the 'lazy' mode, see sample()
+        self.secular = None
+
+        # Solver statistics of the last solve by phase ('full', 'averaged'), see instrument.py
+        self.stats = {}
+
+
+    #####################################################################################
+    def grid(self, index):
+        '''
+        Points of the reheating time vector, identical to
+        numpy.linspace(start_time, end_time, num_steps)[index]
+        '''
+        t = self.tspan[0] + numpy.asarray(index) * self.step
+        return numpy.where(numpy.asarray(index) == self.num_steps - 1, self.tspan[1], t)
+
+    @property
+    def tvector(self):
+        return self.grid(numpy.arange(self.num_steps))
+
+
+    #####################################################################################
+    def solve_lazy(self):
+        '''
+        Integrate step by step, keeping only the state at the start of every oscillation
+        period and the envelope of Xi and Theta over each period.
+
+        :return: times and states (3, n) of the stored checkpoints
+        '''
+        if self.engine == 'auto':
+            return self.solve_lazy_auto()
+        from scipy.integrate import LSODA
+        t0, t_bound = self.tspan
+        IC = [self.REH_IC[1], self.REH_IC[2], self.REH_IC[3]]
+        solver = LSODA(self.model_object.field_eqs, t0, IC, t_bound,
+                       rtol=self.rtol, atol=self.atol, jac=self.model_object.field_jac)
+
+        t_check = [t0]
+        y_check = [numpy.array(IC, dtype=float)]
+        t_window, Xi_max, Xi_min, The_max, The_min = [], [], [], [], []
+        window = [IC[0], IC[0], IC[2], IC[2]]
+        t_next = t0 + self.t_scale
+
+        monitor = instrument.monitor('reheating', solver)
+        while solver.status == 'running':
+            message = monitor.step()
+            if solver.status == 'failed':
+                SDlogger.error('%s', message)
+                break
+            # Close every period which ends inside this step
+            while t_next <= solver.t:
+                y_next = solver.dense_output()(t_next)
+                window = [max(window[0], y_next[0]), min(window[1], y_next[0]),
+                          max(window[2], y_next[2]), min(window[3], y_next[2])]
+                t_window.append(t_next - self.t_scale / 2)
+                Xi_max.append(window[0])
+                Xi_min.append(window[1])
+                The_max.append(window[2])
+                The_min.append(window[3])
+                t_check.append(t_next)
+                y_check.append(y_next)
+                window = [y_next[0], y_next[0], y_next[2], y_next[2]]
+                t_next += self.t_scale
+            Xi, The = solver.y[0], solver.y[2]
+            window = [max(window[0], Xi), min(window[1], Xi), max(window[2], The), min(window[3], The)]
+
+        # Close the last, possibly partial, period at the final time
+        if solver.t > t_check[-1]:
+            t_window.append((t_check[-1] + solver.t) / 2)
+            Xi_max.append(window[0])
+            Xi_min.append(window[1])
+            The_max.append(window[2])
+            The_min.append(window[3])
+            t_check.append(solver.t)
+            y_check.append(solver.y.copy())
+
+        if solver.status == 'finished':
+            SDlogger.info('The solver successfully reached the end of the integration interval.')
+        self.stats = {'full': monitor.finish(self.log_stats)}
+        self.checkpoints = (numpy.array(t_check), numpy.array(y_check).T)
+        self.envelope = {'t': numpy.array(t_window),
+                         'Xi_max': numpy.array(Xi_max), 'Xi_min': numpy.array(Xi_min),
+                         'The_max': numpy.array(The_max), 'The_min': numpy.array(The_min)}
+        return self.checkpoints
+
+
+    def solve_lazy_auto(self):
+        '''
+        'lazy' output mode of the 'auto' engine. The stored states at the start of every
+        oscillation period are those of the full field equations up to the switch and the
+        averaged states [<Xi>, d<Xi>/dt, Theta] afterwards. The envelope is taken over
+        the points of the time vector up to the switch, evaluated with sample(), and over
+        the stored states afterwards, where Xi = h cos^2(w t) ranges from 0 to h = 2 <Xi>.
+
+        :return: times and states (3, n) of the stored checkpoints
+        '''
+        t0, t_bound = self.tspan
+        IC = [self.REH_IC[1], self.REH_IC[2], self.REH_IC[3]]
+        t_period = t0 + self.t_scale * numpy.arange(int((t_bound - t0) / self.t_scale) + 1)
+        if t_period[-1] < t_bound:
+            t_period = numpy.append(t_period, t_bound)
+
+        self.secular = secular.secular_reheating(self.model_object)
+        (t_check, y_check), self.switch_time, y_switch = self.secular.full_phase(t0, IC, t_bound, t_eval=t_period)
+        if self.switch_time is not None:
+            SDlogger.info('Switching to the oscillation-averaged equations at t = %f.', self.switch_time)
+            t_averaged, y_averaged = self.secular.averaged(self.switch_time, y_switch, t_bound, t_period)
+            t_check = numpy.concatenate([t_check, t_averaged])
+            y_check = numpy.concatenate([y_check, y_averaged], axis=1)
+        self.stats = dict(self.secular.stats)
+        if self.log_stats:
+            for stats in self.stats.values():
+                stats.log()
+        self.checkpoints = (t_check, y_check)
+
+        # Points of the envelope: the stored states and the time vector up to the switch
+        full = numpy.ones(len(t_check), dtype=bool) if self.switch_time is None else t_check <= self.switch_time
+        t_points = [t_check]
+        Xi_max, Xi_min = [numpy.where(full, y_check[0], 2 * y_check[0])], [numpy.where(full, y_check[0], 0.0)]
+        The = [y_check[2]]
+        t_end = t_bound if self.switch_time is None else self.switch_time
+        t_grid = self.grid(numpy.arange(int((t_end - t0) / self.step) + 1))
+        t_grid = t_grid[t_grid < t_end]
+        if len(t_grid):
+            Xi_grid, Psi_grid, The_grid = self.sample(t_grid)
+            t_points.append(t_grid)
+            Xi_max.append(Xi_grid)
+            Xi_min.append(Xi_grid)
+            The.append(The_grid)
+        t_points, Xi_max, Xi_min, The = (numpy.concatenate(x) for x in (t_points, Xi_max, Xi_min, The))
+
+        # Every period closes with the state at its end, as in solve_lazy()
+        n = len(t_check) - 1
+        period = numpy.clip(numpy.searchsorted(t_check, t_points, side='right') - 1, 0, n - 1)
+        closing = numpy.flatnonzero(numpy.isin(t_points, t_check[1:]))
+        period = numpy.concatenate([period, numpy.searchsorted(t_check, t_points[closing]) - 1])
+        t_points, Xi_max, Xi_min, The = (numpy.concatenate([x, x[closing]]) for x in (t_points, Xi_max, Xi_min, The))
+        order = numpy.argsort(period, kind='stable')
+        start = numpy.searchsorted(period[order], numpy.arange(n))
+        self.envelope = {'t': (t_check[:-1] + t_check[1:]) / 2,
+                         'Xi_max': numpy.maximum.reduceat(Xi_max[order], start),
+                         'Xi_min': numpy.minimum.reduceat(Xi_min[order], start),
+                         'The_max': numpy.maximum.reduceat(The[order], start),
+                         'The_min': numpy.minimum.reduceat(The[order], start)}
+        return self.checkpoints
+
+
+    def sample(self, t):
+        '''
+        Evaluate the reheating solution at arbitrary times in the 'lazy' output mode
+
+        Each requested time is integrated from the closest stored state before it, so the
+        cost is at most one oscillation period of integration per distinct period.
+
+        :param t: sorted times inside the reheating time span
+        :return: array (3, len(t)) of Xi, Psi and Theta
+        '''
+        if self.checkpoints is None:
+            raise RuntimeError('sample() needs the lazy output mode and a call of reheating_solver().')
+        from scipy.integrate import solve_ivp
+        t = numpy.atleast_1d(numpy.asarray(t, dtype=float))
+        t_check, y_check = self.checkpoints
+        y = numpy.empty((3, len(t)))
+        # Tolerances of the solve that stored the states
+        solver = self if self.secular is None else self.secular
+        atol, rtol = solver.atol, solver.rtol
+        # Times from the switch of the 'auto' engine on, from the averaged equations
+        averaged = numpy.zeros(len(t), dtype=bool) if self.switch_time is None else t >= self.switch_time
+        if averaged.any():
+            y[:, averaged] = self.secular.evaluate(t[averaged])
+        full = numpy.flatnonzero(~averaged)
+        index = numpy.clip(numpy.searchsorted(t_check, t[full], side='right') - 1, 0, len(t_check) - 1)
+        for k in numpy.unique(index):
+            members = full[index == k]
+            t_members = t[members]
+            if t_members[-1] == t_check[k]:
+                y[:, members] = y_check[:, k:k + 1]
+                continue
+            sol = solve_ivp(self.model_object.field_eqs, [t_check[k], t_members[-1]], y_check[:, k],
+                            t_eval=t_members, method='LSODA', atol=atol, rtol=rtol,
+                            jac=self.model_object.field_jac)
+            y[:, members] = sol.y
+        return y
+
+
+    #####################################################################################
+    def stream(self, chunk_periods=10, write=False):
+        '''
+        Integrate the field equations in chunks of chunk_periods oscillation periods
+
+        Only one chunk of the time vector is held in memory at a time and the solver state
+        is carried from one chunk to the next, so the memory use does not grow with
+        n_periods. The output mode 'stride' keeps every stride-th point of each chunk.
+
+        :param chunk_periods: length of a chunk in units of t_scale
+        :param write: append every chunk to the data file op_data/<output_file>.txt
+        :return: generator of (t, y) with y = [Xi, Psi, Theta] of shape (3, n)
+        '''
+        if self.engine != 'full' or self.output == 'lazy':
+            raise ValueError('Streaming requires the full engine and the full or stride output mode.')
+        stride = self.stride if self.output == 'stride' else 1
+        points_per_chunk = max(1, int(round(chunk_periods * self.t_scale / self.step)))
+        # Chunk boundaries on multiples of the stride
+        points_per_chunk = stride * max(1, points_per_chunk // stride)
+        if self.backend == 'compiled':
+            chunks = self.chunks_compiled(points_per_chunk, stride)
+        else:
+            chunks = self.chunks_scipy(points_per_chunk, stride)
+
+        data_file = None
+        if write and self.output_file != 'None':
+            root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+            data_Dir = root_Dir + "/op_data"
+            SDlogger.info('Writting reheating data to file %s.', self.output_file)
+            data_file = open(data_Dir + "/" + self.output_file + ".txt", "w")
+            datafile.text_header(data_file, 'Reheating Background Data', ['Time', 'Xi', 'Psi', 'Theta'],
+                                 self.model_object.metadata())
+        try:
+            for count, (t, y) in enumerate(chunks, start=1):
+                if data_file is not None:
+                    numpy.savetxt(data_file, numpy.c_[t, y.T], fmt="%.16e")
+                SDlogger.info('Reheating chunk %d: t/t_osc = %.1f of %d.', count, t[-1] / self.t_scale, self.n_periods)
+                yield t, y
+        finally:
+            if data_file is not None:
+                data_file.close()
+
+
+    def chunks_scipy(self, points_per_chunk, stride):
+        # Step LSODA through the whole time span and evaluate the time vector by dense output
+        from scipy.integrate import LSODA
+        t0, t_bound = self.tspan
+        IC = [self.REH_IC[1], self.REH_IC[2], self.REH_IC[3]]
+        solver = LSODA(self.model_object.field_eqs, t0, IC, t_bound,
+                       rtol=self.rtol, atol=self.atol, jac=self.model_object.field_jac)
+        last = self.num_steps - 1
+        k = 0                        # next index of the time vector
+        k_chunk = points_per_chunk   # first index of the next chunk
+        t_buffer, y_buffer = [], []
+        monitor = instrument.monitor('reheating', solver)
+        while k <= last and solver.status == 'running':
+            message = monitor.step()
+            if solver.status == 'failed':
+                SDlogger.error('%s', message)
+                break
+            k_reached = last if solver.status == 'finished' else min(last, int((solver.t - t0) / self.step))
+            while k <= k_reached:
+                k_stop = min(k_reached + 1, k_chunk)
+                index = numpy.arange(k, k_stop, stride)
+                if len(index):
+                    t = self.grid(index)
+                    t_buffer.append(t)
+                    y_buffer.append(solver.dense_output()(t))
+                    k = index[-1] + stride
+                else:
+                    k = k_stop
+                if k >= k_chunk:
+                    yield numpy.concatenate(t_buffer), numpy.concatenate(y_buffer, axis=1)
+                    t_buffer, y_buffer = [], []
+                    k_chunk += points_per_chunk
+        if t_buffer:
+            yield numpy.concatenate(t_buffer), numpy.concatenate(y_buffer, axis=1)
+
+
+    def chunks_compiled(self, points_per_chunk, stride):
+        # Restart the compiled stepper for every chunk from the state at the end of the last one
+        import compiled
+        t = self.tspan[0]
+        y = [self.REH_IC[1], self.REH_IC[2], self.REH_IC[3]]
+        for k in range(0, self.num_steps, points_per_chunk):
+            t_points = self.grid(numpy.arange(k, min(k + points_per_chunk, self.num_steps), stride))
+            sol = compiled.solve(self.model_object, [t, t_points[-1]], y, t_eval=t_points,
+                                 atol=self.atol, rtol=self.rtol)
+            if sol.status == -1:
+                SDlogger.error('%s', sol.message)
+                return
+            t, y = sol.t[-1], sol.y[:, -1]
+            yield sol.t, sol.y
+
+
+    #####################################################################################
+    def record(self, start, sol, The):
+        # Structured record of the solve, see tools/logger
+        logger.record('reheating', parameters=self.model_object.metadata(), backend=self.backend,
+                      engine=self.engine, output=self.output, n_periods=self.n_periods,
+                      switch_time=self.switch_time, Theta_end=The[-1] if len(The) else None,
+                      nfev=getattr(sol, 'nfev', None), njev=getattr(sol, 'njev', None),
+                      wall=None if start is None else time.perf_counter() - start,
+                      stats={phase: stats.as_dict() for phase, stats in self.stats.items() if stats is not None})
+
+    def reheating_solver(self, sol=None):
         """
-        Solve inflation field equations for the region of inflation
-
-        The docstring in the function should fully explain what the function is
-        for and how to use it
-
-                        * this is a bullet list
-                        * with multiple entries and some text in *italic* and even **bold**.
-                          The bullet list items can span multiple lines which are indented
-
-                        .. warning:: bullet (as well as enumerated) lists have to start and end
-                           with an empty line
-
-                        1. Single backquotes are for **references** to other documented items.
-                           For example `basf2.Module` will link to the documentation of the class
-                           Module in the python module basf2. A different link name and link
-                           target can be specified with <>: `Module class <basf2.Module>` will
-                           link to basf2.Module but the link will read "Module class"
-                        2. Double backquotes are for ``literal text``.
-
-                        .. warning:: this is different to markdown where single backquotes are
-                           usually used for literal text
-
-                        3. Links to external websites are usually of the form `Link Text <http://example.com>`_.
+        Solve the field equations for the region of reheating
 
-                        .. note:: there is an underscore at the end of links
+        The solution is stored according to the output mode of the object. In the 'lazy'
+        mode the initial window is evaluated with sample() and the full range is plotted
+        from the envelope of Xi and Theta.
 
-                        4. math is supported either inline :math:`f(x) = \sum_{x=i}^N x^i` or as
-                           display verssion:
+        Args:
+          sol: solution of the reheating phase integrated elsewhere, see pipeline.py; the
+               field equations are integrated here if None
 
-                           .. math::
-
-                              f(x) = \sum_{i=1}^N x^i
-
-                           .. seealso:: `Math support in Sphinx <http://www.sphinx-doc.org/en/stable/ext/math.html>`_
-                        5. The easiest way for code example is the "doctest" syntax: Start a new
-                           paragaph after an empty line with ``>>>`` followed by the python
-                           statements and (optionally) the expected output of these statements.
-
-                           >>> dummy_function_example("some name", foo="bar")
-                           "Hello some name, Lord of bar"
-
-                           .. seealso:: `Showing code examples <http://www.sphinx-doc.org/en/stable/markup/code.html>`_
-
-                        6. To document parameters and return types please use the :ref:`googlestyle` as shown below:
-
-                        Note:
-                          For class members please do not include the ``self`` parameter in this list
-
-                        Parameters:
-                          name (str): Description of the first parameter
-                           Can also span multiple lines if indented properly
-                          foo: Second parameter but no type given
-
-                        Returns:
-                          inf_tspan (1D array): time span of inflation in the unit of t_Planck
-
-                          Xi,
-                          Psi,
-                          The,
-                          Ricci,
-                          Epsilon_1,
-                          Epsilon_3,
-                          Epsilon_4,
-                          n_s,
-                          r,
-                          Status_flag
-
-                        See Also:
-                          Some references to other functions
+        Returns:
+          reh_tspan (1D array): times of the stored solution in the unit of t_Planck
 
+          Xi,
+          Psi,
+          The
         """
-        t_points = self.tvector
+        # Wall time of the solve, only when the field equations are integrated here
+        start = time.perf_counter() if sol is None else None
+        if self.output == 'lazy' and sol is None:
+            reh_tspan, (Xi, Psi, The) = self.solve_lazy()
+
+            # Initial window, evaluated lazily with 100 points per oscillation period
+            t_window = numpy.linspace(self.tspan[0], min(self.tspan[0] + 10*self.t_scale, self.tspan[1]), 1000)
+            Xi_window, Psi_window, The_window = self.sample(t_window)
+            plotter.plot_single(t_window/self.t_scale, Xi_window, [1, 10], [0, 0.04], '$t/t_{osc}$', '$\\xi$', 'reh_initial_H', 'png')
+            plotter.plot_single(t_window/self.t_scale, The_window, [1, 10], [0, 0.0004], '$t/t_{osc}$', '$\\rho/\\epsilon^4$', 'reh_initial_rho', 'png')
+
+            t_envelope = self.envelope['t']
+            plotter.plot_single(t_envelope / self.t_scale, self.envelope['Xi_max'], [1, self.n_periods], [0, 0.04], '$t/t_{osc}$', '$\\xi$', 'reh_full_H', 'png')
+            plotter.plot_single(t_envelope / self.t_scale, self.envelope['The_max'], [1, self.n_periods], [0, 0.4], '$t/t_{osc}$', '$\\rho/\\epsilon^4$','reh_full_rho', 'png')
+            self.record(start, None, The)
+            return reh_tspan, Xi, Psi, The
+
+        t_points = self.tvector if self.output == 'full' else self.tvector[::self.stride]
         IC = [self.REH_IC[1], self.REH_IC[2], self.REH_IC[3]]
         tspan = self.tspan
 
-        sol = solve_ivp(self.model_object.field_eqs, tspan, IC, t_eval=t_points,
-                        method='LSODA', atol=1e-16, rtol=2.3e-14
-                        #events=[self.stop_condition, ]  # Stopping Condition for integration
-                        )
-
-        reh_tspan = sol.t
-
-        Xi  = sol.y[0]
-        Psi = sol.y[1]
-        The = sol.y[2]
+        if sol is not None:
+            reh_tspan, reh_y = sol.t, sol.y
+        elif self.engine == 'auto':
+            engine = secular.secular_reheating(self.model_object)
+            reh_tspan, reh_y, self.switch_time = engine.solve(tspan[0], IC, tspan[1], t_eval=t_points)
+            self.stats = dict(engine.stats)
+            if self.log_stats:
+                for stats in self.stats.values():
+                    stats.log()
+        else:
+            if self.backend == 'compiled':
+                import compiled
+                wall, cpu = time.perf_counter(), time.process_time()
+                sol = compiled.solve(self.model_object, tspan, IC, t_eval=t_points,
+                                     atol=self.atol, rtol=self.rtol)
+                stats = instrument.from_solution(sol, 'reheating', 'compiled', time.perf_counter() - wall,
+                                                 time.process_time() - cpu)
+                if self.log_stats:
+                    stats.log()
+            else:
+                sol = instrument.solve_ivp(self.model_object.field_eqs, tspan, IC, t_eval=t_points,
+                                method='LSODA', atol=self.atol, rtol=self.rtol,
+                                jac=self.model_object.field_jac,  # Analytic Jacobian of the field equations
+                                #events=[self.stop_condition, ]  # Stopping Condition for integration
+                                phase='reheating', log=self.log_stats
+                                )
+                stats = sol.stats
+            self.stats = {'full': stats}
+            reh_tspan, reh_y = sol.t, sol.y
+
+        Xi  = reh_y[0]
+        Psi = reh_y[1]
+        The = reh_y[2]
+        self.record(start, sol, The)
 
 
         plotter.plot_single(reh_tspan/self.t_scale, Xi, [1,10], [0, 0.04], '$t/t_{osc}$', '$\\xi$', 'reh_initial_H', 'png')
         plotter.plot_single(reh_tspan/self.t_scale, The, [1, 10], [0, 0.0004], '$t/t_{osc}$', '$\\rho/\epsilon^4$', 'reh_initial_rho', 'png')
 
-        plotter.plot_single(reh_tspan / self.t_scale, Xi, [1, 5000], [0, 0.04], '$t/t_{osc}$', '$\\xi$', 'reh_full_H', 'png')
-        plotter.plot_single(reh_tspan / self.t_scale, The, [1, 5000], [0, 0.4], '$t/t_{osc}$', '$\\rho/\epsilon^4$','reh_full_rho', 'png')
+        plotter.plot_single(reh_tspan / self.t_scale, Xi, [1, self.n_periods], [0, 0.04], '$t/t_{osc}$', '$\\xi$', 'reh_full_H', 'png')
+        plotter.plot_single(reh_tspan / self.t_scale, The, [1, self.n_periods], [0, 0.4], '$t/t_{osc}$', '$\\rho/\epsilon^4$','reh_full_rho', 'png')
+
+        return reh_tspan, Xi, Psi, The
@@ -0,0 +1,233 @@
+# Setting up the oscillation-averaged (secular) engine for the region of Reheating
+# Author: Arun Mathew
+#
+# After inflation the Hubble rate oscillates with the scalaron, Xi ~ h(t) cos^2(w t) with
+# w = sqrt(2 c_osc)/2, i.e. with period 2 pi/sqrt(2 c_osc), where c_osc = 2 pi^2 (tau_1/tau_osc)^2.
+# Averaging the field equations over one period (multiple-scale analysis at leading order
+# in h/w) gives the secular equations for the envelope h and the density Theta
+#
+#     dh/dt     = - 3 h^2 / 4
+#     dTheta/dt = tau_1/tau_4 - 3 (1 + omega) <Xi> Theta,    <Xi> = h/2
+#
+# The corrections of order beta/alpha and (tau_1/tau_3)^2 are neglected. Once the period is
+# much shorter than the Hubble time 2/h, these equations replace the full field equations,
+# which would otherwise have to resolve every oscillation.
+from fieldeqs import *
+from events import peak
+import instrument
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Secular')
+
+
+#####################################################################################
+class secular_reheating():
+
+    # Tolerances of the full and of the averaged field equations. The full field equations
+    # take a smaller atol than the class reheating: the minima of Xi come down to ~1e-26,
+    # and with atol = 1e-16 the envelope drifts by up to ~15% over 40 periods.
+    atol = 1e-20
+    rtol = 2.3e-14
+    secular_atol = 1e-20
+    secular_rtol = 1e-10
+
+    def __init__(self, model_object, switch_ratio=0.05):
+        '''
+        :param model_object: object of the class fieldeqs.model
+        :param switch_ratio: the averaged equations are used once period/(Hubble time)
+                             = period * h/2 drops below this value
+        '''
+        self.model_object = model_object
+        self.switch_ratio = switch_ratio
+        self.period = 2 * pi / math.sqrt(2 * model_object.c_osc)
+        # Envelope below which the averaged equations are used
+        self.h_switch = 2 * switch_ratio / self.period
+        # Solver statistics of the last solve by phase ('full', 'averaged'), see instrument.py
+        self.stats = {}
+        # Solution of the last averaged phase
+        self.averaged_sol = None
+
+    #####################################################################################
+    def averaged_eqs(self, t, Vector):
+        h, The = Vector
+        dhdt = - 0.75 * h * h
+        dThedt = self.model_object.c_src - self.model_object.c_w * 0.5 * h * The
+        return [dhdt, dThedt]
+
+    def envelope(self, Xi, Psi):
+        '''
+        Envelope h of Xi = h cos^2(w t) from the instantaneous Xi and Psi
+        '''
+        omega_2 = self.model_object.c_osc / 2
+        return Xi + pow(Psi, 2) / (4 * omega_2 * Xi)
+
+    def switch_estimate(self, t0, IC):
+        # Leading-order estimate of the time at which h reaches h_switch
+        h0 = self.envelope(IC[0], IC[1])
+        return t0 + max(0.0, (1 / self.h_switch - 1 / h0) / 0.75)
+
+    def switch(self, t_peak, y_peak, t_estimate):
+        # Whether the averaged equations take over at a maximum of Xi
+        return t_peak >= t_estimate and y_peak[0] <= self.h_switch
+
+    #####################################################################################
+    def full_phase(self, t0, IC, t_bound, t_eval=None):
+        '''
+        Integrate the full field equations until the first maximum of Xi at which the
+        period is short enough for the averaged equations
+
+        The field equations are integrated in windows of one period after the estimate of
+        the switch. Every window is integrated to its end and restarts from the solver
+        state there; the output times t_eval inside a window are evaluated with the dense
+        output of the solver.
+
+        :return: (solution of the full phase, switch time, switch state) where the switch
+                 time is None if t_bound is reached first
+        '''
+        t_estimate = self.switch_estimate(t0, IC)
+        t_end = min(t_estimate, t_bound)
+
+        ts, ys = [], []
+        t, y = t0, numpy.asarray(IC, dtype=float)
+        self.stats['full'] = None
+        while True:
+            sol = instrument.solve_ivp(self.model_object.field_eqs, [t, t_end], y,
+                                       dense_output=t_eval is not None,
+                                       method='LSODA', phase='reheating (full)',
+                                       atol=self.atol, rtol=self.rtol,
+                                       jac=self.model_object.field_jac, events=[peak()])
+            self.stats['full'] = sol.stats if self.stats['full'] is None else self.stats['full'].add(sol.stats)
+            failed = sol.status == -1
+            if failed:
+                SDlogger.error('%s', sol.message)
+            # Switch at the first maximum past the estimate where the envelope is small enough
+            switch = [k for k, (t_peak, y_peak) in enumerate(zip(sol.t_events[0], sol.y_events[0]))
+                      if self.switch(t_peak, y_peak, t_estimate)]
+            t_stop = sol.t_events[0][switch[0]] if switch else sol.t[-1]
+
+            # Output of the window, the start of the window belongs to the window before
+            if t_eval is None:
+                keep = (sol.t <= t_stop) & ((sol.t > t) if ts else True)
+                ts.append(sol.t[keep])
+                ys.append(sol.y[:, keep])
+            else:
+                window = t_eval[((t_eval > t) if ts else (t_eval >= t)) & (t_eval <= t_stop)]
+                ts.append(window)
+                ys.append(sol.sol(window) if len(window) and sol.sol is not None else numpy.empty((3, 0)))
+
+            if switch:
+                return (numpy.concatenate(ts), numpy.concatenate(ys, axis=1)), t_stop, sol.y_events[0][switch[0]]
+            if failed or t_end >= t_bound:
+                break
+            # Keep integrating one period at a time from the state at the end of the window
+            t, y = t_end, sol.y[:, -1]
+            t_end = min(t + self.period, t_bound)
+        return (numpy.concatenate(ts), numpy.concatenate(ys, axis=1)), None, None
+
+    def secular_phase(self, t_switch, y_switch, t_bound, t_eval=None):
+        '''
+        Integrate the averaged equations from a maximum of Xi
+
+        The solution is kept in averaged_sol for evaluate().
+
+        :return: solution with y = [h, Theta]
+        '''
+        h_switch = self.envelope(y_switch[0], y_switch[1])
+        if t_eval is None:
+            t_eval = numpy.arange(t_switch, t_bound, self.period)
+        sol = instrument.solve_ivp(self.averaged_eqs, [t_switch, t_bound], [h_switch, y_switch[2]],
+                                   t_eval=t_eval, dense_output=True, method='LSODA',
+                                   phase='reheating (averaged)',
+                                   atol=self.secular_atol, rtol=self.secular_rtol)
+        self.stats['averaged'] = sol.stats
+        self.averaged_sol = sol
+        return sol
+
+    @staticmethod
+    def averages(h, The):
+        # [<Xi>, d<Xi>/dt, Theta] from the envelope h and Theta
+        return numpy.vstack([h / 2, -0.375 * pow(h, 2), The])
+
+    def evaluate(self, t):
+        '''
+        Averaged phase of the last solve at arbitrary times, from the dense output of the
+        solver
+
+        :param t: times inside the averaged phase
+        :return: array (3, len(t)) of <Xi>, d<Xi>/dt and Theta
+        '''
+        h, The = self.averaged_sol.sol(numpy.atleast_1d(t))
+        return self.averages(h, The)
+
+    #####################################################################################
+    def solve(self, t0, IC, t_bound, t_eval=None, secular_eval=None):
+        '''
+        Solve reheating with the full field equations, switching to the averaged equations
+        once the oscillation period is much shorter than the Hubble time
+
+        In the averaged phase Xi and Psi are the oscillation-averaged <Xi> = h/2 and its
+        derivative -3 h^2/8.
+
+        :param t0: initial time
+        :param IC: initial [Xi, Psi, Theta]
+        :param t_bound: final time
+        :param t_eval: output times of the full phase, None for the solver steps
+        :param secular_eval: output times of the averaged phase, None for one point per period
+        :return: (t, y, t_switch) with y = [Xi, Psi, Theta]
+        '''
+        (t_full, y_full), t_switch, y_switch = self.full_phase(t0, IC, t_bound, t_eval)
+        if t_switch is None:
+            SDlogger.info('Period not short enough for the averaged equations before t = %f.', t_bound)
+            return t_full, y_full, None
+
+        SDlogger.info('Switching to the oscillation-averaged equations at t = %f (%.1f periods).',
+                      t_switch, (t_switch - t0) / self.period)
+        t_secular, y_secular = self.averaged(t_switch, y_switch, t_bound, secular_eval)
+        return (numpy.concatenate([t_full, t_secular]),
+                numpy.concatenate([y_full, y_secular], axis=1), t_switch)
+
+    def averaged(self, t_switch, y_switch, t_bound, secular_eval=None):
+        '''
+        Averaged phase from a maximum of Xi in terms of [<Xi>, d<Xi>/dt, Theta]
+
+        :return: (t, y) of the averaged phase
+        '''
+        window = None if secular_eval is None else secular_eval[secular_eval > t_switch]
+        sol = self.secular_phase(t_switch, y_switch, t_bound, window)
+        if sol.status == -1:
+            SDlogger.error('%s', sol.message)
+        return sol.t, self.averages(*sol.y)
+
+    #####################################################################################
+    def validate(self, t0, IC, n_periods=40, method='Radau'):
+        '''
+        Compare the averaged equations with the full field equations over a window of
+        n_periods after the switch
+
+        The reference solution uses the implicit Radau method by default, with the
+        tolerances of the full field equations (atol = 1e-20, which controls the error of
+        the minima of Xi ~1e-26; there LSODA agrees with Radau to 1e-3). Radau and the
+        averaged equations agree to below 1%. tests/test_reheating.py compares the
+        'auto' engine of reheating with the 'full' one in the same way.
+
+        :return: dictionary with the maximum relative deviation of the envelope h (at
+                 the maxima of Xi) and of Theta, and the switch time
+        '''
+        from scipy.integrate import solve_ivp
+        t_bound = 1e300
+        _, t_switch, y_switch = self.full_phase(t0, IC, t_bound)
+        t_end = t_switch + n_periods * self.period
+
+        full = solve_ivp(self.model_object.field_eqs, [t_switch, t_end], y_switch,
+                         method=method, atol=self.atol, rtol=self.rtol,
+                         jac=self.model_object.field_jac, events=[peak()])
+        t_peaks = full.t_events[0]
+        y_peaks = full.y_events[0]
+        sol = self.secular_phase(t_switch, y_switch, t_end, t_eval=t_peaks)
+
+        dev_h = numpy.abs(sol.y[0] - y_peaks[:, 0]) / y_peaks[:, 0]
+        dev_The = numpy.abs(sol.y[1] - y_peaks[:, 2]) / y_peaks[:, 2]
+        SDlogger.info('Averaged vs full (%s) equations over %d periods: h %.2e, Theta %.2e.',
+                      method, n_periods, dev_h.max(), dev_The.max())
+        return {'h': dev_h.max(), 'Theta': dev_The.max(), 't_switch': t_switch}
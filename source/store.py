@@ -0,0 +1,134 @@
+# Setting up the result store for the parameter sweeps
+# Author: Arun Mathew
+#
+# Results of the parameter sweeps are kept in an SQLite database keyed by the parameter
+# tuple (alpha, beta, mu, E, omega). Every result is committed as soon as it arrives, so an
+# interrupted sweep can be resumed and only the missing points are solved again.
+import sqlite3
+import numpy
+
+
+#####################################################################################
+class sweep_store():
+
+    # Key and value columns of the result table
+    keys = ('alpha', 'beta', 'mu', 'E', 'omega')
+    values = ('n_s', 'r', 'status', 't_e')
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'alpha REAL, beta REAL, mu REAL, E REAL, omega REAL, '
+            'n_s REAL, r REAL, status TEXT, t_e REAL, '
+            'PRIMARY KEY (alpha, beta, mu, E, omega))')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    #####################################################################################
+    def put(self, point, result):
+        '''
+        Store the result of a single parameter point
+
+        :param point: parameter tuple (alpha, beta, mu, E, omega)
+        :param result: (n_s, r, status, t_e)
+        '''
+        n_s, r, status, t_e = result
+        self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                tuple(float(p) for p in point)
+                                + (float(n_s), float(r), str(status), float(t_e)))
+        self.connection.commit()
+
+    def get(self, point):
+        '''
+        Return the stored (n_s, r, status, t_e) of a parameter point, or None
+        '''
+        row = self.connection.execute(
+            'SELECT n_s, r, status, t_e FROM results '
+            'WHERE alpha = ? AND beta = ? AND mu = ? AND E = ? AND omega = ?',
+            tuple(float(p) for p in point)).fetchone()
+        if row is None:
+            return None
+        # SQLite stores NaN as NULL
+        n_s, r, status, t_e = row
+        return (numpy.nan if n_s is None else n_s, numpy.nan if r is None else r,
+                status, numpy.nan if t_e is None else t_e)
+
+    def missing(self, grid, retry_failed=False):
+        '''
+        Return the points of a grid which have no stored result
+
+        :param grid: list of parameter tuples
+        :param retry_failed: also return the points whose solve failed
+        :return: list of parameter tuples in grid order
+        '''
+        todo = []
+        for point in grid:
+            result = self.get(point)
+            if result is None or (retry_failed and result[2] == 'Failed'):
+                todo.append(point)
+        return todo
+
+    def results(self, grid):
+        '''
+        Return the stored results of a grid in grid order (None for missing points)
+        '''
+        return [self.get(point) for point in grid]
+
+    #####################################################################################
+    def query(self, status=None, order_by=keys, **ranges):
+        '''
+        Load stored results as NumPy arrays
+
+        Each keyword names a parameter and gives either a single value or a (low, high)
+        range, e.g. query(beta=0.3*pow(t_P, 2), alpha=(lo, hi), status='OK').
+
+        :param status: only return points with this status
+        :param order_by: columns by which the rows are sorted, names of keys or values
+        :return: dictionary of arrays keyed by column name
+        '''
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        for name in order_by or ():
+            # The names are part of the SQL text and must be columns of the table
+            if name not in self.keys + self.values:
+                raise ValueError('Unknown column %s.' % name)
+        conditions = []
+        arguments = []
+        for name, value in ranges.items():
+            if name not in self.keys:
+                raise ValueError('Unknown parameter %s.' % name)
+            if numpy.ndim(value) == 0:
+                conditions.append('%s = ?' % name)
+                arguments.append(float(value))
+            else:
+                conditions.append('%s BETWEEN ? AND ?' % name)
+                arguments.extend([float(value[0]), float(value[1])])
+        if status is not None:
+            conditions.append('status = ?')
+            arguments.append(status)
+
+        sql = 'SELECT %s FROM results' % ', '.join(self.keys + self.values)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if order_by:
+            sql += ' ORDER BY ' + ', '.join(order_by)
+        rows = self.connection.execute(sql, arguments).fetchall()
+
+        columns = list(zip(*rows)) if rows else [()] * len(self.keys + self.values)
+        data = {}
+        for name, column in zip(self.keys + self.values, columns):
+            if name == 'status':
+                data[name] = numpy.array(column, dtype=str)
+            else:
+                data[name] = numpy.array(column, dtype=float)
+        return data
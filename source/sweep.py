@@ -0,0 +1,200 @@
+# Setting up the parallel parameter sweep for the region of Inflation
+# Author: Arun Mathew
+from fieldeqs import *
+from inflation import inflation
+import instrument
+import functools
+import itertools
+import multiprocessing
+import os
+import time
+
+
+#####################################################################################
+# > Set the logger tree-level
+SDlogger = logger.setup_logger('Sweep')
+
+
+#####################################################################################
+def parameter_grid(alpha, beta, mu, E, omega):
+    '''
+    Cartesian grid of model parameters
+
+    Each argument is either a single value or a sequence of values. The points are
+    ordered with alpha varying slowest and omega fastest.
+
+    :param alpha: value(s) of the parameter alpha
+    :param beta: value(s) of the parameter beta
+    :param mu: value(s) of the parameter mu
+    :param E: value(s) of the energy of the particles created
+    :param omega: value(s) of the EoS parameter
+    :return: list of parameter tuples (alpha, beta, mu, E, omega)
+    '''
+    axes = [numpy.atleast_1d(value).tolist() for value in (alpha, beta, mu, E, omega)]
+    return list(itertools.product(*axes))
+
+
+#####################################################################################
+def record_failure(point, backend, error):
+    # Structured record of a failed solve, see tools/logger
+    logger.record('inflation', parameters=model(*point).metadata(), backend=backend,
+                  status='Failed', error=str(error))
+
+
+def solve_point(point, backend='scipy', cache=None, hints=None):
+    '''
+    Solve inflation for a single point of the parameter grid
+
+    :param point: parameter tuple (alpha, beta, mu, E, omega)
+    :param backend: integration backend of the class inflation
+    :param cache: optional cache.solution_cache of the solutions
+    :param hints: optional solver hints of a neighbouring point, see inflation.hints
+    :return: (n_s, r, status, t_e)
+    '''
+    return _solve_point(point, backend, cache, hints)[0]
+
+
+def _solve_point(point, backend, cache, hints):
+    # Result of a point and the solver hints for the next one
+    try:
+        INF = inflation(model(*point),  # Inherit the class model
+                        "None",         # No output file
+                        backend=backend,
+                        cache=cache,
+                        hints=hints)
+        Time, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4, n_s, r, Status = INF.inflation_solver()
+        return (n_s, r, Status, INF.t_end), INF.hints()
+    except Exception as error:
+        # A failing point must not bring down the rest of the sweep
+        SDlogger.error('Inflation failed for parameters %s: %s', point, error)
+        record_failure(point, backend, error)
+        return (numpy.nan, numpy.nan, 'Failed', numpy.nan), None
+
+
+def solve_line(points, backend='scipy', cache=None):
+    '''
+    Solve inflation for neighbouring points of the parameter grid in order, every solve
+    warm started with the solver hints of the point before, see inflation.hints
+
+    :param points: list of parameter tuples (alpha, beta, mu, E, omega)
+    :param backend: integration backend of the class inflation
+    :param cache: optional cache.solution_cache of the solutions
+    :return: list of (n_s, r, status, t_e) in the order of points
+    '''
+    results = []
+    hints = None
+    for point in points:
+        result, hints = _solve_point(point, backend, cache, hints)
+        results.append(result)
+    return results
+
+
+def solve_batch(points, cache=None):
+    '''
+    Solve inflation for several points of the parameter grid in lockstep, see batch.solve
+
+    :param points: list of parameter tuples (alpha, beta, mu, E, omega)
+    :param cache: optional cache.solution_cache of the solutions
+    :return: list of (n_s, r, status, t_e) in the order of points
+    '''
+    INFs = [inflation(model(*point), "None", backend='batch', cache=cache) for point in points]
+    sols = [None] * len(INFs)
+    keys = [None] * len(INFs)
+    if cache is not None:
+        for i, INF in enumerate(INFs):
+            keys[i] = INF.cache_key()
+            sols[i] = cache.get(keys[i])
+    todo = [i for i, sol in enumerate(sols) if sol is None]
+    if todo:
+        import batch
+        start, cpu = time.perf_counter(), time.process_time()
+        solved = batch.solve([INFs[i].model_object for i in todo], [INFs[i].tspan for i in todo],
+                             [INFs[i].IC for i in todo], [INFs[i].tvector for i in todo],
+                             rtol=inflation.rtol, atol=inflation.atol)
+        # Every member is recorded with its share of the wall and CPU time of the batch
+        wall = (time.perf_counter() - start) / len(todo)
+        cpu = (time.process_time() - cpu) / len(todo)
+        for i, sol in zip(todo, solved):
+            sols[i] = sol
+            INFs[i].wall_time = wall
+            INFs[i].stats = instrument.from_solution(sol, 'inflation', 'batch', wall, cpu)
+            if cache is not None:
+                cache.put(keys[i], sol)
+
+    results = []
+    for point, INF, sol in zip(points, INFs, sols):
+        try:
+            Time, Xi, Psi, The, Ricci, Epsilon_1, Epsilon_3, Epsilon_4, n_s, r, Status = INF.inflation_solver(sol)
+            results.append((n_s, r, Status, INF.t_end))
+        except Exception as error:
+            SDlogger.error('Inflation failed for parameters %s: %s', point, error)
+            record_failure(point, 'batch', error)
+            results.append((numpy.nan, numpy.nan, 'Failed', numpy.nan))
+    return results
+
+
+#####################################################################################
+def run_sweep(grid, workers=None, chunksize=1, backend='scipy', store=None, cache=None, batch_size=None,
+              warm_start=False):
+    '''
+    Solve inflation for every point of a parameter grid on a pool of processes
+
+    :param grid: list of parameter tuples, see parameter_grid
+    :param workers: number of worker processes, None for all CPUs, 1 to run serially
+    :param chunksize: number of grid points (batches with the 'batch' backend) handed to a
+                      worker at a time
+    :param backend: integration backend of the class inflation
+    :param store: optional store.sweep_store; points already in it are skipped and every
+                  new result is committed to it as soon as it arrives
+    :param cache: optional cache.solution_cache shared by the workers
+    :param batch_size: number of grid points solved in lockstep by a worker with the
+                       'batch' backend, see batch.solve, or in order with warm_start; None
+                       for one batch per worker
+    :param warm_start: solve the grid points of a batch in order, every solve warm started
+                       from the point before, see solve_line; not used by the 'batch' backend
+    :return: list of (n_s, r, status, t_e) in grid order
+    '''
+    todo = grid if store is None else store.missing(grid)
+    if store is not None and len(todo) < len(grid):
+        SDlogger.info('Resuming sweep: %d of %d parameter points already in %s.',
+                      len(grid) - len(todo), len(grid), store.path)
+    if workers is None:
+        workers = os.cpu_count()
+    batched = backend == 'batch' or warm_start
+    if batched:
+        # Every task is a batch of grid points; the results are unpacked again in order
+        if backend == 'batch':
+            solver = functools.partial(solve_batch, cache=cache)
+        else:
+            # Neighbouring points of the grid, solved in order by the same worker
+            solver = functools.partial(solve_line, backend=backend, cache=cache)
+        if batch_size is None:
+            batch_size = max(1, -(-len(todo) // max(1, min(workers, len(todo)))))
+        tasks = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    else:
+        solver = functools.partial(solve_point, backend=backend, cache=cache)
+        tasks = todo
+    workers = max(1, min(workers, len(tasks)))
+    SDlogger.info('Sweeping %d parameter points on %d worker(s).', len(todo), workers)
+
+    results = []
+    # The workers log through the listener of this process, see tools/logger
+    pool = multiprocessing.Pool(workers, initializer=logger.worker_init,
+                                initargs=(logger.process_queue(),)) if workers > 1 else None
+    try:
+        outcomes = pool.imap(solver, tasks, chunksize) if pool else map(solver, tasks)
+        if batched:
+            outcomes = itertools.chain.from_iterable(outcomes)
+        for count, (point, result) in enumerate(zip(todo, outcomes), start=1):
+            SDlogger.info('Iteration index: %d -- Status : [%s]', count, result[2])
+            if store is not None:
+                store.put(point, result)
+            results.append(result)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    if store is not None:
+        return store.results(grid)
+    return results
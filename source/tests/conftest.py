@@ -0,0 +1,46 @@
+# Setting up the test session
+# Author: Arun Mathew
+#
+# The modules of the source directory are imported flat, as by main.py. The log file and
+# the structured records of the tests go to a temporary directory, and no figures are drawn.
+import logging
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import logger
+from tools import plotter
+
+_log_dir = tempfile.mkdtemp(prefix='scalaron_tests_')
+logger.LOG_FILE = os.path.join(_log_dir, logger.LOG_FILE)
+logger.RECORD_FILE = os.path.join(_log_dir, logger.RECORD_FILE)
+logger.console_level(logging.WARNING)
+plotter.configure(draw=False)
+
+from fieldeqs import *
+from inflation import inflation
+
+
+#####################################################################################
+@pytest.fixture(scope='session')
+def default_model():
+    # Model of the Default setting of main.py
+    return model(
+        16.5*pow(t_P, 2),         # value of the parameter alpha
+        0.3 * pow(t_P, 2),        # value of the parameter beta
+        pow(10, -4)*pow(t_P,-1),  # value of the parameter mu
+        pow(10, 13),              # Energy of the particles created
+        1/3                       # Equation of State P = omega rho
+    )
+
+
+@pytest.fixture(scope='session')
+def reheating_ic(default_model):
+    # Initial conditions of reheating [t_e, Xi, Psi, Theta] at the end of inflation
+    INF = inflation(default_model, "None")
+    INF.inflation_solver()
+    return [INF.t_end] + list(INF.y_end)
@@ -0,0 +1,30 @@
+# Tests of the solution cache, see cache.py
+# Author: Arun Mathew
+import os
+
+import cache
+
+
+#####################################################################################
+def test_code_files_on_solve_path():
+    # The modules that produce a solution of inflation: the field equations, the terminal
+    # event that sets t_end, the instrumented solve_ivp and the backends
+    solve_path = {'fieldeqs.py', 'events.py', 'inflation.py', 'instrument.py', 'compiled.py', 'dop853.py',
+                  'batch.py'}
+    assert solve_path <= set(cache.CODE_FILES)
+    source_Dir = os.path.dirname(os.path.abspath(cache.__file__))
+    assert all(os.path.isfile(os.path.join(source_Dir, name)) for name in cache.CODE_FILES)
+
+
+def test_warm_start_not_cached(default_model, tmp_path):
+    from inflation import inflation
+    store = cache.solution_cache(str(tmp_path))
+    INF = inflation(default_model, "None")
+    INF.inflation_solver()
+    warm = inflation(default_model, "None", cache=store, hints=INF.hints())
+    warm.inflation_solver()
+    assert warm.warm_started and not warm.cached
+    assert store.get(warm.cache_key()) is None
+    cold = inflation(default_model, "None", cache=store)
+    cold.inflation_solver()
+    assert not cold.cached and store.get(cold.cache_key()) is not None
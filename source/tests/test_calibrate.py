@@ -0,0 +1,44 @@
+# Tests of the calibration of the model parameters, see calibrate.py
+# Author: Arun Mathew
+import numpy
+
+from calibrate import calibration
+
+
+#####################################################################################
+def calibration_of(n_s, fails):
+    # Calibration on a model of n_s(alpha), with inflation failing where fails(alpha)
+    calib = calibration()
+    def solve(alpha, beta=None, mu=None):
+        calib.solves += 1
+        return (numpy.nan,) * 3 if fails(alpha) else (n_s(alpha), 0.01, 90.0)
+    calib.solve = solve
+    return calib
+
+
+def test_alpha():
+    calib = calibration_of(lambda alpha: 1 - 1 / alpha, lambda alpha: False)
+    result = calib.alpha(0.96, alpha0=20.0)
+    assert result.success
+    numpy.testing.assert_allclose(result.alpha, 25.0, rtol=1e-6)
+
+
+def test_alpha_failing_end():
+    # The upper end of the first bracket fails, the root lies below it
+    calib = calibration_of(lambda alpha: 1 - 1 / alpha, lambda alpha: alpha > 28)
+    result = calib.alpha(0.96, alpha0=20.0)
+    assert result.success
+    numpy.testing.assert_allclose(result.alpha, 25.0, rtol=1e-6)
+
+
+def test_alpha_failing_inside():
+    calib = calibration_of(lambda alpha: 1 - 1 / alpha, lambda alpha: 24 < alpha < 26)
+    result = calib.alpha(0.96, alpha0=20.0)
+    assert not result.success and numpy.isnan(result.alpha)
+    assert 'inside the bracket' in result.message
+
+
+def test_alpha_failing_everywhere():
+    calib = calibration_of(lambda alpha: 1 - 1 / alpha, lambda alpha: True)
+    result = calib.alpha(0.96, alpha0=20.0)
+    assert not result.success and result.solves <= 2
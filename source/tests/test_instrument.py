@@ -0,0 +1,38 @@
+# Tests of the solver statistics, see instrument.py
+# Author: Arun Mathew
+import types
+
+import instrument
+from inflation import inflation
+
+
+#####################################################################################
+def solve(model_object):
+    INF = inflation(model_object, "None")
+    INF.inflation_solver()
+    return INF.stats
+
+
+def test_lsoda_switches(default_model):
+    stats = solve(default_model)
+    assert stats.method.startswith('LSODA')
+    assert stats.method_switches >= 1
+    assert 0 < stats.stiff_steps < stats.nsteps
+
+
+def test_lsoda_method_unknown_layout():
+    # Work arrays that do not have the layout of scipy's LSODA wrapper
+    layouts = [None, [0.0] * 5, [0.0] * 5 + [[0] * 10], [0.0] * 5 + [[0] * 20], [0.0] * 5 + [[7] * 20]]
+    assert instrument.lsoda_method(types.SimpleNamespace()) is None
+    for call_args in layouts:
+        integrator = types.SimpleNamespace(call_args=call_args)
+        solver = types.SimpleNamespace(_lsoda_solver=types.SimpleNamespace(_integrator=integrator))
+        assert instrument.lsoda_method(solver) is None
+
+
+def test_lsoda_switches_not_reported(default_model, monkeypatch):
+    monkeypatch.setattr(instrument, 'lsoda_method', lambda solver: None)
+    stats = solve(default_model)
+    assert stats.method == 'LSODA'
+    assert stats.method_switches is None and stats.stiff_steps is None
+    assert stats.nsteps > 0
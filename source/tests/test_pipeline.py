@@ -0,0 +1,38 @@
+# Tests of the pipeline from inflation into reheating, see pipeline.py
+# Author: Arun Mathew
+import numpy
+import pytest
+
+from inflation import inflation
+from reheating import reheating
+from pipeline import pipeline
+
+
+#####################################################################################
+@pytest.mark.parametrize('restart', [False, True])
+def test_pipeline_against_separate_solves(default_model, reheating_ic, monkeypatch, restart):
+    # Reheating carries on from the end of inflation with its own tolerances, in the same
+    # solver or, with restart, in a new one. The end state differs from the separate solve
+    # in its last digits, which only carries over into reheating with an atol that
+    # controls the minima of Xi (~1e-26), see pipeline.py
+    monkeypatch.setattr(reheating, 'atol', 1e-20)
+    if restart:
+        monkeypatch.setattr(pipeline, 'set_tolerances', lambda self, solver, rtol, atol: False)
+    PIPE = pipeline(default_model, "None", "None", n_periods=10)
+    INF_Register, REH_Register = PIPE.run()
+    n_s = inflation(default_model, "None").inflation_solver()[8]
+    T, Xi, Psi, The = reheating(default_model, reheating_ic, "None", n_periods=10).reheating_solver()
+
+    numpy.testing.assert_allclose(INF_Register[8], n_s, rtol=1e-10)
+    numpy.testing.assert_allclose(PIPE.INF.t_end, reheating_ic[0], rtol=1e-12)
+    numpy.testing.assert_allclose(REH_Register[0], T, rtol=1e-12)
+    numpy.testing.assert_allclose(REH_Register[3], The, rtol=1e-4)
+    assert set(PIPE.stats) == {'inflation', 'reheating'}
+
+
+def test_pipeline_short_span(default_model):
+    # The solver stops before the end of inflation
+    PIPE = pipeline(default_model, "None", "None", n_periods=1)
+    INF_Register, REH_Register = PIPE.run()
+    assert REH_Register is None
+    assert PIPE.INF.terminal_event is None
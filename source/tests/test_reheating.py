@@ -0,0 +1,82 @@
+# Tests of the 'auto' reheating engine, see secular.py
+# Author: Arun Mathew
+import numpy
+import pytest
+
+import secular
+from reheating import reheating
+
+
+#####################################################################################
+def solve(model_object, IC, **options):
+    REH = reheating(model_object, IC, "None", **options)
+    return REH, REH.reheating_solver()
+
+
+@pytest.mark.parametrize('stride', [7, 1000])
+def test_auto_stride(default_model, reheating_ic, stride):
+    # The full phase is integrated independently of the output times, so the stride
+    # output is the full output at every stride-th point, also for strides longer than
+    # a period (1000 points are 10 periods)
+    full, (T, Xi, Psi, The) = solve(default_model, reheating_ic, engine='auto', n_periods=20)
+    REH, (T_s, Xi_s, Psi_s, The_s) = solve(default_model, reheating_ic, engine='auto', output='stride',
+                                           stride=stride, n_periods=20)
+    assert REH.switch_time == full.switch_time
+    assert numpy.all(numpy.diff(T_s) > 0)
+
+    before = REH.tvector[::stride]
+    before = before[before <= REH.switch_time]
+    n = len(before)
+    numpy.testing.assert_array_equal(T_s[:n], before)
+    numpy.testing.assert_allclose(Xi_s[:n], Xi[:(n - 1) * stride + 1:stride], rtol=1e-12)
+    numpy.testing.assert_allclose(The_s[:n], The[:(n - 1) * stride + 1:stride], rtol=1e-12)
+    # One point per period of the averaged equations after the switch
+    numpy.testing.assert_allclose(The_s[n:], The[T >= REH.switch_time], rtol=1e-12)
+
+
+def test_auto_lazy(default_model, reheating_ic):
+    # sample() integrates the full field equations from the stored states with the
+    # tolerances of the 'auto' engine, which control the minima of Xi (~1e-26)
+    REH, (T, Xi, Psi, The) = solve(default_model, reheating_ic, engine='auto', output='lazy', n_periods=20)
+    stride, (T_s, Xi_s, Psi_s, The_s) = solve(default_model, reheating_ic, engine='auto', output='stride',
+                                              stride=10, n_periods=20)
+    assert REH.switch_time == stride.switch_time
+    assert len(REH.envelope['t']) == len(T) - 1
+    assert numpy.all(REH.envelope['Xi_max'] >= REH.envelope['Xi_min'])
+
+    # Samples before and after the switch agree with the stride output
+    y = REH.sample(T_s)
+    before = T_s < REH.switch_time
+    numpy.testing.assert_allclose(y[0][before], Xi_s[before], rtol=1e-4, atol=1e-12)
+    numpy.testing.assert_allclose(y[2][before], The_s[before], rtol=1e-4)
+    numpy.testing.assert_allclose(y[:, ~before], numpy.vstack([Xi_s, Psi_s, The_s])[:, ~before], rtol=1e-8)
+
+
+#####################################################################################
+def test_auto_against_full(default_model, reheating_ic, monkeypatch):
+    # Envelope h and Theta of the averaged equations at the maxima of Xi of the full field
+    # equations, over 20 periods, with the default tolerances of the 'auto' engine. With
+    # the default atol = 1e-16 of the 'full' engine LSODA does not control the error of
+    # the minima of Xi (~1e-26) and the reference drifts by 10-40%, so it is run with the
+    # atol = 1e-20 of the full field equations of the 'auto' engine.
+    assert secular.secular_reheating.atol == 1e-20
+    monkeypatch.setattr(reheating, 'atol', secular.secular_reheating.atol)
+    full, (T_f, Xi_f, Psi_f, The_f) = solve(default_model, reheating_ic, engine='full', n_periods=20)
+    auto, (T, Xi, Psi, The) = solve(default_model, reheating_ic, engine='auto', n_periods=20)
+    assert auto.switch_time is not None
+
+    peaks = numpy.flatnonzero((Xi_f[1:-1] > Xi_f[:-2]) & (Xi_f[1:-1] >= Xi_f[2:])) + 1
+    peaks = peaks[T_f[peaks] >= auto.switch_time]
+    averaged = T >= auto.switch_time
+    h = numpy.interp(T_f[peaks], T[averaged], 2 * Xi[averaged])
+    The_peaks = numpy.interp(T_f[peaks], T[averaged], The[averaged])
+    assert len(peaks) > 20
+    assert numpy.max(numpy.abs(h / Xi_f[peaks] - 1)) < 0.01
+    assert numpy.max(numpy.abs(The_peaks / The_f[peaks] - 1)) < 0.01
+
+
+def test_short_time_vector(default_model, reheating_ic):
+    # The end of reheating before the end of inflation, or within one point of it
+    for n_periods in (1, reheating_ic[0] / default_model.timescales()[1] + 0.01):
+        with pytest.raises(ValueError):
+            reheating(default_model, reheating_ic, "None", n_periods=n_periods)
@@ -0,0 +1,19 @@
+# Tests of the result store of the parameter sweeps, see store.py
+# Author: Arun Mathew
+import pytest
+
+from store import sweep_store
+
+
+#####################################################################################
+def test_query_order_by():
+    with sweep_store(':memory:') as store:
+        store.put((2, 1, 1, 1, 1), (0.97, 0.01, 'OK', 90.0))
+        store.put((1, 2, 1, 1, 1), (0.96, 0.02, 'OK', 80.0))
+        assert list(store.query()['alpha']) == [1, 2]
+        assert list(store.query(order_by='t_e')['alpha']) == [1, 2]
+        assert list(store.query(order_by=('beta',))['alpha']) == [2, 1]
+        for order_by in (['alpha; DROP TABLE results'], ('alpha DESC',), 'rowid'):
+            with pytest.raises(ValueError):
+                store.query(order_by=order_by)
+        assert len(store.query()['alpha']) == 2
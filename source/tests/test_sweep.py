@@ -0,0 +1,34 @@
+# Tests of the parameter sweeps, see sweep.py
+# Author: Arun Mathew
+import numpy
+
+from fieldeqs import *
+from inflation import inflation
+from sweep import run_sweep
+
+
+#####################################################################################
+def line(n=6):
+    # Neighbouring points along alpha around the Default setting of main.py
+    return [(alpha*pow(t_P, 2), 0.3*pow(t_P, 2), pow(10, -4)*pow(t_P, -1), pow(10, 13), 1/3)
+            for alpha in numpy.linspace(15, 18, n)]
+
+
+def test_hints(default_model):
+    INF = inflation(default_model, "None")
+    INF.inflation_solver()
+    hints = INF.hints()
+    assert hints['t_end'] == INF.t_end
+    # The first accepted step, not the smallest step of the solve
+    assert hints['first_step'] == INF.stats.first_step
+    assert INF.stats.min_step <= hints['first_step'] <= INF.stats.max_step
+
+
+def test_warm_start():
+    grid = line()
+    cold = run_sweep(grid, workers=1)
+    warm = run_sweep(grid, workers=1, warm_start=True)
+    for (n_s, r, status, t_e), result in zip(cold, warm):
+        assert result[2] == status == 'OK'
+        assert numpy.allclose(result[0], n_s, rtol=1e-9)
+        assert numpy.allclose(result[3], t_e, rtol=1e-9)
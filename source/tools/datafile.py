@@ -0,0 +1,149 @@
+# Setting up the binary data files of op_data
+# Author: Arun Mathew
+#
+# Trajectories and parameter tables are written as NumPy archives (.npz) with one array per
+# column at full double precision. The column order and the metadata (model parameters,
+# solver settings, results) are stored in the archive as JSON. Uncompressed archives are
+# read with memory-mapped column views, so large files are not loaded into memory. The
+# legacy text files, with the header of the original text output, are written from the
+# archives by to_text().
+import json
+import os
+import tempfile
+import zipfile
+import numpy
+
+
+#####################################################################################
+# Model parameters of the legacy header: (name, key, unit)
+PARAMETERS = (('alpha', 'alpha', '[t_P^2]'),
+              ('beta ', 'beta', '[t_P^2]'),
+              ('mu   ', 'mu', '[t_P^-1]'),
+              ('E    ', 'E', '[GeV]'),
+              ('omega', 'omega', ''))
+
+
+class table(dict):
+    '''
+    Columns of a data file by name, in the order of names, and the metadata of the file
+    '''
+    def __init__(self, columns, names, metadata):
+        super().__init__(columns)
+        self.names = names
+        self.metadata = metadata
+
+
+#####################################################################################
+def write(path, columns, metadata=None, compress=False):
+    '''
+    Write columns of equal length to a NumPy archive
+
+    :param path: path of the .npz file
+    :param columns: dictionary of 1D arrays keyed by column name, in column order
+    :param metadata: dictionary of JSON serializable values
+    :param compress: compress the archive; compressed files cannot be memory-mapped
+    '''
+    names = list(columns)
+    arrays = {name: numpy.ascontiguousarray(columns[name]) for name in names}
+    info = json.dumps({'names': names, 'metadata': metadata or {}})
+    directory = os.path.dirname(os.path.abspath(path))
+    # Write to a temporary file first so that readers never see a partial file
+    handle, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as tmp_file:
+        save = numpy.savez_compressed if compress else numpy.savez
+        save(tmp_file, __info__=numpy.array(info), **arrays)
+    os.replace(tmp_path, path)
+
+
+def _memmap(path, zip_file, member):
+    # Map an uncompressed .npy member of a zip archive directly from the file
+    info = zip_file.getinfo(member)
+    with open(path, 'rb') as raw:
+        raw.seek(info.header_offset + 26)
+        name_length = int.from_bytes(raw.read(2), 'little')
+        extra_length = int.from_bytes(raw.read(2), 'little')
+        raw.seek(info.header_offset + 30 + name_length + extra_length)
+        version = numpy.lib.format.read_magic(raw)
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(raw)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(raw)
+        offset = raw.tell()
+    if numpy.prod(shape) == 0:
+        return numpy.empty(shape, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                        order='F' if fortran_order else 'C')
+
+
+def read(path, mmap=True):
+    '''
+    Read a data file written by write()
+
+    :param path: path of the .npz file
+    :param mmap: memory-map the columns of uncompressed files instead of loading them
+    :return: table of the columns with the metadata of the file
+    '''
+    with zipfile.ZipFile(path) as zip_file:
+        with numpy.load(path) as archive:
+            info = json.loads(str(archive['__info__']))
+            names = info['names']
+            columns = {}
+            for name in names:
+                member = name + '.npy'
+                stored = zip_file.getinfo(member).compress_type == zipfile.ZIP_STORED
+                columns[name] = _memmap(path, zip_file, member) if mmap and stored else archive[name]
+    return table(columns, names, info['metadata'])
+
+
+#####################################################################################
+def text_header(text_file, title, names, parameters=None):
+    '''
+    Write the header of the legacy text files
+
+    :param text_file: open text file
+    :param title: description of the data
+    :param names: column names
+    :param parameters: model parameters in the units of PARAMETERS, or None
+    '''
+    text_file.write("Project Title: Reheating by Scalaron Decay\n")
+    text_file.write("File Type: Data \n")
+    text_file.write("Author: Arun Mathew\n")
+    text_file.write("Affiliation: Dept. of Physics, IIT Guwahati, India\n\n")
+    if parameters is None:
+        text_file.write("Data: " + title + "\n\n")
+        text_file.write(", ".join(names) + "\n")
+        return
+    text_file.write("Data: " + title + "\n")
+    text_file.write("Model Parameters :\n")
+    for name, key, unit in PARAMETERS:
+        if unit:
+            print(name + " = ", "{0:.2e}".format(parameters[key]), unit, file=text_file)
+        else:
+            print(name + " = ", "{0:.2e}".format(parameters[key]), file=text_file)
+    print("\n", file=text_file)
+    print(", ".join(names) + "\n", file=text_file)
+
+
+def to_text(path, text_path=None, fmt="%f"):
+    '''
+    Write a data file in the legacy text format
+
+    :param path: path of the .npz file
+    :param text_path: path of the text file, by default path with the extension .txt
+    :param fmt: format of the values, see numpy.savetxt
+    '''
+    data = read(path)
+    metadata = data.metadata
+    if text_path is None:
+        text_path = os.path.splitext(path)[0] + ".txt"
+    with open(text_path, "w") as text_file:
+        text_header(text_file, metadata.get('title', ''), data.names, metadata.get('parameters'))
+        numpy.savetxt(text_file, numpy.column_stack([data[name] for name in data.names]), fmt=fmt)
+        if 'n_s' in metadata and 'r' in metadata:
+            print("\n", file=text_file)
+            print("Scalar Spectral Index and Tensor-to-Scalar ratio:", file=text_file)
+            print("n_s = ", "{0:.4f}".format(metadata['n_s']), file=text_file)
+            print("r   = ", "{0:.4f}".format(metadata['r']), file=text_file)
+    # The text file is a view of the archive, see tools/loader
+    stat = os.stat(path)
+    os.utime(text_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
@@ -0,0 +1,125 @@
+# Setting up the loader of the result files of op_data
+# Author: Arun Mathew
+#
+# load() returns the columns of a result file by name as NumPy arrays. A text file is
+# parsed once into a binary sidecar <file>.txt.npz next to it, and later loads memory-map
+# the sidecar instead of parsing the text again. The sidecar records the size and the
+# modification time of the text file and is rebuilt when the text file changes. If the
+# binary file written by the solver with the text file (<file>.npz, see tools/datafile)
+# is present and up to date, it is loaded directly at full precision.
+import os
+import re
+import numpy
+from tools import datafile
+
+
+#####################################################################################
+# Lines of the legacy header and footer: "alpha =  1.65e+01 [t_P^2]", "n_s =  0.9692"
+ASSIGNMENT = re.compile(r'^\s*(\w+)\s*=\s*(\S+)')
+SPECTRAL = ('n_s', 'r')
+
+
+def _numeric(line):
+    # A data line holds one or more numbers and nothing else
+    tokens = line.split()
+    if not tokens:
+        return False
+    try:
+        [float(token) for token in tokens]
+    except ValueError:
+        return False
+    return True
+
+
+def parse_text(text_path, names=None):
+    '''
+    Parse a text result file with or without the legacy header
+
+    Only the header and the footer are scanned line by line, the block of data is
+    read by numpy.loadtxt.
+
+    :param text_path: path of the text file
+    :param names: column names of files without a header
+    :return: (columns, metadata), columns a dictionary of arrays in column order
+    '''
+    with open(text_path, 'r') as text_file:
+        lines = text_file.read().splitlines()
+
+    first = next((i for i, line in enumerate(lines) if _numeric(line)), len(lines))
+    last = next((i for i in range(len(lines) - 1, first - 1, -1) if _numeric(lines[i])), first - 1)
+
+    metadata = {}
+    parameters = {}
+    header_names = None
+    keys = {key for _, key, _ in datafile.PARAMETERS}
+    for line in lines[:first]:
+        if line.startswith('Data:'):
+            metadata['title'] = line[len('Data:'):].strip()
+        elif ',' in line:
+            header_names = [name.strip() for name in line.split(',')]
+        else:
+            match = ASSIGNMENT.match(line)
+            if match and match.group(1) in keys:
+                parameters[match.group(1)] = float(match.group(2))
+    if parameters:
+        metadata['parameters'] = parameters
+    for line in lines[last + 1:]:
+        match = ASSIGNMENT.match(line)
+        if match and match.group(1) in SPECTRAL:
+            metadata[match.group(1)] = float(match.group(2))
+
+    names = header_names or names
+    if names is None:
+        raise ValueError('No column names in the header of %s, pass them with names.' % text_path)
+    if last < first:
+        data = numpy.empty((0, len(names)))
+    else:
+        data = numpy.loadtxt(lines[first:last + 1], ndmin=2)
+    if len(names) != data.shape[1]:
+        raise ValueError('%d column names for %d columns in %s.' % (len(names), data.shape[1], text_path))
+    columns = {name: data[:, i] for i, name in enumerate(names)}
+    return columns, metadata
+
+
+def _source(text_path):
+    # Identity of the text file a sidecar was parsed from
+    stat = os.stat(text_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+#####################################################################################
+def load(path, names=None, mmap=True):
+    '''
+    Load a result file of op_data
+
+    :param path: path of a text file or of a .npz file written by tools/datafile
+    :param names: column names of text files without a header
+    :param mmap: memory-map the columns instead of loading them
+    :return: datafile.table of the columns by name with the metadata of the file
+    '''
+    if path.endswith('.npz'):
+        return datafile.read(path, mmap=mmap)
+
+    # Binary file written together with the text file
+    binary = os.path.splitext(path)[0] + '.npz'
+    if os.path.exists(binary) and os.stat(binary).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        return datafile.read(binary, mmap=mmap)
+
+    sidecar = path + '.npz'
+    source = _source(path)
+    if os.path.exists(sidecar):
+        try:
+            data = datafile.read(sidecar, mmap=mmap)
+        except (OSError, ValueError, KeyError):
+            data = None
+        if data is not None and data.metadata.get('source') == source:
+            return data
+
+    columns, metadata = parse_text(path, names)
+    metadata['source'] = source
+    try:
+        datafile.write(sidecar, columns, metadata)
+    except OSError:
+        # Read-only directory, keep the parsed columns in memory
+        return datafile.table(columns, list(columns), metadata)
+    return datafile.read(sidecar, mmap=mmap)
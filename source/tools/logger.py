@@ -1,8 +1,44 @@
 # Setting up Console and File Logger
 # Author: Arun Mathew
 # Last modification: 22 May 2022
+#
+# The handlers are set up once per process and shared by all the loggers of setup_logger:
+# records go to the console directly and to the log file through a queue, which a
+# listener thread drains into the single file handle of scalaron_decay.log. The worker
+# processes of a sweep (see worker_init) send all their records through a process queue
+# to the listener of the main process, so that only one process writes the files.
+#
+# record() writes one JSON line per solve (parameters, status, nfev, njev, wall time, ...)
+# to scalaron_runs.jsonl through the same queue; read_records() and summarize() aggregate
+# them after a run.
 
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import time
+
+# Files written by the listener, relative to the working directory
+LOG_FILE = 'scalaron_decay.log'
+RECORD_FILE = 'scalaron_runs.jsonl'
+
+# Name of the logger of the structured records
+RECORD_LOGGER = 'Records'
+
+# Loggers of setup_logger, the handlers of this process, the file handlers shared by the
+# listener threads and the listener threads
+_loggers = {}
+_handlers = None
+_files = None
+_listeners = []
+_process_queue = None
+
+# Level of the console handlers, see console_level()
+_console_level = logging.DEBUG
+_consoles = []
+
 
 def setup_logger(FileName):
 
@@ -12,47 +48,198 @@ def setup_logger(FileName):
     # First we need to create a logger, which is nothing but an object to the logger
     # class. We can create this by using getLogger(). Logger
     # object we have to set the log level using setLevel() method.
+    # A logger is set up only once, later calls return the same object.
+    if FileName in _loggers:
+        return _loggers[FileName]
     logger = logging.getLogger(FileName)
     logger.setLevel(logging.DEBUG)
+    logger.propagate = False
 
 
     #####################################################################################
     #####################################################################################
-    # Handler:
-    # Create a handler object and set the logging level.
-    # 1. Stream Handler to log messages to the console.
-    # 2. File Handler to log messages to a log file.
+    # Add the Handler objects of this process to the Logger
+    for handler in _process_handlers():
+        logger.addHandler(handler)
 
-    # Stream Handler
-    consoleHandler = logging.StreamHandler()
-    consoleHandler.setLevel(logging.DEBUG)
-    # File Handler
-    fileHandler = logging.FileHandler('scalaron_decay.log')
-    fileHandler.setLevel(logging.DEBUG)
+    _loggers[FileName] = logger
+    return logger
 
 
-    #####################################################################################
-    #####################################################################################
+#####################################################################################
+#####################################################################################
+# Handler:
+# 1. Stream Handler to log messages to the console.
+# 2. File Handlers to log messages to the log file and the records to the record file,
+#    written by a listener thread from a queue.
+def _file_handlers():
+    # One handle per file in the process, opened with the first record
+    global _files
+    if _files is not None:
+        return _files
     # Create Formatter:
     formatter = logging.Formatter('%(asctime)s – [%(name)s:%(lineno)d] – %(levelname)s: %(message)s', datefmt='%d/%m/%Y %I:%M:%S %p')
+    fileHandler = logging.FileHandler(LOG_FILE, delay=True)
+    fileHandler.setLevel(logging.DEBUG)
+    fileHandler.setFormatter(formatter)
+    fileHandler.addFilter(lambda record: record.name != RECORD_LOGGER)
 
+    recordHandler = logging.FileHandler(RECORD_FILE, delay=True)
+    recordHandler.setFormatter(logging.Formatter('%(message)s'))
+    recordHandler.addFilter(lambda record: record.name == RECORD_LOGGER)
+    _files = (fileHandler, recordHandler)
+    return _files
 
-    #####################################################################################
-    #####################################################################################
-    # Add Formatter to Console Handler and File Handler
+
+def _console_handler():
+    consoleHandler = logging.StreamHandler()
+    consoleHandler.setLevel(_console_level)
     consoleHandler.setFormatter(Custom_Formatter())
-    fileHandler.setFormatter(formatter)
+    consoleHandler.addFilter(lambda record: record.name != RECORD_LOGGER)
+    _consoles.append(consoleHandler)
+    return consoleHandler
 
 
-    #####################################################################################
-    #####################################################################################
-    # Add Handler object to the Logger
-    # Then the handler object should be added to the logger object using addHandler()
-    # method.
-    logger.addHandler(fileHandler)
-    logger.addHandler(consoleHandler)
+def console_level(level):
+    '''
+    Set the level of the messages written to the console, e.g. logging.WARNING to keep
+    the console quiet during a benchmark; the log file still gets every message
+
+    :param level: logging level
+    '''
+    global _console_level
+    _console_level = level
+    for consoleHandler in _consoles:
+        consoleHandler.setLevel(level)
+
+
+def _listen(record_queue, *handlers):
+    listener = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def _process_handlers():
+    # Console handler and queue handler of the file handlers, set up once per process
+    global _handlers
+    if _handlers is None:
+        file_queue = queue.SimpleQueue()
+        _listen(file_queue, *_file_handlers())
+        _handlers = [_console_handler(), logging.handlers.QueueHandler(file_queue)]
+    return _handlers
 
-    return logger
+
+def _stop_listeners():
+    # Write the queued records to the files
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def flush():
+    '''
+    Write the records queued so far, e.g. before reading the records of a sweep
+    '''
+    for listener in _listeners:
+        listener.stop()
+        listener.start()
+
+
+atexit.register(_stop_listeners)
+
+
+#####################################################################################
+#####################################################################################
+def process_queue():
+    '''
+    Queue through which worker processes send their records to this process
+
+    :return: multiprocessing queue, pass it to worker_init
+    '''
+    global _process_queue
+    if _process_queue is None:
+        import multiprocessing
+        _process_queue = multiprocessing.Queue()
+        # Records of the workers are written to the console and the files here
+        _listen(_process_queue, _console_handler(), *_file_handlers())
+    return _process_queue
+
+
+def worker_init(record_queue):
+    '''
+    Initializer of the worker processes of a multiprocessing pool
+
+    :param record_queue: queue of process_queue() of the main process
+    '''
+    global _handlers
+    # The listener threads and the file handles of the main process are not used by the
+    # worker
+    _listeners.clear()
+    _handlers = [logging.handlers.QueueHandler(record_queue)]
+    for logger in _loggers.values():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        for handler in _handlers:
+            logger.addHandler(handler)
+
+
+#####################################################################################
+#####################################################################################
+def record(kind, **fields):
+    '''
+    Write a structured record of a solve as one JSON line to RECORD_FILE
+
+    :param kind: kind of the solve, e.g. 'inflation'
+    :param fields: JSON serializable values; NumPy scalars are converted
+    '''
+    entry = {'kind': kind, 'time': time.time(), 'pid': os.getpid()}
+    entry.update(fields)
+    setup_logger(RECORD_LOGGER).info('%s', json.dumps(entry, default=_json_default))
+
+
+def _json_default(value):
+    # NumPy scalars and arrays
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def read_records(path=RECORD_FILE, kind=None, since=None):
+    '''
+    Read the structured records
+
+    :param path: record file
+    :param kind: only records of this kind, None for all
+    :param since: only records written after this time.time(), None for all
+    :return: list of dictionaries in the order of writing
+    '''
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as record_file:
+        for line in record_file:
+            if line.strip():
+                entry = json.loads(line)
+                if (kind is None or entry['kind'] == kind) and (since is None or entry['time'] >= since):
+                    records.append(entry)
+    return records
+
+
+def summarize(records):
+    '''
+    Aggregate structured records, e.g. of the solves of a sweep
+
+    :param records: list of records, see read_records
+    :return: dictionary with the number of solves per status and the totals of
+             nfev, njev and wall time
+    '''
+    summary = {'solves': len(records), 'status': {}, 'nfev': 0, 'njev': 0, 'wall': 0.0}
+    for entry in records:
+        status = entry.get('status')
+        summary['status'][status] = summary['status'].get(status, 0) + 1
+        for key in ('nfev', 'njev', 'wall'):
+            if entry.get(key) is not None:
+                summary[key] += entry[key]
+    return summary
 
 
 
@@ -78,7 +265,11 @@ class Custom_Formatter(logging.Formatter):
 
     #####################################################################################
     #####################################################################################
+    # One formatter per level, built once
+    def __init__(self):
+        super().__init__()
+        self.formatters = {level: logging.Formatter(log_fmt) for level, log_fmt in self.FORMATS.items()}
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.formatters.get(record.levelno, self.formatters[logging.INFO])
         return formatter.format(record)
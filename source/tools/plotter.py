@@ -1,14 +1,179 @@
 # Setting up Plotter function
 # Author: Arun Mathew
 # Last modification: 22 May 2022
+#
+# Figures are drawn with the object-oriented API of matplotlib on an Agg canvas and
+# closed after they are saved, so no figure is kept alive between plots. pyplot is only
+# used to show figures on a display (interactive mode). LaTeX is used for the labels
+# when a latex executable is found, otherwise and whenever a LaTeX render fails the
+# labels fall back to mathtext. With start_queue() the figures are rendered in a
+# background process pool and the caller does not wait on plotting. matplotlib is only
+# imported when the first figure is drawn.
 
-import matplotlib.pyplot as plt
 import os
-from itertools import islice
-import numpy as np
-import matplotlib as mpl
-mpl.rcParams['text.usetex'] = True
-#mpl.rcParams['text.latex.preamble'] = [r'\usepackage{amsmath}']
+import sys
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+
+#####################################################################################
+# > Plot settings, see configure()
+# Headless without a display or with MPLBACKEND=Agg; figures are then only saved
+headless = os.environ.get('MPLBACKEND', '').lower() == 'agg' or \
+           (sys.platform.startswith('linux') and not os.environ.get('DISPLAY')
+            and not os.environ.get('WAYLAND_DISPLAY'))
+# LaTeX labels if latex is installed, mathtext otherwise
+usetex = shutil.which('latex') is not None
+# Draw the figures at all; off e.g. in benchmarks of the solvers
+draw = True
+
+# Background plot queue, see start_queue()
+_queue = None
+
+
+def configure(headless=None, usetex=None, draw=None):
+    '''
+    Change the plot settings
+
+    :param headless: True to only save figures, False to also show them
+    :param usetex: True for LaTeX labels, False for mathtext
+    :param draw: False to skip the figures
+    :return: None
+    '''
+    module = sys.modules[__name__]
+    if headless is not None:
+        module.headless = headless
+    if usetex is not None:
+        module.usetex = usetex
+    if draw is not None:
+        module.draw = draw
+
+
+def data_path(filename, filetype):
+    # Path of the file in the data directory
+    root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
+    data_Dir = root_Dir + "/op_data"
+    return data_Dir + '/' + filename + '.' + filetype
+
+
+#####################################################################################
+def _new_figure(show, **kwargs):
+    # Figure managed by pyplot to be shown, otherwise a bare figure on an Agg canvas
+    if show:
+        import matplotlib.pyplot as plt
+        return plt.figure(**kwargs)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _close_figure(fig, show):
+    # Figures of pyplot are closed after they are shown, bare figures are freed with fig
+    if fig.canvas.manager is not None:
+        import matplotlib.pyplot as plt
+        if show:
+            plt.show()
+        plt.close(fig)
+
+
+def _draw_single(x, y, x_range, y_range, x_label, y_label, path, show):
+    fig = _new_figure(show, figsize=(4.5, 3), dpi=100)
+    try:
+        ax = fig.subplots()
+        ax.plot(x, y)
+        ax.set_xlim(x_range)
+        ax.set_ylim(y_range)
+
+        ax.set_xlabel(x_label, color="black", fontsize=20)
+        ax.set_ylabel(y_label, color="black", fontsize=20)
+
+        fig.tight_layout()
+        fig.savefig(path)
+    except Exception:
+        _close_figure(fig, False)
+        raise
+    _close_figure(fig, show)
+    return path
+
+
+def _render(x, y, x_range, y_range, x_label, y_label, path, show, tex):
+    # Draw with LaTeX labels and fall back to mathtext if LaTeX fails
+    import matplotlib as mpl
+    if tex:
+        try:
+            with mpl.rc_context({'text.usetex': True}):
+                return _draw_single(x, y, x_range, y_range, x_label, y_label, path, show)
+        except (RuntimeError, OSError):
+            pass
+    with mpl.rc_context({'text.usetex': False}):
+        return _draw_single(x, y, x_range, y_range, x_label, y_label, path, show)
+
+
+#####################################################################################
+class plot_queue():
+    '''
+    Renders figures in a pool of background processes
+    '''
+    def __init__(self, workers=1):
+        '''
+        :param workers: number of plotting processes
+        '''
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.futures = []
+
+    def submit(self, *args):
+        future = self.executor.submit(_render, *args)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        '''
+        Wait for the submitted figures
+
+        :return: paths of the saved figures
+        '''
+        futures, self.futures = self.futures, []
+        return [future.result() for future in futures]
+
+    def close(self):
+        try:
+            return self.wait()
+        finally:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def start_queue(workers=1):
+    '''
+    Render the figures of plot_single in the background from now on
+
+    :param workers: number of plotting processes
+    :return: the plot queue
+    '''
+    global _queue
+    if _queue is None:
+        _queue = plot_queue(workers)
+    return _queue
+
+
+def finish():
+    '''
+    Wait for the queued figures and stop the plot queue
+
+    :return: paths of the figures saved by the queue
+    '''
+    global _queue
+    if _queue is None:
+        return []
+    queue, _queue = _queue, None
+    return queue.close()
 
 
 #####################################################################################
@@ -31,29 +196,16 @@ def plot_single(x,
     :param y_label: y label
     :param filename: output filename
     :param filetype: specify filetype as string
-    :return: None
+    :return: path of the figure, or a future of it if the plot queue is running, None if
+             the figures are not drawn
     '''
-
-
-    fig, ax = plt.subplots(figsize=(4.5, 3), dpi=100)
-
-    ax.plot(x, y)
-    plt.xlim(x_range)
-    plt.ylim(y_range)
-
-    ax.set_xlabel(x_label, color="black", fontsize=20)
-    plt.ylabel(y_label, color="black", fontsize=20)
-
-
-    #plt.legend()
-    plt.tight_layout()
-
-    # Path of data directory
-    root_Dir = os.path.normpath(os.getcwd() + os.sep + os.pardir)
-    data_Dir = root_Dir + "/op_data"
-
-    fig.savefig(data_Dir + '/' + filename + '.' + filetype)
-    plt.show()
+    if not draw:
+        return None
+    path = data_path(filename, filetype)
+    if _queue is not None:
+        # Figures cannot be shown from the background processes
+        return _queue.submit(x, y, x_range, y_range, x_label, y_label, path, False, usetex)
+    return _render(x, y, x_range, y_range, x_label, y_label, path, not headless, usetex)
 
 
 #####################################################################################
@@ -65,16 +217,25 @@ def plot_multiple(x,
             y_label,
             filename):
 
-
-    fig, ax = plt.subplots()
-    ax.plot(x, y)
-    plt.xlim(x_range)
-    plt.ylim(y_range)
-
-    ax.set(xlabel = x_label, ylabel = y_label, title='')
-
-    plt.legend()
-    plt.tight_layout()
-
-    fig.savefig(filename + '.png')
-    plt.show()
\ No newline at end of file
+    if not draw:
+        return
+    import matplotlib as mpl
+    show = not headless
+    with mpl.rc_context({'text.usetex': usetex}):
+        fig = _new_figure(show)
+        try:
+            ax = fig.subplots()
+            ax.plot(x, y)
+            ax.set_xlim(x_range)
+            ax.set_ylim(y_range)
+
+            ax.set(xlabel = x_label, ylabel = y_label, title='')
+
+            ax.legend()
+            fig.tight_layout()
+
+            fig.savefig(filename + '.png')
+        except Exception:
+            _close_figure(fig, False)
+            raise
+        _close_figure(fig, show)